@@ -0,0 +1,441 @@
+from benchmarks.serve import PASSWORD, user_email, admin_email
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import httpx
+
+"""
+Benchmark runner module for measuring the API under scripted request mixes.
+
+`python -m benchmarks.run run` starts the stand-in AI backend and the application as
+subprocesses, drives them with closed-loop virtual users picking operations by weight,
+and reports throughput and p50/p95/p99 latency per operation. Results are written as
+JSON tagged with the git commit. `--baseline` (or `python -m benchmarks.run compare`)
+checks the result against an earlier one and exits with status 1 on a regression.
+"""
+
+# operation -> weight, per named mix
+MIXES = {
+    "default" : {"login" : 5, "authenticate" : 30, "ai_text" : 40, "ai_schema" : 15, "admin_users" : 5, "admin_endpoints" : 5},
+    "auth" : {"login" : 40, "authenticate" : 60},
+    "ai" : {"authenticate" : 10, "ai_text" : 60, "ai_schema" : 30},
+    "admin" : {"authenticate" : 20, "admin_users" : 40, "admin_endpoints" : 40},
+}
+ADMIN_OPERATIONS = ("admin_users", "admin_endpoints")
+BENCHMARK_SCHEMA = {"type" : "object", "additionalProperties" : {"type" : "string"}}
+
+
+class Recorder:
+    """
+    Collector of latencies and outcomes per operation during the measured window.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.recording = False
+
+    def record(self, operation, seconds, status):
+        """
+        Record one completed request if the measured window is open.
+
+        :param operation: string naming the operation
+        :param seconds: float request latency
+        :param status: integer HTTP status, or None if the request raised
+        """
+        if not self.recording:
+            return
+        if status is None:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+            return
+        self.latencies.setdefault(operation, []).append(seconds)
+        statuses = self.statuses.setdefault(operation, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def summary(self, duration):
+        """
+        Summarize the recorded requests.
+
+        :param duration: float length of the measured window in seconds
+        :return: a dictionary mapping each operation, and "total", to its statistics
+        """
+        endpoints = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            endpoints[operation] = summarize(self.latencies.get(operation, []), duration,
+                                             self.statuses.get(operation, {}), self.errors.get(operation, 0))
+        statuses = {}
+        for per_operation in self.statuses.values():
+            for status, count in per_operation.items():
+                statuses[status] = statuses.get(status, 0) + count
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        endpoints["total"] = summarize(everything, duration, statuses, sum(self.errors.values()))
+        return endpoints
+
+
+def percentile(ordered, fraction):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, duration, statuses, errors):
+    """
+    Compute throughput and latency percentiles for one operation.
+
+    :return: a dictionary of count, rps, latency statistics in milliseconds, statuses, and errors
+    """
+    ordered = sorted(latencies)
+    return {
+        "count" : len(ordered),
+        "rps" : round(len(ordered) / duration, 2) if duration else 0.0,
+        "p50_ms" : round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms" : round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms" : round(percentile(ordered, 0.99) * 1000, 2),
+        "mean_ms" : round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "max_ms" : round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "statuses" : statuses,
+        "errors" : errors
+    }
+
+
+class VirtualUser:
+    """
+    Closed-loop client logged in as one seeded user, issuing one request at a time.
+    """
+
+    def __init__(self, base_url, email, admin_client, weights, rng, recorder, text):
+        self.__client = httpx.AsyncClient(base_url=base_url, timeout=60)
+        self.__email = email
+        self.__admin_client = admin_client
+        self.__operations = list(weights)
+        self.__weights = list(weights.values())
+        self.__rng = rng
+        self.__recorder = recorder
+        self.__text = text
+
+    async def login(self):
+        """
+        Log in as this virtual user's account.
+        """
+        await login(self.__client, self.__email)
+
+    async def run(self, stop_at):
+        """
+        Issue weighted random operations until stop_at.
+
+        :param stop_at: float time.perf_counter() value at which to stop
+        """
+        try:
+            while time.perf_counter() < stop_at:
+                operation = self.__rng.choices(self.__operations, self.__weights)[0]
+                await self.__call(operation)
+        finally:
+            await self.__client.aclose()
+
+    async def __call(self, operation):
+        client = self.__admin_client if operation in ADMIN_OPERATIONS else self.__client
+        started = time.perf_counter()
+        try:
+            response = await self.__send(client, operation)
+        except httpx.HTTPError:
+            self.__recorder.record(operation, time.perf_counter() - started, None)
+            return
+        self.__recorder.record(operation, time.perf_counter() - started, response.status_code)
+        if response.status_code == 401:
+            # The session token expired; log in again like the frontend would
+            await login(client, admin_email() if client is self.__admin_client else self.__email)
+
+    async def __send(self, client, operation):
+        if operation == "login":
+            return await client.post("/api/v1/auth/login", json={"email" : self.__email, "password" : PASSWORD})
+        if operation == "authenticate":
+            return await client.get("/api/v1/auth/authenticate")
+        if operation == "ai_text":
+            return await client.post("/api/v1/service/ai/text", json={"text" : self.__text, "lang" : "en"})
+        if operation == "ai_schema":
+            return await client.post("/api/v1/service/ai/schema",
+                                     json={"text" : self.__text, "lang" : "en", "schema" : BENCHMARK_SCHEMA})
+        if operation == "admin_users":
+            return await client.get("/api/v1/admin/users")
+        if operation == "admin_endpoints":
+            return await client.get("/api/v1/admin/endpoints")
+        raise ValueError(f"unknown operation {operation!r}")
+
+
+async def login(client, email):
+    """
+    Log a client in so its cookie jar holds a session token.
+
+    The session cookie is marked Secure, so it is copied into the jar by hand to be sent over plain HTTP.
+
+    :raises RuntimeError: if the login fails
+    """
+    response = await client.post("/api/v1/auth/login", json={"email" : email, "password" : PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f"login as {email} failed with status {response.status_code}")
+    client.cookies.set("jwt", response.cookies["jwt"])
+
+
+async def drive(args, weights):
+    """
+    Run the virtual users through the warmup and measured windows.
+
+    :return: a tuple of (Recorder, measured duration in seconds)
+    """
+    base_url = f"http://127.0.0.1:{args.port}"
+    recorder = Recorder()
+    admin_client = httpx.AsyncClient(base_url=base_url, timeout=60)
+    await login(admin_client, admin_email())
+    text = ("The quick brown fox jumps over the lazy dog. " * (args.text_bytes // 45 + 1))[:args.text_bytes]
+
+    users = [
+        VirtualUser(base_url, user_email(index % args.users), admin_client, weights,
+                    random.Random(args.seed * 100003 + index), recorder, text)
+        for index in range(args.concurrency)
+    ]
+    # Logins hash passwords one at a time; finish them before the clock starts
+    for user in users:
+        await user.login()
+
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+    tasks = [asyncio.create_task(user.run(stop_at)) for user in users]
+    await asyncio.sleep(max(0.0, measure_from - time.perf_counter()))
+    recorder.recording = True
+    measured_at = time.perf_counter()
+    await asyncio.gather(*tasks)
+    duration = time.perf_counter() - measured_at
+    await admin_client.aclose()
+    return recorder, duration
+
+
+def start_servers(args):
+    """
+    Start the stand-in AI backend and the application, and wait until the application is ready.
+
+    :return: list of the started subprocesses
+    """
+    ai_port = args.port + 1
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.serve", "ai", "--port", str(ai_port),
+                          "--latency-ms", str(args.ai_latency_ms), "--jitter-ms", str(args.ai_jitter_ms),
+                          "--fields", str(args.ai_fields), "--seed", str(args.seed)]),
+        subprocess.Popen([sys.executable, "-m", "benchmarks.serve", "app", "--port", str(args.port),
+                          "--ai-url", f"http://127.0.0.1:{ai_port}", "--users", str(args.users),
+                          "--db-latency-ms", str(args.db_latency_ms)]),
+    ]
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/api/v1/health/ready", timeout=1).status_code == 200:
+                return processes
+        except httpx.HTTPError:
+            pass
+        if any(process.poll() is not None for process in processes):
+            break
+        time.sleep(0.2)
+    stop_servers(processes)
+    raise RuntimeError("benchmark servers did not become ready")
+
+
+def stop_servers(processes):
+    """
+    Stop the benchmark servers, killing any that do not exit in time.
+    """
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def git_revision():
+    """
+    Return the current commit and whether the working tree has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def parse_weights(value):
+    """
+    Parse a weight override such as "login=1,ai_text=4".
+    """
+    weights = {}
+    for pair in value.split(","):
+        operation, _, weight = pair.partition("=")
+        weights[operation.strip()] = float(weight)
+    return weights
+
+
+def compare(baseline, current, max_latency_regression, max_throughput_regression):
+    """
+    Compare two result documents operation by operation.
+
+    An operation regresses if its p95 or p99 latency grew, or its throughput fell, by more
+    than the allowed percentage.
+
+    :return: a tuple of (report lines, list of regression descriptions)
+    """
+    lines = [f"{'operation':<16}" + "".join(f"{metric:>28}" for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"))]
+    regressions = []
+    for operation, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(operation)
+        if before is None:
+            continue
+        cells = []
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (now[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            cells.append(f"{before[metric]:.1f} -> {now[metric]:.1f} ({change:+.1f}%)".rjust(28))
+            if metric == "rps" and change < -max_throughput_regression:
+                regressions.append(f"{operation} throughput fell {-change:.1f}%")
+            elif metric in ("p95_ms", "p99_ms") and change > max_latency_regression:
+                regressions.append(f"{operation} {metric[:3]} rose {change:.1f}%")
+        lines.append(f"{operation:<16}" + "".join(cells))
+    return lines, regressions
+
+
+def print_summary(endpoints):
+    """
+    Print one line of throughput, latency, and status counts per operation.
+    """
+    print(f"{'operation':<16}{'count':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for operation, stats in endpoints.items():
+        print(f"{operation:<16}{stats['count']:>8}{stats['rps']:>10.1f}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}  {stats['statuses']} errors={stats['errors']}")
+
+
+def check_regressions(baseline_path, result, args):
+    """
+    Compare a result against a baseline file, print the report, and return the exit status.
+    """
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    lines, regressions = compare(baseline, result, args.max_latency_regression, args.max_throughput_regression)
+    print(f"\nagainst {baseline_path} ({baseline['meta']['commit']}):")
+    print("\n".join(lines))
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+def run(args):
+    """
+    Start the servers, run the mix, write the result file, and compare it with the baseline.
+
+    :return: process exit status
+    """
+    weights = dict(MIXES[args.mix])
+    if args.weights:
+        weights = parse_weights(args.weights)
+
+    processes = start_servers(args)
+    try:
+        recorder, duration = asyncio.run(drive(args, weights))
+    finally:
+        stop_servers(processes)
+
+    commit, dirty = git_revision()
+    result = {
+        "meta" : {
+            "commit" : commit,
+            "dirty" : dirty,
+            "timestamp" : datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python" : platform.python_version(),
+            "mix" : args.mix if not args.weights else "custom",
+            "weights" : weights,
+            "config" : {
+                "concurrency" : args.concurrency, "duration" : args.duration, "warmup" : args.warmup,
+                "users" : args.users, "seed" : args.seed, "text_bytes" : args.text_bytes,
+                "ai_latency_ms" : args.ai_latency_ms, "ai_jitter_ms" : args.ai_jitter_ms,
+                "ai_fields" : args.ai_fields, "db_latency_ms" : args.db_latency_ms
+            },
+            "measured_seconds" : round(duration, 3)
+        },
+        "endpoints" : recorder.summary(duration)
+    }
+    print_summary(result["endpoints"])
+
+    output = args.output or os.path.join("benchmarks", "results", f"{result['meta']['mix']}-{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(result, output_file, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.baseline:
+        return check_regressions(args.baseline, result, args)
+    return 0
+
+
+def run_compare(args):
+    """
+    Compare two existing result files.
+
+    :return: process exit status
+    """
+    with open(args.current, encoding="utf-8") as current_file:
+        current = json.load(current_file)
+    return check_regressions(args.baseline, current, args)
+
+
+def main():
+    """
+    Parse the command line and run or compare benchmarks.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stand-ins.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a benchmark mix")
+    run_parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    run_parser.add_argument("--weights", help="custom operation weights, e.g. login=1,ai_text=4")
+    run_parser.add_argument("--concurrency", type=int, default=32, help="number of virtual users")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before measuring")
+    run_parser.add_argument("--users", type=int, default=64, help="number of seeded users")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--port", type=int, default=18000, help="application port; the AI stand-in uses the next one")
+    run_parser.add_argument("--text-bytes", type=int, default=512, help="length of the text sent to the AI routes")
+    run_parser.add_argument("--ai-latency-ms", type=float, default=200.0)
+    run_parser.add_argument("--ai-jitter-ms", type=float, default=50.0)
+    run_parser.add_argument("--ai-fields", type=int, default=8)
+    run_parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    run_parser.add_argument("--output", help="result file, benchmarks/results/<mix>-<commit>.json by default")
+    run_parser.add_argument("--baseline", help="earlier result file to compare against")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.set_defaults(handler=run_compare)
+
+    for command_parser in (run_parser, compare_parser):
+        command_parser.add_argument("--max-latency-regression", type=float, default=15.0,
+                                    help="allowed p95/p99 increase in percent")
+        command_parser.add_argument("--max-throughput-regression", type=float, default=10.0,
+                                    help="allowed throughput decrease in percent")
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
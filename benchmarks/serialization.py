@@ -0,0 +1,155 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from schemas.admin_schema import UserUsage, EndpointStats
+from schemas.ai_schema import ParseResponse
+from services.json_response import FastJSONResponse
+import argparse
+import json
+import time
+
+"""
+Serialization benchmark module comparing the old and new JSON response paths.
+
+`python -m benchmarks.serialization` times how long the admin listings and the AI
+parse result take to go from database rows (or upstream dicts) to response bytes.
+The "before" path is the one untyped routes take: a Python pass over the rows,
+jsonable_encoder, and the standard JSONResponse. The "after" path is the one typed
+routes take now: one Pydantic validate and serialize pass, then FastJSONResponse.
+Times are reported per 10,000 rows so that runs with different sizes compare.
+"""
+
+
+def user_rows(count):
+    """
+    Build rows shaped like Database.get_users_with_usage results, with is_admin as 0 or 1.
+    """
+    return [
+        {"uid" : index, "email" : f"user{index}@example.com", "is_admin" : int(index % 50 == 0), "api_usage" : index * 3}
+        for index in range(count)
+    ]
+
+
+def endpoint_rows(count):
+    """
+    Build rows shaped like Database.get_all_endpoints results.
+    """
+    methods = ("GET", "POST", "PATCH", "DELETE")
+    return [
+        {"http_method" : methods[index % 4], "endpoint" : f"/api/v1/resource/{index}", "request_count" : index * 7}
+        for index in range(count)
+    ]
+
+
+def parse_results(count, fields):
+    """
+    Build AI parse results, each holding a data object with the given number of fields.
+    """
+    data = {f"field_{index}" : f"value {index}" for index in range(fields)}
+    return [{"data" : dict(data), "api_usage" : index} for index in range(count)]
+
+
+def encode_before(rows, to_bool=False):
+    """
+    Encode rows the way untyped routes did: Python conversion, jsonable_encoder, JSONResponse.
+    """
+    if to_bool:
+        for row in rows:
+            row["is_admin"] = bool(row["is_admin"])
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def encode_after(adapter, rows, exclude_unset=False):
+    """
+    Encode rows the way typed routes do: one Pydantic pass, then FastJSONResponse.
+    """
+    value = adapter.validate_python(rows)
+    return FastJSONResponse(adapter.dump_python(value, mode="json", exclude_unset=exclude_unset)).body
+
+
+def encode_after_each(adapter, results):
+    """
+    Encode parse results one response at a time, as the AI routes do.
+    """
+    return [encode_after(adapter, result, exclude_unset=True) for result in results]
+
+
+def encode_before_each(results):
+    """
+    Encode parse results one response at a time the old way.
+    """
+    return [encode_before(result) for result in results]
+
+
+def time_case(build, encode, repeat):
+    """
+    Time an encoder over fresh input, excluding the time spent building the input.
+
+    :param build: callable returning a new input each time
+    :param encode: callable encoding the input
+    :param repeat: integer number of runs; the fastest is kept
+    :return: float fastest run in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        rows = build()
+        started = time.perf_counter()
+        encode(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(args):
+    """
+    Time every case and print milliseconds per 10,000 rows before and after.
+
+    :param args: the parsed argparse namespace
+    """
+    users = TypeAdapter(list[UserUsage])
+    endpoints = TypeAdapter(list[EndpointStats])
+    parse = TypeAdapter(ParseResponse)
+    cases = [
+        ("admin users", lambda: user_rows(args.rows),
+         lambda rows: encode_before(rows, to_bool=True), lambda rows: encode_after(users, rows)),
+        ("admin endpoints", lambda: endpoint_rows(args.rows),
+         encode_before, lambda rows: encode_after(endpoints, rows)),
+        ("ai parse results", lambda: parse_results(args.rows, args.fields),
+         encode_before_each, lambda results: encode_after_each(parse, results)),
+    ]
+
+    # Both paths must produce the same document
+    for name, build, before, after in cases:
+        if decode(before(build()[:3])) != decode(after(build()[:3])):
+            raise SystemExit(f"{name}: the two paths produce different JSON")
+
+    scale = 10000 / args.rows
+    print(f"{'case':<18} {'before ms':>10} {'after ms':>10} {'speedup':>8}   (per 10k rows, best of {args.repeat})")
+    for name, build, before, after in cases:
+        before_ms = time_case(build, before, args.repeat) * 1000 * scale
+        after_ms = time_case(build, after, args.repeat) * 1000 * scale
+        print(f"{name:<18} {before_ms:>10.1f} {after_ms:>10.1f} {before_ms / after_ms:>7.1f}x")
+
+
+def decode(encoded):
+    """
+    Decode a response body, or a list of bodies, for comparison.
+    """
+    if isinstance(encoded, list):
+        return [json.loads(body) for body in encoded]
+    return json.loads(encoded)
+
+
+def main():
+    """
+    Parse the command line and run the serialization benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Compare JSON serialization paths.")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per listing and parse results per run")
+    parser.add_argument("--fields", type=int, default=8, help="fields in each AI data object")
+    parser.add_argument("--repeat", type=int, default=7, help="runs per case; the fastest is reported")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import bcrypt
+import uvicorn
+
+"""
+Benchmark server module starting the application or the stand-in AI backend.
+
+`python -m benchmarks.serve app` runs main.App against a StandInDatabase seeded with
+benchmark users, and `python -m benchmarks.serve ai` runs the stand-in AI backend.
+The benchmark runner starts both as subprocesses so the load generator does not share
+a process with the server.
+"""
+
+PASSWORD = "benchmark-password"
+
+
+def user_email(index):
+    """
+    Return the email of the index-th seeded benchmark user.
+    """
+    return f"bench{index}@example.com"
+
+
+def admin_email():
+    """
+    Return the email of the seeded benchmark admin.
+    """
+    return "bench-admin@example.com"
+
+
+def serve_app(args):
+    """
+    Run the API on a seeded StandInDatabase, calling the AI backend at args.ai_url.
+
+    :param args: the parsed argparse namespace
+    """
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["AI_BACKEND_URL"] = args.ai_url
+    # Imported after the environment is set, since modules read it at import time
+    from benchmarks.stand_ins import StandInDatabase
+    from main import App
+
+    db = StandInDatabase(latency=args.db_latency_ms / 1000)
+    hashed_password = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    db.seed_users([user_email(index) for index in range(args.users)], hashed_password, [admin_email()])
+    uvicorn.run(App(db=db).get_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def serve_ai(args):
+    """
+    Run the stand-in AI backend with the configured delay and payload size.
+
+    :param args: the parsed argparse namespace
+    """
+    from benchmarks.stand_ins import create_ai_backend
+
+    app = create_ai_backend(args.latency_ms / 1000, args.jitter_ms / 1000, args.fields, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def main():
+    """
+    Parse the command line and run the selected server until it is stopped.
+    """
+    parser = argparse.ArgumentParser(description="Run a benchmark server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    app_parser = commands.add_parser("app", help="the API against the stand-in database")
+    app_parser.add_argument("--port", type=int, default=18000)
+    app_parser.add_argument("--ai-url", default="http://127.0.0.1:18001")
+    app_parser.add_argument("--users", type=int, default=64, help="number of seeded users")
+    app_parser.add_argument("--db-latency-ms", type=float, default=1.0, help="delay per database round trip")
+    app_parser.set_defaults(handler=serve_app)
+
+    ai_parser = commands.add_parser("ai", help="the stand-in AI backend")
+    ai_parser.add_argument("--port", type=int, default=18001)
+    ai_parser.add_argument("--latency-ms", type=float, default=200.0)
+    ai_parser.add_argument("--jitter-ms", type=float, default=50.0)
+    ai_parser.add_argument("--fields", type=int, default=8, help="fields in each returned data object")
+    ai_parser.add_argument("--seed", type=int, default=None)
+    ai_parser.set_defaults(handler=serve_ai)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+from fastapi import FastAPI, Request, Response
+from database.database import Database
+from datetime import date, datetime
+import asyncio
+import random
+import re
+import sqlite3
+import threading
+import time
+import pymysql
+
+"""
+Stand-in module providing local replacements for MySQL and the AI backend.
+
+StandInDatabase runs the real Database class against an in-memory SQLite database
+through a small pymysql-compatible connection, translating the few MySQL-only
+constructs the queries use and adding a configurable round trip latency.
+create_ai_backend builds an app answering the AI backend routes after a configurable
+delay with a configurable number of fields.
+"""
+
+_SCHEMA = """
+    CREATE TABLE user (
+        uid INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        is_admin INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE api_usage (
+        uid INTEGER PRIMARY KEY,
+        usage_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE api_request_stats (
+        http_method TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        request_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (http_method, endpoint)
+    );
+"""
+
+# (pattern, replacement) applied in order to turn the MySQL dialect into SQLite
+_TRANSLATIONS = (
+    (re.compile(r",\s*KEY\s+\w+\s*\([^)]*\)", re.IGNORECASE), ""),
+    (re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE), r"excluded.\1"),
+    (re.compile(r"ON DUPLICATE KEY UPDATE", re.IGNORECASE), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"%s"), "?"),
+)
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+
+def translate(query):
+    """
+    Rewrite a MySQL query from the Database class into SQLite syntax.
+
+    :param query: string containing the MySQL query
+    :return: string containing the equivalent SQLite query
+    """
+    for pattern, replacement in _TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class StandInCursor:
+    """
+    Cursor with the subset of the pymysql DictCursor interface used by Database.
+    """
+
+    def __init__(self, connection):
+        self.__connection = connection
+        self.__rows = []
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.__run(query, [params or ()], many=False)
+
+    def executemany(self, query, rows):
+        self.__run(query, rows, many=True)
+
+    def fetchone(self):
+        return self.__rows.pop(0) if self.__rows else None
+
+    def fetchall(self):
+        rows, self.__rows = self.__rows, []
+        return rows
+
+    def __run(self, query, rows, many):
+        self.__connection.round_trip()
+        with self.__connection.lock:
+            cursor = self.__connection.sqlite.cursor()
+            try:
+                if many:
+                    cursor.executemany(translate(query), rows)
+                else:
+                    cursor.execute(translate(query), rows[0])
+            except sqlite3.IntegrityError as error:
+                raise pymysql.IntegrityError(1062, str(error))
+            except sqlite3.Error as error:
+                raise pymysql.ProgrammingError(1064, str(error))
+            columns = [column[0] for column in cursor.description or ()]
+            self.__rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            self.lastrowid = cursor.lastrowid
+            self.rowcount = cursor.rowcount
+
+
+class StandInConnection:
+    """
+    In-memory SQLite connection exposing the pymysql connection methods used by Database.
+    """
+
+    def __init__(self, latency=0.0):
+        """
+        :param latency: float number of seconds each statement and commit blocks, like a network round trip
+        """
+        self.sqlite = sqlite3.connect(":memory:", check_same_thread=False, isolation_level="DEFERRED")
+        self.sqlite.executescript(_SCHEMA)
+        self.lock = threading.RLock()
+        self.__latency = latency
+
+    def round_trip(self):
+        if self.__latency:
+            time.sleep(self.__latency)
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.round_trip()
+        with self.lock:
+            self.sqlite.commit()
+
+    def rollback(self):
+        with self.lock:
+            self.sqlite.rollback()
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        pass
+
+
+class StandInDatabase(Database):
+    """
+    Database running its real queries against a StandInConnection instead of MySQL.
+    """
+
+    def __init__(self, latency=0.0):
+        """
+        :param latency: float number of seconds added to every statement and commit
+        """
+        super().__init__()
+        self.__connection = StandInConnection(latency)
+
+    def _connect(self):
+        return self.__connection
+
+    def seed_users(self, emails, hashed_password, admin_emails=()):
+        """
+        Create users with a shared password hash and an api_usage row each.
+
+        :param emails: list of email strings for regular users
+        :param hashed_password: string containing the bcrypt hash every user gets
+        :param admin_emails: list of email strings for admin users
+        """
+        with self.__connection.lock:
+            cursor = self.__connection.sqlite.cursor()
+            for email, is_admin in [(email, 0) for email in emails] + [(email, 1) for email in admin_emails]:
+                cursor.execute("INSERT INTO user (email, password, is_admin) VALUES (?, ?, ?)", (email, hashed_password, is_admin))
+                cursor.execute("INSERT INTO api_usage (uid) VALUES (?)", (cursor.lastrowid,))
+            self.__connection.sqlite.commit()
+
+
+def create_ai_backend(latency=0.2, jitter=0.05, fields=8, seed=None):
+    """
+    Build a stand-in AI backend app.
+
+    Each parse request waits latency plus or minus jitter seconds and returns a
+    data object with the given number of string fields.
+
+    :param latency: float mean response delay in seconds
+    :param jitter: float maximum deviation from the mean delay in seconds
+    :param fields: integer number of fields in the returned data object
+    :param seed: optional seed making the delays reproducible
+    :return: the FastAPI application
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    data = {f"field_{index}" : f"value {index}" for index in range(fields)}
+
+    async def parse(request: Request):
+        await request.body()
+        await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+        return {"data" : data}
+
+    async def head_root():
+        return Response(status_code=200)
+
+    app.add_api_route("/v1/json/parse", parse, methods=["POST"])
+    app.add_api_route("/v1/json/schemedParse", parse, methods=["POST"])
+    app.add_api_route("/", head_root, methods=["HEAD", "GET"])
+    return app
@@ -1,4 +1,7 @@
-from unicodedata import unidata_version
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from services.tracing import traced
+import os
 import pymysql
 
 
@@ -13,6 +16,13 @@ class Database:
     """
     Database class handling MySQL database connections and user-related operations.
     """
+    # granularity -> (table, bucket column type)
+    __USAGE_HISTORY_TABLES = {
+        "hour" : ("api_usage_hourly", "DATETIME"),
+        "day" : ("api_usage_daily", "DATE"),
+        "month" : ("api_usage_monthly", "DATE")
+    }
+    __HOUR_FORMAT = "%Y%m%d%H"
     def __init__(self, **kwargs):
         """
         Initialize a Database instance with connection parameters.
@@ -21,12 +31,104 @@ class Database:
         """
         self.__connection = None
         self.__data = kwargs 
+        self.__counters = None
+        self.__email_index = None
+        self.__history_tables_ready = False
+
+    def attach_counters(self, counters):
+        """
+        Route endpoint and usage increments through shared counters instead of one write per request.
+
+        Increments are written to MySQL in batches by flush_counters.
+
+        :param counters: SharedCounters instance shared by every worker process
+        """
+        self.__counters = counters
+
+    def attach_email_index(self, email_index):
+        """
+        Keep an EmailIndex current with user writes and use it in email_taken.
+
+        :param email_index: EmailIndex instance of this worker
+        """
+        self.__email_index = email_index
+
+    def prime_usage_cache(self, limit=None):
+        """
+        Cache the usage counts of the heaviest users in the shared counters.
+
+        Their first authenticate or AI request then needs no usage query. Counters that
+        already hold a value, for example from another worker, are left alone.
+
+        :param limit: optional integer number of users to prime, USAGE_CACHE_PRIME_LIMIT (default 1000) if omitted
+        :return: integer number of users primed
+        """
+        if self.__counters is None:
+            return 0
+        limit = limit if limit is not None else int(os.getenv("USAGE_CACHE_PRIME_LIMIT", "1000"))
+        generation = self.__counters.flush_generation()
+        if generation is None:
+            return 0
+        rows = self._fetchall(
+            "SELECT uid, usage_count FROM api_usage ORDER BY usage_count DESC LIMIT %s", (limit,)
+        )
+        primed = 0
+        for row in rows:
+            key = self.__usage_key(row["uid"])
+            cached = self.__counters.get(key)
+            if cached is not None and cached["value"] is not None:
+                continue
+            if self.__counters.set_value(key, row["usage_count"], generation=generation):
+                primed += 1
+        return primed
+
+    def load_email_index(self):
+        """
+        Fill the attached EmailIndex with every email in the user table.
+
+        :return: the index stats after loading, or None if no index is attached
+        """
+        if self.__email_index is None:
+            return None
+        rows = self._fetchall("SELECT email FROM user")
+        self.__email_index.load(row["email"] for row in rows)
+        return self.__email_index.stats()
+
+    def get_email_index_stats(self):
+        """
+        Return the size and memory footprint of the attached EmailIndex.
+
+        :return: a dictionary of index stats, or None if no index is attached
+        """
+        if self.__email_index is None:
+            return None
+        return self.__email_index.stats()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a Database instance from the DB_* environment variables (and .env file).
+
+        :return: a Database instance that has not connected yet
+        """
+        load_dotenv()
+        return cls(host=os.getenv("DB_HOST"), port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DATABASE"))
 
     def start_database(self):
         """
         Establish a connection to the MySQL database and create the user table if it doesn't exist.
         """
-        self.__connection = pymysql.connect(
+        self.__connection = self._connect()
+
+    def _connect(self):
+        """
+        Open a new DB-API connection with dictionary rows and manual commits.
+
+        :return: the pymysql connection
+        """
+        return pymysql.connect(
             host=self.__data["host"],
             port=self.__data["port"],
             user=self.__data["user"],
@@ -37,6 +139,46 @@ class Database:
             autocommit=False
             )
     
+    def ensure_usage_history_tables(self):
+        """
+        Create the hourly, daily, and monthly usage rollup tables if they don't exist.
+
+        Each table is keyed by (bucket, uid) so time-range scans read only the buckets in range,
+        with a secondary (uid, bucket) index for per-user history.
+
+        Called during startup warmup. If that fails, the first method touching the tables
+        creates them instead, and tries again on every call until it succeeds.
+        """
+        for table, bucket_type in self.__USAGE_HISTORY_TABLES.values():
+            self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                uid INT NOT NULL,
+                bucket {bucket_type} NOT NULL,
+                usage_count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, uid),
+                KEY idx_{table}_uid (uid, bucket)
+            )
+            """)
+        self.__history_tables_ready = True
+
+    def __ensure_history_tables(self):
+        """
+        Create the usage rollup tables unless this instance already has.
+        """
+        if not self.__history_tables_ready:
+            self.ensure_usage_history_tables()
+
+    def close(self):
+        """
+        Close the MySQL connection if one is open.
+        """
+        if self.__connection is not None:
+            try:
+                self.__connection.close()
+            except pymysql.Error:
+                pass
+            self.__connection = None
+
     def ensure_connection(self):
         if self.__connection is None:
             self.start_database()
@@ -65,7 +207,25 @@ class Database:
             self.__connection.commit()
             return cursor.lastrowid
 
+    def _execute_batch(self, statements):
+        """
+        Run several executemany statements in a single transaction.
 
+        :param statements: list of (query, list of params) tuples
+        """
+        self.ensure_connection()
+        try:
+            with self.__connection.cursor() as cursor:
+                for query, rows in statements:
+                    if rows:
+                        cursor.executemany(query, rows)
+            self.__connection.commit()
+        except pymysql.Error:
+            self.__connection.rollback()
+            raise
+
+
+    @traced("db.find_user")
     def find_user(self, identifier):
         """
         Find and retrieve a user from the database by email address or uid.
@@ -82,6 +242,7 @@ class Database:
 
     
 
+    @traced("db.user_exists")
     def user_exists(self, user_info):
         """
         Check if a user exists in the database by email address.
@@ -96,6 +257,22 @@ class Database:
         else:
             return False 
 
+    @traced("db.email_taken")
+    def email_taken(self, email):
+        """
+        Check whether an email belongs to a user, skipping the query when the index rules it out.
+
+        :param email: string containing the email address
+        :return: True if a user has this email, False otherwise
+        """
+        if self.__email_index is not None and not self.__email_index.might_contain(email):
+            return False
+        taken = self.user_exists({"email" : email})
+        if not taken and self.__email_index is not None:
+            self.__email_index.record_false_positive()
+        return taken
+
+    @traced("db.insert_user")
     def insert_user(self, user_info):
         """
         Insert a new user into the database with email, password, and admin status.
@@ -108,21 +285,48 @@ class Database:
             api_usage_query = """INSERT INTO api_usage (uid) VALUES (%s)"""
             uid = self._execute(user_query, (user_info["email"], user_info["password"], user_info["is_admin"]))
             self._execute(api_usage_query, (uid,))
+            self.__bump_versions(("user", None))
+            if self.__email_index is not None:
+                self.__email_index.add(user_info["email"])
             return True 
         except pymysql.IntegrityError:
             self.__connection.rollback()
+            # Another worker may have added it; remember it so the next attempt stops early
+            self.__index_existing_email(user_info["email"])
             return False
 
+    def __index_existing_email(self, email):
+        """
+        Add an email that failed the unique key to the index.
+
+        The write may also have failed on another constraint, so the email is added only
+        if an exact check finds it taken.
+
+        :param email: string containing the email address
+        """
+        if self.__email_index is not None and self.user_exists({"email" : email}):
+            self.__email_index.add(email)
+
+    @traced("db.get_api_usage")
     def get_api_usage(self, uid):
         """
         Retrieve the current API usage count for a user.
 
         If no usage row exists for the user, a new row is created with the default
-        usage count of 0.
+        usage count of 0. The count read from MySQL is cached in the shared counters unless
+        the key does not fit or a flush ran during the read; the row is returned then.
 
         :param uid: integer representing the user's unique identifier
         :return: integer representing the user's API usage count
         """
+        generation = None
+        if self.__counters is not None:
+            cached = self.__counters.get(self.__usage_key(uid))
+            if cached is not None and cached["value"] is not None:
+                return cached["value"]
+            # Taken before the read, so a flush committing meanwhile cannot be counted twice
+            generation = self.__counters.flush_generation()
+
         query = """SELECT usage_count FROM api_usage WHERE uid = %s"""
         usage = self._fetchone(query, (uid,))
 
@@ -131,19 +335,34 @@ class Database:
             # No row yet:  create one with default 0
             insert_query = """INSERT INTO api_usage (uid, usage_count) VALUES (%s, 0)"""
             self._execute(insert_query, (uid,))
-            return 0
+            usage = {"usage_count" : 0}
+
+        if generation is not None:
+            key = self.__usage_key(uid)
+            if self.__counters.set_value(key, usage["usage_count"], generation=generation):
+                return self.__counters.get(key)["value"]
 
         return usage["usage_count"]
 
+    @traced("db.increment_api_usage")
     def increment_api_usage(self, uid):
         """
         Increment the API usage count for a specific user by 1.
         
         :param uid: integer representing the user's unique identifier
         """
-        query = """UPDATE api_usage SET usage_count = usage_count + 1 WHERE uid = %s"""
-        self._execute(query, (uid,))
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        if self.__counters is not None and self.__counters.increment(self.__usage_key(uid)) is not None:
+            if self.__counters.increment(self.__history_key(uid, hour)) is None:
+                self.__ensure_history_tables()
+                self._execute_batch(self.__usage_history_statements([(uid, hour, 1)]))
+        else:
+            query = """UPDATE api_usage SET usage_count = usage_count + 1 WHERE uid = %s"""
+            self.__ensure_history_tables()
+            self._execute_batch([(query, [(uid,)])] + self.__usage_history_statements([(uid, hour, 1)]))
+        self.__bump_versions(("user", None), ("user", uid))
     
+    @traced("db.change_password")
     def change_password(self, uid, hashed_password):
         """
         Update the password for a specific user.
@@ -155,6 +374,7 @@ class Database:
         self._execute(query, (hashed_password, uid))
 
 
+    @traced("db.change_email")
     def change_email(self, uid, email):
         """
         Update the email address for a specific user.
@@ -163,14 +383,22 @@ class Database:
         :param email: string containing the new email address
         :return: True if update succeeded, False if email is already in use
         """
+        previous = self.find_user(uid) if self.__email_index is not None else None
         try:
             query = """UPDATE user SET email = %s WHERE uid = %s"""
             self._execute(query, (email, uid))
+            self.__bump_versions(("user", None), ("user", uid))
+            if self.__email_index is not None:
+                if previous is not None:
+                    self.__email_index.discard(previous["email"])
+                self.__email_index.add(email)
             return True
         except pymysql.IntegrityError:
             self.__connection.rollback()
+            self.__index_existing_email(email)
             return False
         
+    @traced("db.delete_user")
     def delete_user(self, uid):
         """
         Delete a user and all associated API usage data from the database.
@@ -178,14 +406,27 @@ class Database:
         :param uid: integer representing the user's unique identifier
         :return: True if a user was deleted, False otherwise
         """
-        # Delete from both tables 
+        user = self.find_user(uid) if self.__email_index is not None else None
+        # Delete from both tables and the usage history
         self._execute("DELETE FROM api_usage WHERE uid = %s", (uid,))
+        self.__ensure_history_tables()
+        for table, _ in self.__USAGE_HISTORY_TABLES.values():
+            self._execute(f"DELETE FROM {table} WHERE uid = %s", (uid,))
 
         query = "DELETE FROM user WHERE uid = %s"
         rows = self._execute(query, (uid,))
+        if self.__counters is not None:
+            self.__counters.discard(self.__usage_key(uid))
+            # Pending hourly usage would otherwise be flushed back into the history tables
+            for key in self.__counters.totals(f"h|{uid}|"):
+                self.__counters.discard(key)
+        self.__bump_versions(("user", None), ("user", uid))
+        if user is not None:
+            self.__email_index.discard(user["email"])
         return rows > 0
 
-    def update_endpoint(self, endpoint_info):
+    @traced("db.update_endpoint")
+    def update_endpoint(self, endpoint_info, bump_version=True):
         """
         Update or create an API request count entry for a given endpoint.
 
@@ -193,14 +434,24 @@ class Database:
         Otherwise, a new row is inserted with an initial count of 1.
 
         :param endpoint_info: dictionary containing 'method' and 'endpoint' keys
+        :param bump_version: False to leave the statistics version unchanged, for the statistics listing itself
         """
+        if self.__counters is not None:
+            key = self.__endpoint_key(endpoint_info["method"], endpoint_info["endpoint"])
+            if self.__counters.increment(key) is not None:
+                if bump_version:
+                    self.__bump_versions(("api_request_stats", None))
+                return
         query = """
         INSERT INTO api_request_stats (http_method, endpoint, request_count)
         VALUES (%s, %s, 1)
         ON DUPLICATE KEY UPDATE request_count = request_count + 1;
         """
         self._execute(query, (endpoint_info["method"], endpoint_info["endpoint"]))
+        if bump_version:
+            self.__bump_versions(("api_request_stats", None))
 
+    @traced("db.get_all_endpoints")
     def get_all_endpoints(self):
         """
         Retrieve all endpoint request statistics from the database.
@@ -208,15 +459,26 @@ class Database:
         :return: a list of dictionaries containing endpoint usage data
         """
         query = """SELECT * FROM api_request_stats"""
-        return self._fetchall(query)
+        endpoints = self._fetchall(query)
+        if self.__counters is None:
+            return endpoints
+
+        pending = self.__pending_endpoints()
+        for row in endpoints:
+            row["request_count"] += pending.pop((row["http_method"], row["endpoint"]), 0)
+        for (method, endpoint), count in pending.items():
+            endpoints.append({"http_method" : method, "endpoint" : endpoint, "request_count" : count})
+        return endpoints
         
 
+    @traced("db.get_users_with_usage")
     def get_users_with_usage(self):
         """
         Retrieve all users along with their API usage counts.
 
         This method performs a join between the user table and the api_usage table
-        to return combined information for each user.
+        to return combined information for each user. is_admin is normalized to 0 or 1
+        by the query, so rows can be handed to a typed response model unchanged.
 
         :return: list of dictionaries containing user and usage data
         """
@@ -224,7 +486,7 @@ class Database:
             SELECT
                 user.uid,
                 user.email,
-                user.is_admin,
+                (user.is_admin <> 0) AS is_admin,
                 api_usage.usage_count AS api_usage
             FROM user
             JOIN api_usage
@@ -232,12 +494,293 @@ class Database:
 
         """
         users = self._fetchall(query)  # list of dicts because of DictCursor
+        pending = self.__pending_usage()
 
-        for user in users:
-            user["is_admin"] = bool(user["is_admin"])
+        # Only users with unflushed usage need touching
+        if pending:
+            for user in users:
+                if user["uid"] in pending:
+                    user["api_usage"] += pending[user["uid"]]
 
         return users
 
+    @traced("db.flush_counters")
+    def flush_counters(self):
+        """
+        Write all unflushed endpoint and usage increments to MySQL.
+
+        Endpoint and usage totals are written in one transaction and the usage history in a
+        second one, so a problem with the rollup tables (for example, not yet created because
+        warmup failed) cannot hold back the totals. Only amounts that were committed are
+        marked as flushed, so a failed transaction is retried in full on the next flush.
+        Usage counts read from MySQL while the flush runs are not cached, since they may
+        already include amounts that are not yet marked as flushed.
+
+        :return: integer representing the number of counters written
+        """
+        if self.__counters is None:
+            return 0
+        self.__counters.begin_flush()
+        try:
+            return self.__flush_pending()
+        finally:
+            self.__counters.end_flush()
+
+    def __flush_pending(self):
+        """
+        Write the pending counters for flush_counters and mark what was committed.
+        """
+        deltas = self.__counters.pending()
+        endpoint_rows = []
+        usage_rows = []
+        history_rows = []
+        for key, delta in deltas.items():
+            kind, _, rest = key.partition("|")
+            if kind == "e":
+                method, _, endpoint = rest.partition("|")
+                endpoint_rows.append((method, endpoint, delta))
+            elif kind == "u":
+                usage_rows.append((delta, int(rest)))
+            elif kind == "h":
+                uid, _, hour = rest.partition("|")
+                history_rows.append((int(uid), datetime.strptime(hour, self.__HOUR_FORMAT), delta))
+        if endpoint_rows or usage_rows:
+            self._execute_batch([
+                ("""
+                INSERT INTO api_request_stats (http_method, endpoint, request_count)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE request_count = request_count + VALUES(request_count)
+                """, endpoint_rows),
+                ("""UPDATE api_usage SET usage_count = usage_count + %s WHERE uid = %s""", usage_rows)
+            ])
+            self.__counters.mark_flushed({key : delta for key, delta in deltas.items() if key[:2] in ("e|", "u|")})
+        if history_rows:
+            self.__ensure_history_tables()
+            self._execute_batch(self.__usage_history_statements(history_rows))
+            self.__counters.mark_flushed({key : delta for key, delta in deltas.items() if key.startswith("h|")})
+
+        # Hourly counters of past hours are only kept until they are flushed
+        current_hour = datetime.utcnow().strftime(self.__HOUR_FORMAT)
+        self.__counters.prune(lambda key: not key.startswith("h|") or key.endswith(current_hour))
+        return len(endpoint_rows) + len(usage_rows) + len(history_rows)
+
+    @traced("db.get_usage_history")
+    def get_usage_history(self, start, end, granularity, uid=None):
+        """
+        Retrieve API usage per time bucket from the rollup table of the given granularity.
+
+        :param start: datetime marking the inclusive start of the range
+        :param end: datetime marking the exclusive end of the range
+        :param granularity: one of "hour", "day", or "month"
+        :param uid: optional integer restricting the history to one user
+        :return: list of dictionaries containing bucket and usage_count, oldest first
+        """
+        self.__ensure_history_tables()
+        table, _ = self.__USAGE_HISTORY_TABLES[granularity]
+        query = f"""
+            SELECT bucket, SUM(usage_count) AS usage_count
+            FROM {table}
+            WHERE bucket >= %s AND bucket < %s
+        """
+        params = [start, end]
+        if uid is not None:
+            query += " AND uid = %s"
+            params.append(uid)
+        query += " GROUP BY bucket ORDER BY bucket"
+        rows = self._fetchall(query, params)
+        for row in rows:
+            row["usage_count"] = int(row["usage_count"])
+        return rows
+
+    @traced("db.get_top_users")
+    def get_top_users(self, start, end, limit):
+        """
+        Retrieve the users with the most API usage in a time range.
+
+        The range is split into whole months, whole days, and leftover hours, and each part
+        is read from the matching rollup table, so the rows scanned depend on the number of
+        buckets rather than the length of the range.
+
+        :param start: datetime marking the inclusive start of the range
+        :param end: datetime marking the exclusive end of the range
+        :param limit: integer number of users to return
+        :return: list of dictionaries containing uid, email, and usage_count, highest first
+        """
+        parts = []
+        params = []
+        for granularity, ranges in split_usage_range(start, end).items():
+            table, _ = self.__USAGE_HISTORY_TABLES[granularity]
+            for range_start, range_end in ranges:
+                parts.append(f"SELECT uid, usage_count FROM {table} WHERE bucket >= %s AND bucket < %s")
+                params.extend((range_start, range_end))
+        if not parts:
+            return []
+
+        self.__ensure_history_tables()
+        query = f"""
+            SELECT totals.uid, user.email, totals.usage_count
+            FROM (
+                SELECT uid, SUM(usage_count) AS usage_count
+                FROM ({" UNION ALL ".join(parts)}) AS buckets
+                GROUP BY uid
+                ORDER BY usage_count DESC
+                LIMIT %s
+            ) AS totals
+            JOIN user ON user.uid = totals.uid
+            ORDER BY totals.usage_count DESC
+        """
+        params.append(limit)
+        rows = self._fetchall(query, params)
+        for row in rows:
+            row["usage_count"] = int(row["usage_count"])
+        return rows
+
+    def get_version(self, table, uid=None):
+        """
+        Return the current version of a table, or of one user's row, for building ETags.
+
+        Versions are shared counters bumped by every write method that changes what the
+        table or row reads back as: "user" covers the user listing with usage counts and
+        "api_request_stats" the endpoint statistics. Writes made outside this class are not
+        seen. The counter epoch is part of the version, so versions from before a restart
+        never match.
+
+        :param table: string naming the versioned table, "user" or "api_request_stats"
+        :param uid: optional integer selecting one user's row of the user table
+        :return: string containing the version, or None if no version can be kept
+        """
+        if self.__counters is None:
+            return None
+        # Adding 0 creates the counter, so every later change to the row is counted
+        total = self.__counters.increment(self.__version_key(table, uid), 0)
+        if total is None:
+            return None
+        return f"{self.__counters.epoch}-{total}"
+
+    def __bump_versions(self, *versioned):
+        """
+        Advance the versions of the given (table, uid) pairs after a write.
+        """
+        if self.__counters is None:
+            return
+        for table, uid in versioned:
+            self.__counters.increment(self.__version_key(table, uid))
+
+    def __usage_history_statements(self, rows):
+        """
+        Build the upserts adding usage to the hourly table and its daily and monthly rollups.
+
+        :param rows: list of (uid, hour datetime, amount) tuples
+        :return: list of (query, params list) tuples for _execute_batch
+        """
+        if not rows:
+            return []
+        statements = []
+        for granularity in ("hour", "day", "month"):
+            table, _ = self.__USAGE_HISTORY_TABLES[granularity]
+            params = [(uid, truncate_bucket(hour, granularity), amount) for uid, hour, amount in rows]
+            statements.append((f"""
+                INSERT INTO {table} (uid, bucket, usage_count)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE usage_count = usage_count + VALUES(usage_count)
+                """, params))
+        return statements
+
+    def __pending_endpoints(self):
+        """
+        Return unflushed endpoint increments keyed by (http_method, endpoint).
+        """
+        pending = {}
+        for key, delta in self.__counters.pending("e|").items():
+            method, _, endpoint = key[2:].partition("|")
+            pending[(method, endpoint)] = delta
+        return pending
+
+    def __pending_usage(self):
+        """
+        Return unflushed usage increments keyed by uid.
+        """
+        if self.__counters is None:
+            return {}
+        return {int(key[2:]) : delta for key, delta in self.__counters.pending("u|").items()}
+
+    @staticmethod
+    def __endpoint_key(method, endpoint):
+        return f"e|{method}|{endpoint}"
+
+    @staticmethod
+    def __usage_key(uid):
+        return f"u|{uid}"
+
+    @staticmethod
+    def __version_key(table, uid=None):
+        return f"v|{table}" if uid is None else f"v|{table}|{uid}"
+
+    @classmethod
+    def __history_key(cls, uid, hour):
+        return f"h|{uid}|{hour.strftime(cls.__HOUR_FORMAT)}"
+
+
+def truncate_bucket(moment, granularity):
+    """
+    Truncate a datetime to the start of its hour, day, or month.
+
+    :param moment: the datetime to truncate
+    :param granularity: one of "hour", "day", or "month"
+    :return: the truncated datetime
+    """
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity in ("day", "month"):
+        moment = moment.replace(hour=0)
+    if granularity == "month":
+        moment = moment.replace(day=1)
+    return moment
+
+
+def _next_month(moment):
+    return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def split_usage_range(start, end):
+    """
+    Split [start, end) into whole months, whole days, and leftover hours.
+
+    :param start: datetime marking the inclusive start, truncated to the hour
+    :param end: datetime marking the exclusive end, truncated to the hour
+    :return: a dictionary mapping "month", "day", and "hour" to lists of (start, end) tuples
+    """
+    start = truncate_bucket(start, "hour")
+    end = truncate_bucket(end, "hour")
+    parts = {"month" : [], "day" : [], "hour" : []}
+    if start >= end:
+        return parts
+
+    day_start = truncate_bucket(start, "day")
+    if day_start < start:
+        day_start += timedelta(days=1)
+    day_end = truncate_bucket(end, "day")
+    if day_start >= day_end:
+        parts["hour"].append((start, end))
+        return parts
+    if start < day_start:
+        parts["hour"].append((start, day_start))
+    if day_end < end:
+        parts["hour"].append((day_end, end))
+
+    month_start = truncate_bucket(day_start, "month")
+    if month_start < day_start:
+        month_start = _next_month(month_start)
+    month_end = truncate_bucket(day_end, "month")
+    if month_start >= month_end:
+        parts["day"].append((day_start, day_end))
+        return parts
+    if day_start < month_start:
+        parts["day"].append((day_start, month_start))
+    if month_end < day_end:
+        parts["day"].append((month_end, day_end))
+    parts["month"].append((month_start, month_end))
+    return parts
+
             
 
 
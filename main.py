@@ -1,69 +1,205 @@
-from dotenv import load_dotenv
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from database.database import Database
-from routers import auth, ai, profile, admin
-import os 
+from middleware.admission import AdmissionController, AdmissionMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.in_flight import InFlightRequests, InFlightMiddleware
+from middleware.request_id import RequestIdMiddleware
+from middleware.timing import TimingMiddleware
+from services.ai_backend import AIBackend
+from services.scheduler import FairScheduler
+from services.email_index import EmailIndex
+from services.live_stats import LiveStats
+from services.logger import configure_logging, shutdown_logging, get_logger
+from services.shared_state import SharedCounters
+from services.tracing import TraceExporter
+from services.json_response import FastJSONResponse
+from routers import auth, ai, profile, admin, health
+import asyncio
+import os
+import threading
 
 """
 Main application module for initializing and configuring the FastAPI application.
 
-This module sets up the FastAPI instance, configures CORS middleware,
-loads environment variables, and registers all API routers.
+This module sets up the FastAPI instance, configures CORS middleware, and registers
+all API routers. Connections to MySQL and the AI backend are opened by the
+application lifespan at startup, not at import time, so that the first request
+does not pay for the connection handshakes.
 """
 
-load_dotenv()
-
-db_info = {"host" : os.getenv("DB_HOST"), "port" : int(os.getenv("DB_PORT")), 
-"user" : os.getenv("DB_USER"), "password" : os.getenv("DB_PASSWORD"), 
-"database" : os.getenv("DATABASE")}
-
-db = Database(**db_info)
-
-routers = [
-    auth.AuthRouter(db).get_router(), 
-    ai.AI(db).get_router(),
-    profile.ProfileRouter(db).get_router(),
-    admin.Admin(db).get_router()
-]
+logger = get_logger("main")
 
 
 class App:
     """
     Application class for configuring and managing the FastAPI instance.
     """
-    def __init__(self):
+    def __init__(self, db=None, ai_backend=None, counters=None):
         """
         Initialize an App instance with a FastAPI application and configure middleware.
+
+        No connection is opened here; see the lifespan for startup and shutdown.
+
+        :param db: optional database instance, built from the environment if omitted
+        :param ai_backend: optional AIBackend instance, built from the environment if omitted
+        :param counters: optional SharedCounters instance, attached to SHARED_STATE_PATH or private if omitted
         """
         self.origins = [
-            "https://4537-project-frontend.netlify.app", 
-            "http://localhost:8000", # Local host server 
+            "https://4537-project-frontend.netlify.app",
+            "http://localhost:8000", # Local host server
             "http://127.0.0.1:5500", # Live server
-            "http://127.0.0.1:8080", # AI backend local host 
-        ]                       
-        self.__app = FastAPI()
+            "http://127.0.0.1:8080", # AI backend local host
+        ]
+        self.__db = db if db is not None else Database.from_env()
+        self.__ai_backend = ai_backend if ai_backend is not None else AIBackend(os.getenv("AI_BACKEND_URL"))
+        self.__counters = counters if counters is not None else SharedCounters(os.getenv("SHARED_STATE_PATH"))
+        self.__flush_seconds = float(os.getenv("COUNTER_FLUSH_SECONDS", "5"))
+        self.__flush_task = None
+        self.__flush_lock = threading.Lock()
+        self.__drain_seconds = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "10"))
+        self.__in_flight = InFlightRequests()
+        self.__db.attach_counters(self.__counters)
+        self.__db.attach_email_index(EmailIndex())
+        self.__scheduler = FairScheduler()
+        self.__live_stats = LiveStats(self.__counters)
+        self.__trace_exporter = TraceExporter()
+        self.__admission = AdmissionController()
+        self.__health = health.HealthRouter(self.__admission)
+        self.__app = FastAPI(lifespan=self.__lifespan, default_response_class=FastJSONResponse)
         # TODO: Temporary fix for CORS Middleware issue
         self.__add_middleware()
-        self.add_routers(routers)
-    
+        self.add_routers([
+            self.__health.get_router(),
+            auth.AuthRouter(self.__db).get_router(),
+            ai.AI(self.__db, self.__ai_backend, self.__scheduler).get_router(),
+            profile.ProfileRouter(self.__db).get_router(),
+            admin.Admin(self.__db, self.__scheduler, self.__live_stats).get_router()
+        ])
+
+    @asynccontextmanager
+    async def __lifespan(self, app):
+        """
+        Run warmup before the server accepts traffic and drain resources on shutdown.
+
+        :param app: the FastAPI application being served
+        """
+        await self.__startup()
+        try:
+            yield
+        finally:
+            await self.__shutdown()
+
+    async def __startup(self):
+        """
+        Start the log writer, open the database connection and warm the AI backend
+        connection concurrently, then mark the application as ready.
+        """
+        configure_logging()
+        self.__trace_exporter.start()
+        db_ok, ai_ok = await asyncio.gather(
+            self.__warm_database(),
+            self.__ai_backend.warmup()
+        )
+        self.__health.record_warmup("database", db_ok)
+        self.__health.record_warmup("ai_backend", ai_ok)
+        self.__flush_task = asyncio.create_task(self.__flush_loop())
+        self.__health.mark_ready()
+
+    async def __warm_database(self):
+        """
+        Open the database connection in a worker thread so it overlaps with the AI warmup.
+
+        :return: True if the connection was opened, False otherwise
+        """
+        try:
+            await asyncio.to_thread(self.__db.start_database)
+            await asyncio.to_thread(self.__db.ensure_usage_history_tables)
+            await asyncio.to_thread(self.__db.prime_usage_cache)
+            index_stats = await asyncio.to_thread(self.__db.load_email_index)
+            if index_stats is not None:
+                logger.info("email index loaded", extra={"items" : index_stats["items"], "memory_bytes" : index_stats["memory_bytes"]})
+            return True
+        except Exception:
+            # The connection is retried lazily by ensure_connection on the first query
+            return False
+
+    async def __flush_loop(self):
+        """
+        Periodically write shared counters to MySQL from the single leader worker.
+
+        Every worker runs this loop, but only the worker holding the leader role flushes.
+        The leader renews its lease on every tick; if it dies, another worker claims the
+        role once the lease of three flush intervals runs out. The flush runs in a worker
+        thread so that the database round trips do not block the event loop.
+        """
+        while True:
+            await asyncio.sleep(self.__flush_seconds)
+            if self.__counters.claim_leader(3 * self.__flush_seconds):
+                await asyncio.to_thread(self.__flush_counters)
+
+    def __flush_counters(self):
+        """
+        Flush shared counters, keeping them pending if the database is unavailable.
+
+        Flushes are serialized, because cancelling the flush loop at shutdown does not
+        stop a flush already running in its thread.
+        """
+        with self.__flush_lock:
+            try:
+                self.__db.flush_counters()
+            except Exception as error:
+                logger.error("counter flush failed", extra={"error" : str(error)})
+
+    async def __shutdown(self):
+        """
+        Stop reporting ready, end dashboard streams, wait up to SHUTDOWN_DRAIN_SECONDS for running
+        requests, flush counters if this worker is the leader, close the AI backend and database
+        connections, and drain the trace and log queues.
+        """
+        self.__health.mark_draining()
+        await self.__live_stats.close()
+        if not await self.__in_flight.wait_idle(self.__drain_seconds):
+            logger.warning("shutting down with requests still running", extra={"active" : self.__in_flight.active})
+        if self.__flush_task is not None:
+            self.__flush_task.cancel()
+        if self.__counters.claim_leader(3 * self.__flush_seconds):
+            await asyncio.to_thread(self.__flush_counters)
+            self.__counters.release_leader()
+        await self.__ai_backend.close()
+        self.__db.close()
+        self.__trace_exporter.stop()
+        shutdown_logging()
+
     def __add_middleware(self):
         """
-        Configure CORS middleware.
+        Configure admission control, response compression, CORS, timing, request id, and in-flight middleware.
+
+        Admission is innermost so that shed responses still get CORS, timing, and request id headers.
+        In-flight counting is outermost so that shutdown waits for the whole response.
         """
+        self.__app.add_middleware(AdmissionMiddleware, controller=self.__admission)
+        self.__app.add_middleware(
+                CompressionMiddleware,
+                minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+            )
         self.__app.add_middleware(
                 CORSMiddleware,
                 allow_origins=self.origins,
                 allow_credentials=True,
                 allow_methods=["*"],
-                allow_headers=["*"]
+                allow_headers=["*"],
+                expose_headers=["X-Request-ID", "Server-Timing", "ETag"]
             )
+        self.__app.add_middleware(TimingMiddleware, exporter=self.__trace_exporter)
+        self.__app.add_middleware(RequestIdMiddleware)
+        self.__app.add_middleware(InFlightMiddleware, tracker=self.__in_flight)
 
     def add_routers(self, routers):
         """
         Register a list of API routers to the FastAPI app.
-        
+
         :param routers: a list of APIRouter objects to be included in the app
         """
 
@@ -73,13 +209,11 @@ class App:
     def get_app(self):
         """
         Return the FastAPI instance.
-        
+
         :return: the FastAPI application object
         """
         return self.__app
 
 app_instance = App()
-# app_instance.add_routers(routers)
 
 app = app_instance.get_app()
-
@@ -0,0 +1,208 @@
+from collections import deque
+import asyncio
+import json
+import math
+import os
+
+"""
+Admission middleware module for bounding concurrent work per route class.
+
+This module provides the ConcurrencyLimiter class, a FIFO limiter that sheds requests
+that cannot start within a deadline, the AdmissionController class holding one limiter
+per route class (auth, AI, or admin), and the AdmissionMiddleware class applying them.
+Requests over the limit wait briefly in a bounded queue; when the queue is full or the
+wait exceeds the deadline, the client gets an immediate 503 with Retry-After instead
+of a slow timeout.
+"""
+
+
+class ConcurrencyLimiter:
+    """
+    FIFO limiter admitting a fixed number of requests at once.
+    """
+
+    def __init__(self, limit, max_queue, queue_timeout):
+        """
+        Initialize an idle ConcurrencyLimiter.
+
+        :param limit: integer number of requests admitted at once
+        :param max_queue: integer number of requests allowed to wait for a slot
+        :param queue_timeout: float number of seconds a request may wait before it is shed
+        """
+        self.__limit = limit
+        self.__max_queue = max_queue
+        self.__queue_timeout = queue_timeout
+        self.__in_flight = 0
+        self.__waiters = deque()
+        self.__admitted = 0
+        self.__shed = 0
+        self.__peak_in_flight = 0
+
+    @property
+    def retry_after(self):
+        """
+        Return the number of seconds a shed client is asked to wait.
+        """
+        return max(1, math.ceil(self.__queue_timeout))
+
+    async def acquire(self):
+        """
+        Wait for a slot. Callers must call release() once the request is done.
+
+        :return: True if the request was admitted, False if it was shed
+        """
+        if self.__in_flight < self.__limit and not self.__waiters:
+            self.__admit()
+            return True
+        if len(self.__waiters) >= self.__max_queue:
+            self.__shed += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self.__waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.__queue_timeout)
+        except BaseException as error:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ended; hand the slot to the next request
+                self.release()
+            elif future in self.__waiters:
+                self.__waiters.remove(future)
+            if isinstance(error, asyncio.TimeoutError):
+                self.__shed += 1
+                return False
+            raise
+        return True
+
+    def release(self):
+        """
+        Return a slot and admit the next waiting request.
+        """
+        self.__in_flight -= 1
+        while self.__waiters and self.__in_flight < self.__limit:
+            future = self.__waiters.popleft()
+            if not future.done():
+                self.__admit()
+                future.set_result(None)
+
+    def stats(self):
+        """
+        Return the limiter's configuration and counters.
+
+        :return: a dictionary with limit, in_flight, queued, admitted, shed, and peak_in_flight
+        """
+        return {
+            "limit" : self.__limit,
+            "max_queue" : self.__max_queue,
+            "queue_timeout_seconds" : self.__queue_timeout,
+            "in_flight" : self.__in_flight,
+            "queued" : len(self.__waiters),
+            "admitted" : self.__admitted,
+            "shed" : self.__shed,
+            "peak_in_flight" : self.__peak_in_flight
+        }
+
+    def __admit(self):
+        self.__in_flight += 1
+        self.__admitted += 1
+        self.__peak_in_flight = max(self.__peak_in_flight, self.__in_flight)
+
+
+class AdmissionController:
+    """
+    Set of ConcurrencyLimiters, one per route class.
+
+    ADMISSION_<CLASS>_LIMIT sets the concurrent requests per class (AUTH 16, AI 64,
+    ADMIN 8 by default) and ADMISSION_<CLASS>_QUEUE the requests that may wait
+    (default 4 times the limit). ADMISSION_QUEUE_TIMEOUT is the longest a request may
+    wait in seconds (default 1). Paths outside every class, such as the health probes
+    and the admin stats stream, are never limited.
+    """
+    # (class name, path prefixes, default limit); password hashing also runs on the profile routes
+    ROUTE_CLASSES = (
+        ("auth", ("/api/v1/auth/", "/api/v1/user/"), 16),
+        ("ai", ("/api/v1/service/ai/",), 64),
+        ("admin", ("/api/v1/admin/",), 8),
+    )
+    EXEMPT_PATHS = ("/api/v1/health/", "/api/v1/admin/stream")
+
+    def __init__(self):
+        """
+        Initialize one limiter per route class from the environment.
+        """
+        queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1"))
+        self.__limiters = {}
+        for name, _, default_limit in self.ROUTE_CLASSES:
+            limit = int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", str(default_limit)))
+            max_queue = int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(limit * 4)))
+            self.__limiters[name] = ConcurrencyLimiter(limit, max_queue, queue_timeout)
+
+    def limiter_for(self, path):
+        """
+        Return the limiter for a request path.
+
+        :param path: string containing the request path
+        :return: the ConcurrencyLimiter of the path's route class, or None if the path is not limited
+        """
+        if path.startswith(self.EXEMPT_PATHS):
+            return None
+        for name, prefixes, _ in self.ROUTE_CLASSES:
+            if path.startswith(prefixes):
+                return self.__limiters[name]
+        return None
+
+    def stats(self):
+        """
+        Return the admission counters of every route class.
+
+        :return: a dictionary mapping class names to limiter stats
+        """
+        return {name : limiter.stats() for name, limiter in self.__limiters.items()}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting or shedding each request through its route class limiter.
+    """
+
+    def __init__(self, app, controller):
+        """
+        :param app: the ASGI application to wrap
+        :param controller: AdmissionController holding the route class limiters
+        """
+        self.__app = app
+        self.__controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.__app(scope, receive, send)
+            return
+        limiter = self.__controller.limiter_for(scope["path"])
+        if limiter is None:
+            await self.__app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            await self.__reject(send, limiter.retry_after)
+            return
+        try:
+            await self.__app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    @staticmethod
+    async def __reject(send, retry_after):
+        """
+        Send the 503 response for a shed request without touching the application.
+        """
+        body = json.dumps({"detail" : {"message" : "server is overloaded, retry later"}}).encode("utf-8")
+        await send({
+            "type" : "http.response.start",
+            "status" : 503,
+            "headers" : [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(retry_after).encode("latin-1"))
+            ]
+        })
+        await send({"type" : "http.response.body", "body" : body})
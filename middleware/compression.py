@@ -0,0 +1,212 @@
+from collections import OrderedDict
+import asyncio
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+Compression middleware module for negotiated response compression.
+
+This module provides the CompressionMiddleware class, an ASGI middleware that
+compresses complete response bodies with zstd, brotli, or gzip depending on the
+client's Accept-Encoding header. brotli and zstandard are optional; without them
+only gzip is offered.
+"""
+
+
+def compress(data, encoding):
+    """
+    Compress bytes with the given content encoding.
+
+    :param data: bytes to compress
+    :param encoding: one of "zstd", "br", or "gzip"
+    :return: the compressed bytes
+    """
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=6)
+
+
+def available_encodings():
+    """
+    Return the encodings this process can produce, in order of server preference.
+
+    :return: a list of content-coding names
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies above a size threshold.
+
+    Only single-message bodies are compressed. Streaming responses pass through
+    uncompressed. Every response with a compressible content type carries
+    Vary: Accept-Encoding, whether or not this particular one was compressed. Large
+    bodies are compressed in a worker thread so the event loop keeps serving other
+    requests. The most recent compressed bodies are cached by content digest, so
+    repeated identical responses skip compression.
+    """
+    __COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+    def __init__(self, app, minimum_size=1024, offload_size=64 * 1024, cache_entries=128):
+        """
+        Initialize a CompressionMiddleware wrapping an ASGI app.
+
+        :param app: the ASGI application to wrap
+        :param minimum_size: integer number of bytes below which bodies are sent uncompressed
+        :param offload_size: integer number of bytes above which compression runs off the event loop
+        :param cache_entries: integer number of compressed bodies to keep
+        """
+        self.__app = app
+        self.__minimum_size = minimum_size
+        self.__offload_size = offload_size
+        self.__cache_entries = cache_entries
+        self.__cache = OrderedDict()
+        self.__encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.__app(scope, receive, send)
+            return
+        encoding = self.__negotiate(scope)
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            if not self.__is_compressible(start):
+                await send(start)
+                await send(message)
+                return
+
+            # Caches must key on Accept-Encoding even when this response went out uncompressed
+            headers = self.__with_vary(start["headers"])
+            if encoding is None or message.get("more_body", False) or len(body) < self.__minimum_size:
+                await send({**start, "headers" : headers})
+                await send(message)
+                return
+
+            compressed = await self.__compress(body, encoding)
+            headers = [(name, value) for name, value in headers if name.lower() != b"content-length"]
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            await send({**start, "headers" : headers})
+            await send({"type" : "http.response.body", "body" : compressed})
+
+        await self.__app(scope, receive, send_wrapper)
+        if start_message is not None:
+            # The app finished without sending a body message
+            await send(start_message)
+
+    def __negotiate(self, scope):
+        """
+        Pick the preferred encoding the client accepts, honouring q-values.
+
+        :param scope: the ASGI connection scope
+        :return: the chosen content-coding name, or None to send the body as-is
+        """
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+                break
+        if not accept:
+            return None
+
+        accepted = {}
+        for part in accept.decode("latin-1").split(","):
+            coding, _, params = part.strip().partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[coding.strip().lower()] = quality
+
+        best = None
+        best_quality = 0.0
+        for encoding in self.__encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def __is_compressible(self, start):
+        """
+        Check whether a response has a content type that is compressed and is not encoded already.
+        """
+        content_type = b""
+        for name, value in start["headers"]:
+            lowered = name.lower()
+            if lowered == b"content-encoding":
+                return False
+            if lowered == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").startswith(self.__COMPRESSIBLE_TYPES)
+
+    @staticmethod
+    def __with_vary(headers):
+        """
+        Return the headers with Accept-Encoding merged into a single Vary header.
+        """
+        vary = []
+        others = []
+        for name, value in headers:
+            if name.lower() == b"vary":
+                vary.extend(part.strip() for part in value.split(b",") if part.strip())
+            else:
+                others.append((name, value))
+        if not any(part == b"*" or part.lower() == b"accept-encoding" for part in vary):
+            vary.append(b"Accept-Encoding")
+        others.append((b"vary", b", ".join(vary)))
+        return others
+
+    async def __compress(self, body, encoding):
+        """
+        Compress a body, reusing a cached result for identical content.
+
+        :return: the compressed bytes
+        """
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        cached = self.__cache.get(key)
+        if cached is not None:
+            self.__cache.move_to_end(key)
+            return cached
+
+        if len(body) >= self.__offload_size:
+            compressed = await asyncio.to_thread(compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+
+        self.__cache[key] = compressed
+        if len(self.__cache) > self.__cache_entries:
+            self.__cache.popitem(last=False)
+        return compressed
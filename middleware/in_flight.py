@@ -0,0 +1,83 @@
+import asyncio
+
+"""
+In-flight middleware module for letting shutdown wait for running requests.
+
+This module provides the InFlightRequests class, which counts the HTTP requests
+currently being handled, and the InFlightMiddleware class that maintains the count.
+The lifespan waits on InFlightRequests before closing the AI client and the
+database, so requests still running when draining starts can finish.
+"""
+
+
+class InFlightRequests:
+    """
+    Counter of HTTP requests being handled by this worker.
+    """
+
+    def __init__(self):
+        """
+        Initialize an idle counter.
+        """
+        self.__active = 0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+
+    @property
+    def active(self):
+        """
+        Return the number of requests being handled.
+        """
+        return self.__active
+
+    def started(self):
+        """
+        Record that a request started.
+        """
+        self.__active += 1
+        self.__idle.clear()
+
+    def finished(self):
+        """
+        Record that a request finished.
+        """
+        self.__active -= 1
+        if self.__active == 0:
+            self.__idle.set()
+
+    async def wait_idle(self, timeout):
+        """
+        Wait until no request is being handled, or until the timeout passes.
+
+        :param timeout: float number of seconds to wait at most
+        :return: True if every request finished, False if some were still running
+        """
+        try:
+            await asyncio.wait_for(self.__idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class InFlightMiddleware:
+    """
+    ASGI middleware counting every HTTP request in an InFlightRequests instance.
+    """
+
+    def __init__(self, app, tracker):
+        """
+        :param app: the ASGI application to wrap
+        :param tracker: InFlightRequests instance shared with the lifespan
+        """
+        self.__app = app
+        self.__tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.__app(scope, receive, send)
+            return
+        self.__tracker.started()
+        try:
+            await self.__app(scope, receive, send)
+        finally:
+            self.__tracker.finished()
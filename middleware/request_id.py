@@ -0,0 +1,49 @@
+from services.logger import request_id_var
+import uuid
+
+"""
+Request id middleware module for correlating log records with requests.
+
+This module provides the RequestIdMiddleware class, which takes the X-Request-ID
+header from the client (or generates one), makes it available to log records
+through a context variable, and echoes it on the response.
+"""
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware assigning a request id to every HTTP request.
+    """
+    __MAX_LENGTH = 128
+
+    def __init__(self, app):
+        """
+        :param app: the ASGI application to wrap
+        """
+        self.__app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.__app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:self.__MAX_LENGTH]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers" : headers}
+            await send(message)
+
+        try:
+            await self.__app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
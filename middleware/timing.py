@@ -0,0 +1,53 @@
+from services.logger import request_id_var
+from services.tracing import start_trace, end_trace
+
+"""
+Timing middleware module for per-request timing breakdowns.
+
+This module provides the TimingMiddleware class, which starts a trace for every
+HTTP request, adds the spans as a Server-Timing response header, and hands the
+finished trace to the exporter for sampling.
+"""
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header to every HTTP response.
+    """
+
+    def __init__(self, app, exporter):
+        """
+        :param app: the ASGI application to wrap
+        :param exporter: TraceExporter receiving finished traces
+        """
+        self.__app = app
+        self.__exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.__app(scope, receive, send)
+            return
+
+        trace, token = start_trace(f"{scope['method']} {scope['path']}")
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers" : headers}
+            await send(message)
+
+        try:
+            await self.__app(scope, receive, send_wrapper)
+        finally:
+            trace.finish()
+            end_trace(token)
+            self.__exporter.offer(trace, {
+                "http.method" : scope["method"],
+                "http.route" : scope["path"],
+                "http.status_code" : status_code,
+                "request_id" : request_id_var.get()
+            })
@@ -1,5 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request, status, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import Optional
 from .auth import AuthUtility
+from schemas.admin_schema import UserUsage, EndpointStats, StatsSnapshot
+from pydantic import BaseModel
+from services import conditional
+import asyncio
+import json
+import time
 
 class Admin:
     """
@@ -9,15 +18,27 @@ class Admin:
     __DELETE_USER_ENDPOINT = "/api/v1/admin/user/{uid}"
     __GET_ALL_USERS_ENDPOINT = "/api/v1/admin/users"
     __GET_ALL_ENDPOINTS_ENDPOINT = "/api/v1/admin/endpoints"
+    __GET_USAGE_HISTORY_ENDPOINT = "/api/v1/admin/usage"
+    __GET_TOP_USERS_ENDPOINT = "/api/v1/admin/usage/top"
+    __GET_AI_QUEUE_ENDPOINT = "/api/v1/admin/ai/queue"
+    __GET_EMAIL_INDEX_ENDPOINT = "/api/v1/admin/email-index"
+    __STATS_STREAM_ENDPOINT = "/api/v1/admin/stream"
+    __STREAM_KEEPALIVE_SECONDS = 15
+    __GRANULARITIES = ("hour", "day", "month")
+    __MAX_TOP_USERS = 100
 
-    def __init__(self, db):
+    def __init__(self, db, scheduler, live_stats):
         """
         Initialize an Admin router instance with database access.
 
         :param db: database instance used for executing admin-level operations
+        :param scheduler: FairScheduler whose queue statistics are reported
+        :param live_stats: LiveStats broadcaster feeding the dashboard stream
         """
         self.__router = APIRouter()
         self.__db = db
+        self.__scheduler = scheduler
+        self.__live_stats = live_stats
         self.__add_routes()
         
     def __add_routes(self):
@@ -25,8 +46,15 @@ class Admin:
         Register admin-specific API routes to the router.
         """
         self.__router.add_api_route(path=self.__DELETE_USER_ENDPOINT, endpoint=self.__handle_user_delete, methods=["DELETE"])
-        self.__router.add_api_route(path=self.__GET_ALL_USERS_ENDPOINT, endpoint=self.__handle_get_users, methods=["GET"])
-        self.__router.add_api_route(path=self.__GET_ALL_ENDPOINTS_ENDPOINT, endpoint=self.__handle_get_endpoints, methods=["GET"])
+        self.__router.add_api_route(path=self.__GET_ALL_USERS_ENDPOINT, endpoint=self.__handle_get_users, methods=["GET"],
+                                    response_model=list[UserUsage])
+        self.__router.add_api_route(path=self.__GET_ALL_ENDPOINTS_ENDPOINT, endpoint=self.__handle_get_endpoints, methods=["GET"],
+                                    response_model=list[EndpointStats])
+        self.__router.add_api_route(path=self.__GET_USAGE_HISTORY_ENDPOINT, endpoint=self.__handle_get_usage_history, methods=["GET"])
+        self.__router.add_api_route(path=self.__GET_TOP_USERS_ENDPOINT, endpoint=self.__handle_get_top_users, methods=["GET"])
+        self.__router.add_api_route(path=self.__GET_AI_QUEUE_ENDPOINT, endpoint=self.__handle_get_ai_queue, methods=["GET"])
+        self.__router.add_api_route(path=self.__GET_EMAIL_INDEX_ENDPOINT, endpoint=self.__handle_get_email_index, methods=["GET"])
+        self.__router.add_api_route(path=self.__STATS_STREAM_ENDPOINT, endpoint=self.__handle_stats_stream, methods=["GET"])
         
     def get_router(self):
         """
@@ -62,13 +90,15 @@ class Admin:
         
         return Response(status_code=status.HTTP_204_NO_CONTENT)
         
-    async def __handle_get_users(self, request: Request):
+    async def __handle_get_users(self, request: Request, response: Response):
         """
         Handle requests for retrieving all users along with their API usage counts.
 
-        This endpoint verifies admin privileges before returning user data.
+        This endpoint verifies admin privileges before returning user data. The response
+        carries an ETag from the user table version, and a matching If-None-Match gets a 304.
 
         :param request: the incoming HTTP request object
+        :param response: the response whose caching headers are set
         :return: a list of users with usage information
         :raises HTTPException: if requester is not admin
         """
@@ -78,6 +108,9 @@ class Admin:
         is_admin = AuthUtility.check_is_admin(payload, self.__db)
         
         if is_admin:
+            cached = self.__revalidate(request, response, "user")
+            if cached is not None:
+                return cached
             return AdminUtility.get_users(self.__db)
         else:
            raise HTTPException(
@@ -85,22 +118,30 @@ class Admin:
                 detail="Admin access required",
             ) 
 
-    async def __handle_get_endpoints(self, request: Request):
+    async def __handle_get_endpoints(self, request: Request, response: Response):
         """
         Handle endpoint statistics retrieval requests.
 
-        This returns all API endpoints and their tracked request counts.
+        This returns all API endpoints and their tracked request counts. The response
+        carries an ETag from the statistics version, and a matching If-None-Match gets a 304.
+        Requests to this listing are counted without advancing the version, since otherwise
+        every revalidation would change the ETag it is checked against. A cached listing can
+        therefore lag behind on its own request count only.
 
         :param request: the incoming HTTP request object
+        :param response: the response whose caching headers are set
         :return: a list of endpoint usage statistics
         :raises HTTPException: if requester is not admin
         """
         endpoint_info = {"method" : "GET", "endpoint" : self.__GET_ALL_ENDPOINTS_ENDPOINT}
-        self.__db.update_endpoint(endpoint_info)
+        self.__db.update_endpoint(endpoint_info, bump_version=False)
         payload = AuthUtility.authenticate(request)
         is_admin = AuthUtility.check_is_admin(payload, self.__db)
 
         if is_admin:
+            cached = self.__revalidate(request, response, "api_request_stats")
+            if cached is not None:
+                return cached
             return AdminUtility.get_endpoints(self.__db)
         else:
             raise HTTPException(
@@ -108,7 +149,192 @@ class Admin:
                 detail="Admin access required",
             ) 
 
-        
+
+    def __revalidate(self, request, response, table):
+        """
+        Answer an admin's If-None-Match request for a listing that has not changed.
+
+        The version is read before the listing, so a concurrent write can only make the
+        ETag older. On a miss the ETag and caching headers are set on the response.
+
+        :param request: the incoming HTTP request object, already counted and authorized
+        :param response: the response whose caching headers are set on a miss
+        :param table: string naming the table version the listing depends on
+        :return: a 304 Response, or None if the listing should be sent
+        """
+        etag = conditional.make_etag(self.__db.get_version(table))
+        if conditional.matches(request, etag):
+            return conditional.not_modified(etag)
+        conditional.set_cache_headers(response, etag)
+        return None
+
+    async def __handle_get_usage_history(self, request: Request, start: datetime, end: datetime,
+                                         granularity: str = "day", uid: Optional[int] = None):
+        """
+        Handle requests for API usage over time, for all users or a single user.
+
+        :param request: the incoming HTTP request object
+        :param start: datetime marking the inclusive start of the range (UTC if no offset is given)
+        :param end: datetime marking the exclusive end of the range
+        :param granularity: bucket size, one of "hour", "day", or "month"
+        :param uid: optional integer restricting the history to one user
+        :return: a list of buckets with their usage counts
+        :raises HTTPException: if requester is not admin or the parameters are invalid
+        """
+        endpoint_info = {"method" : "GET", "endpoint" : self.__GET_USAGE_HISTORY_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        payload = AuthUtility.authenticate(request)
+        is_admin = AuthUtility.check_is_admin(payload, self.__db)
+
+        if is_admin:
+            if granularity not in self.__GRANULARITIES:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail={"granularity" : False}
+                )
+            start, end = AdminUtility.to_utc_range(start, end)
+            return AdminUtility.get_usage_history(self.__db, start, end, granularity, uid)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required",
+            )
+
+    async def __handle_get_top_users(self, request: Request, start: datetime, end: datetime, limit: int = 10):
+        """
+        Handle requests for the users with the most API usage in a time range.
+
+        :param request: the incoming HTTP request object
+        :param start: datetime marking the inclusive start of the range (UTC if no offset is given)
+        :param end: datetime marking the exclusive end of the range
+        :param limit: integer number of users to return, at most 100
+        :return: a list of users with their usage counts, highest first
+        :raises HTTPException: if requester is not admin or the parameters are invalid
+        """
+        endpoint_info = {"method" : "GET", "endpoint" : self.__GET_TOP_USERS_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        payload = AuthUtility.authenticate(request)
+        is_admin = AuthUtility.check_is_admin(payload, self.__db)
+
+        if is_admin:
+            if not 0 < limit <= self.__MAX_TOP_USERS:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail={"limit" : False}
+                )
+            start, end = AdminUtility.to_utc_range(start, end)
+            return AdminUtility.get_top_users(self.__db, start, end, limit)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required",
+            )
+
+    async def __handle_get_ai_queue(self, request: Request):
+        """
+        Handle requests for the AI scheduler's global and per-user queue statistics.
+
+        :param request: the incoming HTTP request object
+        :return: a dictionary with the scheduler limits, totals, and per-user queue stats
+        :raises HTTPException: if requester is not admin
+        """
+        endpoint_info = {"method" : "GET", "endpoint" : self.__GET_AI_QUEUE_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        payload = AuthUtility.authenticate(request)
+        is_admin = AuthUtility.check_is_admin(payload, self.__db)
+
+        if is_admin:
+            return self.__scheduler.stats()
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required",
+            )
+
+    async def __handle_get_email_index(self, request: Request):
+        """
+        Handle requests for the size, memory footprint, and hit counters of this worker's email index.
+
+        :param request: the incoming HTTP request object
+        :return: a dictionary of email index stats
+        :raises HTTPException: if requester is not admin, or 404 if no index is attached
+        """
+        endpoint_info = {"method" : "GET", "endpoint" : self.__GET_EMAIL_INDEX_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        payload = AuthUtility.authenticate(request)
+        is_admin = AuthUtility.check_is_admin(payload, self.__db)
+
+        if is_admin:
+            stats = self.__db.get_email_index_stats()
+            if stats is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Email index is not enabled",
+                )
+            return stats
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required",
+            )
+
+    async def __handle_stats_stream(self, request: Request):
+        """
+        Handle a dashboard subscribing to live endpoint and user-usage statistics.
+
+        The response is a server-sent event stream. It starts with one "snapshot" event
+        holding the endpoint and user listings, followed by a "delta" event for every
+        tick in which counters changed. The stream ends when the session token expires,
+        so the client reconnects with a fresh cookie and the admin check runs again.
+
+        :param request: the incoming HTTP request object
+        :return: a StreamingResponse of server-sent events
+        :raises HTTPException: if requester is not admin
+        """
+        endpoint_info = {"method" : "GET", "endpoint" : self.__STATS_STREAM_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        payload = AuthUtility.authenticate(request)
+        is_admin = AuthUtility.check_is_admin(payload, self.__db)
+
+        if is_admin:
+            return StreamingResponse(
+                self.__stream_stats(payload["exp"]),
+                media_type="text/event-stream",
+                headers={"Cache-Control" : "no-cache", "X-Accel-Buffering" : "no"}
+            )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required",
+            )
+
+    async def __stream_stats(self, expires_at):
+        """
+        Yield the snapshot and delta events of a dashboard stream until the token expires.
+
+        :param expires_at: integer UNIX time at which the session token expires
+        """
+        async with self.__live_stats.subscribe() as events:
+            snapshot = StatsSnapshot(
+                endpoints=AdminUtility.get_endpoints(self.__db),
+                users=AdminUtility.get_users(self.__db),
+                interval=self.__live_stats.interval
+            )
+            yield AdminUtility.to_server_sent_event("snapshot", snapshot)
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(events.get(), min(remaining, self.__STREAM_KEEPALIVE_SECONDS))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield AdminUtility.to_server_sent_event("delta", event)
+
+
 class AdminUtility:
     """
     Utility class providing static methods for administrative operations
@@ -152,6 +378,65 @@ class AdminUtility:
         :return: a list of dictionaries containing endpoint usage data
         """
         return db.get_all_endpoints()
-        
-            
-            
\ No newline at end of file
+
+    @staticmethod
+    def to_utc_range(start, end):
+        """
+        Convert a requested time range to naive UTC datetimes as stored in the rollup tables.
+
+        :param start: datetime marking the start of the range
+        :param end: datetime marking the end of the range
+        :return: a tuple of (start, end) naive UTC datetimes
+        :raises HTTPException: if the range is empty
+        """
+        def to_utc(moment):
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+            return moment
+
+        start, end = to_utc(start), to_utc(end)
+        if start >= end:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"start" : False, "end" : False}
+            )
+        return start, end
+
+    @staticmethod
+    def get_usage_history(db, start, end, granularity, uid=None):
+        """
+        Retrieve API usage per time bucket.
+
+        :param db: database instance used to query the usage rollups
+        :param start: naive UTC datetime marking the inclusive start
+        :param end: naive UTC datetime marking the exclusive end
+        :param granularity: one of "hour", "day", or "month"
+        :param uid: optional integer restricting the history to one user
+        :return: a list of dictionaries containing bucket and usage_count
+        """
+        return db.get_usage_history(start, end, granularity, uid)
+
+    @staticmethod
+    def get_top_users(db, start, end, limit):
+        """
+        Retrieve the heaviest API users in a time range.
+
+        :param db: database instance used to query the usage rollups
+        :param start: naive UTC datetime marking the inclusive start
+        :param end: naive UTC datetime marking the exclusive end
+        :param limit: integer number of users to return
+        :return: a list of dictionaries containing uid, email, and usage_count
+        """
+        return db.get_top_users(start, end, limit)
+
+    @staticmethod
+    def to_server_sent_event(event, data):
+        """
+        Format a server-sent event.
+
+        :param event: string naming the event type
+        :param data: JSON-serializable event payload, or a Pydantic model
+        :return: string containing the encoded event
+        """
+        encoded = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data, default=str)
+        return f"event: {event}\ndata: {encoded}\n\n"
@@ -1,6 +1,22 @@
 from fastapi import APIRouter, HTTPException, Request, status
+from pydantic import ValidationError
+from referencing.exceptions import Unresolvable
+from contextlib import asynccontextmanager
 from .auth import AuthUtility
-import httpx
+from schemas.ai_schema import TextParseRequest, SchemaParseRequest, ParseResponse, MAX_BODY_BYTES
+from services.ai_backend import AIBackendError
+from services.logger import get_logger
+from services.request_body import read_limited_body
+from services.schema_cache import SchemaValidatorCache, InvalidSchemaError
+from services.idempotency import IdempotencyStore, IdempotencyConflict
+from services.scheduler import SchedulerRejected
+from services.chunking import split_text, merge_results
+from services.json_response import FastJSONResponse
+import asyncio
+import os
+
+logger = get_logger("routers.ai")
+
 
 class AI:
     """
@@ -8,24 +24,37 @@ class AI:
     """
     __AI_TEXT_TO_JSON_ENDPOINT = "/api/v1/service/ai/text"
     __AI_SCHEMA_TO_JSON_ENDPOINT = "/api/v1/service/ai/schema"
+    __MAX_BODY_BYTES = MAX_BODY_BYTES
+    __MAX_IDEMPOTENCY_KEY_LENGTH = 255
+    __CHUNK_SIZE = int(os.getenv("AI_CHUNK_SIZE", "4000"))
+    __CHUNK_OVERLAP = int(os.getenv("AI_CHUNK_OVERLAP", "200"))
+    __CHUNK_PARALLELISM = int(os.getenv("AI_CHUNK_PARALLELISM", "4"))
+    __MAX_CHUNKS = int(os.getenv("AI_MAX_CHUNKS", "64"))
 
-
-    def __init__(self, db):
+    def __init__(self, db, ai_backend, scheduler):
         """
         Initialize an AI router instance with the database reference.
 
         :param db: database instance used for endpoint tracking and user usage updates
+        :param ai_backend: AIBackend instance holding the pooled connection to the AI backend
+        :param scheduler: FairScheduler sharing the AI backend between users
         """
         self.__router = APIRouter()
         self.__db = db
+        self.__ai_backend = ai_backend
+        self.__scheduler = scheduler
+        self.__schema_cache = SchemaValidatorCache(int(os.getenv("AI_SCHEMA_CACHE_SIZE", "256")))
+        self.__idempotency = IdempotencyStore(ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600")))
         self.__add_routes()
         
     def __add_routes(self):
         """
         Register AI-related API routes to the router.
         """
-        self.__router.add_api_route(path=self.__AI_TEXT_TO_JSON_ENDPOINT, endpoint=self.__handle_ai_json, methods=["POST"])
-        self.__router.add_api_route(path=self.__AI_SCHEMA_TO_JSON_ENDPOINT, endpoint=self.__handle_ai_schema_json, methods=["POST"])
+        self.__router.add_api_route(path=self.__AI_TEXT_TO_JSON_ENDPOINT, endpoint=self.__handle_ai_json, methods=["POST"],
+                                    response_model=ParseResponse, response_model_exclude_unset=True)
+        self.__router.add_api_route(path=self.__AI_SCHEMA_TO_JSON_ENDPOINT, endpoint=self.__handle_ai_schema_json, methods=["POST"],
+                                    response_model=ParseResponse, response_model_exclude_unset=True)
     
     def get_router(self):
         """
@@ -40,76 +69,305 @@ class AI:
         Handle requests for converting plain text into structured JSON using the AI backend.
 
         This endpoint requires authentication and updates the user's API usage count.
+        The body is size-limited and validated before any database or upstream work.
 
         :param request: the incoming HTTP request containing the text and language fields
         :return: a dictionary containing parsed JSON data and updated API usage count
         :raises HTTPException: if the external AI backend returns an error or authentication fails
         """
-        
-        endpoint_info = {"method" : "POST", "endpoint" : self.__AI_TEXT_TO_JSON_ENDPOINT}
-        self.__db.update_endpoint(endpoint_info)
         payload = AuthUtility.authenticate(request)
-        AuthUtility.increase_api_usage(payload, self.__db)
-        api_usage = AuthUtility.get_api_usage(payload, self.__db)
         if payload:
-            body = await request.json()
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://4537-ai-backend-production.up.railway.app/v1/json/parse",
-                    json={"text" : body["text"], "lang" : body["lang"]}
-                )
-                if response.is_success:
-                    data = response.json()
-                    return {"data" : data["data"], "api_usage" : api_usage}
-                else:
-                    print("unsuccessful")
-                    raise HTTPException(
-                        # 400
-                        status_code=response.status_code,
-                        detail={
-                            "message" : "nah"
-                        }
-                    )
+            body = await self.__read_body(request, TextParseRequest)
+            return await self.__run_idempotent(request, payload, body, self.__text_to_json)
         else:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
+    async def __text_to_json(self, payload, body):
+        """
+        Record usage for a validated text request and parse it with the AI backend.
+
+        :param payload: decoded JWT payload containing the user ID
+        :param body: the validated TextParseRequest
+        :return: a dictionary containing parsed JSON data and updated API usage count
+        """
+        if body.chunked:
+            return await self.__chunked_text_to_json(payload, body)
+        self.__ensure_backend_available()
+        async with self.__dispatch_slot(payload):
+            endpoint_info = {"method" : "POST", "endpoint" : self.__AI_TEXT_TO_JSON_ENDPOINT}
+            self.__db.update_endpoint(endpoint_info)
+            AuthUtility.increase_api_usage(payload, self.__db)
+            api_usage = AuthUtility.get_api_usage(payload, self.__db)
+            data = await self.__parse(
+                self.__ai_backend.TEXT_PARSE_PATH,
+                {"text" : body.text, "lang" : body.lang}
+            )
+            return {"data" : data["data"], "api_usage" : api_usage}
+
+    async def __chunked_text_to_json(self, payload, body):
+        """
+        Parse a long text in overlapping chunks, several at a time, and merge the results.
+
+        Every chunk takes its own scheduler slot and counts as one use of the API, so a
+        long document costs what its pieces would cost sent separately. If any chunk
+        fails, the others are cancelled and the error is returned. Values that could not
+        be merged are returned as conflicts.
+
+        :param payload: decoded JWT payload containing the user ID
+        :param body: the validated TextParseRequest with chunked set
+        :return: a dictionary containing the merged data, the updated API usage count, the chunk count, and any conflicts
+        """
+        self.__ensure_backend_available()
+        chunks = split_text(body.text, self.__CHUNK_SIZE, self.__CHUNK_OVERLAP, self.__MAX_CHUNKS)
+        endpoint_info = {"method" : "POST", "endpoint" : self.__AI_TEXT_TO_JSON_ENDPOINT}
+        self.__db.update_endpoint(endpoint_info)
+        parallelism = asyncio.Semaphore(self.__CHUNK_PARALLELISM)
+
+        async def parse_chunk(chunk):
+            async with parallelism:
+                async with self.__dispatch_slot(payload):
+                    AuthUtility.increase_api_usage(payload, self.__db)
+                    data = await self.__parse(self.__ai_backend.TEXT_PARSE_PATH, {"text" : chunk, "lang" : body.lang})
+                    return data["data"]
+
+        tasks = [asyncio.ensure_future(parse_chunk(chunk)) for chunk in chunks]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        api_usage = AuthUtility.get_api_usage(payload, self.__db)
+        data, conflicts = merge_results(parts)
+        result = {"data" : data, "api_usage" : api_usage, "chunks" : len(chunks)}
+        if conflicts:
+            logger.info("chunk results conflicted", extra={"chunks" : len(chunks), "conflicts" : len(conflicts)})
+            result["conflicts"] = conflicts
+        return result
+
     async def __handle_ai_schema_json(self, request: Request):
         """
         Handle requests for schema-based structured JSON generation using the AI backend.
 
-        This endpoint validates the session, records API usage, and sends the
-        provided text, language, and schema to the AI backend for parsing.
+        This endpoint validates the session, the body, and the JSON schema, records API usage,
+        and sends the provided text, language, and schema to the AI backend for parsing.
+        The returned data is validated against the schema, and the backend is asked
+        once more if it does not match.
 
         :param request: the incoming HTTP request containing text, language, and JSON schema
         :return: a dictionary with AI-generated structured data and the updated API usage count
-        :raises HTTPException: if authentication fails or if the AI backend responds with an error
+        :raises HTTPException: if authentication fails, the schema is invalid, or the AI backend responds with an error
         """
-        endpoint_info = {"method" : "POST", "endpoint" : self.__AI_SCHEMA_TO_JSON_ENDPOINT}
-        self.__db.update_endpoint(endpoint_info)
         payload = AuthUtility.authenticate(request)
-        AuthUtility.increase_api_usage(payload, self.__db)
-        api_usage = AuthUtility.get_api_usage(payload, self.__db)
         if payload:
-            body = await request.json()
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://4537-ai-backend-production.up.railway.app/v1/json/schemedParse",
-                    json={"text" : body["text"], "lang" : body["lang"], "schema" : body["schema"]}
-                )
-                if response.is_success:
-                    data = response.json()
-                    return {"data" : data["data"], "api_usage" : api_usage}
-                else:
-                    print("unsuccessful")
-                    raise HTTPException(
-                        # 400
-                        status_code=response.status_code,
-                        detail={
-                            "message" : "nah"
-                        }
-                    )
+            body = await self.__read_body(request, SchemaParseRequest)
+            return await self.__run_idempotent(request, payload, body, self.__schema_to_json)
         else:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
-            
+    async def __schema_to_json(self, payload, body):
+        """
+        Record usage for a validated schema request and parse it with the AI backend,
+        asking again once if the returned data does not match the schema.
+
+        :param payload: decoded JWT payload containing the user ID
+        :param body: the validated SchemaParseRequest
+        :return: a dictionary with AI-generated structured data and the updated API usage count
+        """
+        validator = self.__get_schema_validator(body.json_schema)
+        self.__ensure_backend_available()
+        async with self.__dispatch_slot(payload):
+            endpoint_info = {"method" : "POST", "endpoint" : self.__AI_SCHEMA_TO_JSON_ENDPOINT}
+            self.__db.update_endpoint(endpoint_info)
+            AuthUtility.increase_api_usage(payload, self.__db)
+            api_usage = AuthUtility.get_api_usage(payload, self.__db)
+            for _ in range(2):
+                data = await self.__parse(
+                    self.__ai_backend.SCHEMA_PARSE_PATH,
+                    {"text" : body.text, "lang" : body.lang, "schema" : body.json_schema}
+                )
+                try:
+                    valid = validator.is_valid(data["data"])
+                except Unresolvable as error:
+                    # Compiling resolves every $ref, so this only guards references it cannot see
+                    logger.warning("schema reference failed while validating AI output", extra={"error" : str(error)})
+                    raise self.__invalid_schema(f"schema reference could not be resolved: {error}")
+                if valid:
+                    return {"data" : data["data"], "api_usage" : api_usage}
+                logger.warning("AI backend returned data that does not match the schema")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail={
+                "message" : "AI backend returned data that does not match the schema"
+            }
+        )
 
+    async def __run_idempotent(self, request, payload, body, handler):
+        """
+        Run a handler at most once per user and Idempotency-Key.
+
+        Without the header the handler simply runs. With it, a stored result is replayed
+        without any database write or upstream call, and a duplicate of an in-flight
+        request waits for that request's result.
+
+        :param request: the incoming HTTP request
+        :param payload: decoded JWT payload containing the user ID
+        :param body: the validated request body model
+        :param handler: coroutine function taking (payload, body) and returning the result
+        :return: the handler result, or a JSON response replaying a stored result
+        :raises HTTPException: 400 for a malformed key, 422 if the key was used with a different body
+        """
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return await handler(payload, body)
+        if not 0 < len(key) <= self.__MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"message" : "invalid Idempotency-Key"}
+            )
+
+        fingerprint = request.url.path + body.model_dump_json(by_alias=True)
+        try:
+            async with self.__idempotency.claim(int(payload["sub"]), key, fingerprint) as claim:
+                if claim.replayed:
+                    return FastJSONResponse(content=claim.result, headers={"Idempotent-Replayed" : "true"})
+                result = await handler(payload, body)
+                claim.save(result)
+                return result
+        except IdempotencyConflict as error:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"message" : str(error)}
+            )
+
+    async def __read_body(self, request, model):
+        """
+        Read the request body under the size limit and validate it in a single parse.
+
+        :param request: the incoming HTTP request
+        :param model: the Pydantic model class the body must match
+        :return: the validated model instance
+        :raises HTTPException: 413 if the body is too large, 422 with per-field flags if it is invalid
+        """
+        raw_body = await read_limited_body(request, self.__MAX_BODY_BYTES)
+        try:
+            return model.model_validate_json(raw_body)
+        except ValidationError as error:
+            detail = {"text" : True, "lang" : True}
+            if model is SchemaParseRequest:
+                detail["schema"] = True
+            for err in error.errors():
+                field = err["loc"][0] if err["loc"] else None
+                if field in detail:
+                    detail[field] = False
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=detail
+            )
+
+    def __get_schema_validator(self, schema):
+        """
+        Return the cached validator for a schema, rejecting invalid schemas before any upstream call.
+
+        :param schema: the decoded JSON schema from the request body
+        :return: a jsonschema validator instance
+        :raises HTTPException: with status 422 if the schema is not a valid JSON schema
+        """
+        try:
+            return self.__schema_cache.get_validator(schema)
+        except InvalidSchemaError as error:
+            raise self.__invalid_schema(error.message)
+
+    @staticmethod
+    def __invalid_schema(message):
+        """
+        Build the 422 error rejecting a request's schema.
+
+        :param message: string explaining what is wrong with the schema
+        :return: the HTTPException to raise
+        """
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"text" : True, "lang" : True, "schema" : False, "message" : message}
+        )
+
+    def __ensure_backend_available(self):
+        """
+        Reject the request before usage is recorded while the AI backend circuit is open.
+
+        :raises HTTPException: with status 503 and a Retry-After header if the backend is down
+        """
+        try:
+            self.__ai_backend.ensure_available()
+        except AIBackendError as error:
+            raise self.__to_http_exception(error)
+
+    @asynccontextmanager
+    async def __dispatch_slot(self, payload):
+        """
+        Hold a fair-share AI slot for the user while usage is recorded and the backend is called.
+
+        Shed requests are rejected before any usage is recorded.
+
+        :param payload: decoded JWT payload containing the user ID and tier
+        :raises HTTPException: with status 503 and a Retry-After header if the request is shed
+        """
+        uid = int(payload["sub"])
+        try:
+            await self.__scheduler.acquire(uid, payload.get("tier", "user"))
+        except SchedulerRejected as error:
+            logger.warning("AI request shed", extra={"uid" : uid, "reason" : error.message})
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "message" : error.message
+                },
+                headers={"Retry-After" : str(error.retry_after)}
+            )
+        try:
+            yield
+        finally:
+            self.__scheduler.release(uid)
+
+    async def __parse(self, path, ai_request):
+        """
+        Send a parse request to the AI backend and return its decoded JSON body.
+
+        :param path: string containing the AI backend path
+        :param ai_request: dictionary sent as the request body
+        :return: the decoded response body
+        :raises HTTPException: if the AI backend fails or rejects the request
+        """
+        try:
+            response = await self.__ai_backend.post(path, ai_request)
+        except AIBackendError as error:
+            logger.warning("AI backend error", extra={"path" : path, "status" : error.status_code, "error" : error.message})
+            raise self.__to_http_exception(error)
+
+        if not response.is_success:
+            logger.warning("AI backend rejected request", extra={"path" : path, "status" : response.status_code})
+            raise HTTPException(
+                status_code=response.status_code,
+                detail={
+                    "message" : "AI backend could not parse the request"
+                }
+            )
+        return response.json()
+
+    @staticmethod
+    def __to_http_exception(error):
+        """
+        Convert an AIBackendError to the HTTPException returned to the client.
+
+        :param error: the AIBackendError raised by the AI backend client
+        :return: an HTTPException carrying the status code and message
+        """
+        headers = {"Retry-After" : str(error.retry_after)} if error.retry_after is not None else None
+        return HTTPException(
+            status_code=error.status_code,
+            detail={
+                "message" : error.message
+            },
+            headers=headers
+        )
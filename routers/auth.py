@@ -3,6 +3,9 @@ from fastapi.responses import JSONResponse
 from schemas.user_schema import UserLogin, UserCreate, PasswordException
 from pydantic import ValidationError
 from database.database import Database
+from services.logger import get_logger
+from services.tracing import span, traced
+from services import conditional
 import os 
 import jwt
 import bcrypt
@@ -14,6 +17,8 @@ Authentication router module for handling user login, signup, and session manage
 This module provides the AuthRouter class which implements authentication endpoints and the AuthUtility class for JWT token generation and credential validation.
 """
 
+logger = get_logger("routers.auth")
+
 
 class AuthRouter:
     """
@@ -54,23 +59,31 @@ class AuthRouter:
     async def __authenticate(self, request: Request):
         """
         Handle session verification requests by checking for a valid JWT cookie.
+
+        The response carries an ETag from the uid and the user's row version, which changes
+        with the email or API usage, so If-None-Match requests get a 304 without reading the user.
         
         :param request: the incoming HTTP request object
         :return: a JSON response indicating session status
         :raises HTTPException: if no valid JWT token is found in cookies
         """
         payload = AuthUtility.authenticate(request)
-        print(f"the payload is {payload}")
+        logger.debug("session authenticated", extra={"uid" : payload.get("sub")})
         endpoint_info = {"method" : "GET", "endpoint" : self.__AUTHENTICATE_ENDPOINT}
         self.__db.update_endpoint(endpoint_info)
         if payload:
             uid = int(payload["sub"])
+            # Read the version before the row so a concurrent write can only make the ETag older
+            # The uid is part of the tag, so another user's session never revalidates this one's copy
+            etag = conditional.make_etag(f"u{uid}", self.__db.get_version("user", uid))
+            if conditional.matches(request, etag):
+                return conditional.not_modified(etag)
             user_info = self.__db.find_user(uid)
             is_admin = bool(user_info["is_admin"])
             api_usage = self.__db.get_api_usage(uid)
             email = user_info["email"]
             
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "is_admin" : is_admin,
@@ -78,6 +91,8 @@ class AuthRouter:
                     "email" : email
                 }
             )
+            conditional.set_cache_headers(response, etag)
+            return response
         else:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -104,7 +119,7 @@ class AuthRouter:
             
             user = AuthUtility.validate_login(login_schema, self.__db)
             AuthUtility.create_session_cookie(user, response)
-            print(response.headers.get("set_cookie"))
+            logger.info("login succeeded", extra={"uid" : user["uid"]})
             return {"message" : "login success", "is_admin" : user["is_admin"]}
         except ValidationError as error:
             detail = {"email" : True, "password" : True}
@@ -135,8 +150,15 @@ class AuthRouter:
             self.__db.update_endpoint(endpoint_info)
             user_data = await request.json()
             signup_schema = UserCreate(**user_data)
+            # Reject known emails before spending a bcrypt hash on them
+            if self.__db.email_taken(signup_schema.email):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="User already exists"
+                )
             
-            hashed_password = bcrypt.hashpw(signup_schema.password.encode("utf-8"), bcrypt.gensalt()).decode('utf-8')
+            with span("auth.bcrypt"):
+                hashed_password = bcrypt.hashpw(signup_schema.password.encode("utf-8"), bcrypt.gensalt()).decode('utf-8')
             hashed_user = {"email" : signup_schema.email, "password" : hashed_password, "is_admin" : signup_schema.is_admin}
             inserted = self.__db.insert_user(hashed_user)
             
@@ -170,6 +192,7 @@ class AuthUtility:
     """
 
     @staticmethod
+    @traced("auth.create_access_token")
     def create_access_token(user_data):
         """
         Create a JWT access token for an authenticated user.
@@ -181,6 +204,7 @@ class AuthUtility:
         """
         payload = {
             "sub" : str(user_data["uid"]),
+            "tier" : "admin" if user_data.get("is_admin") else "user",
             "iat" : datetime.utcnow(),
             "exp" : datetime.utcnow() + timedelta(minutes=5)
          }
@@ -208,6 +232,7 @@ class AuthUtility:
         )
 
     @staticmethod
+    @traced("auth.validate_login")
     def validate_login(login_info:UserLogin, db):
         """
         Validate user login credentials against stored database records.
@@ -221,7 +246,9 @@ class AuthUtility:
         if user:
             user_pw_bytes = user["password"].encode('utf-8')
             login_password_bytes = login_info.password.encode('utf-8')
-            if not bcrypt.checkpw(login_password_bytes, user_pw_bytes):
+            with span("auth.bcrypt"):
+                password_matches = bcrypt.checkpw(login_password_bytes, user_pw_bytes)
+            if not password_matches:
                 raise PasswordException
             user["is_admin"] = bool(user["is_admin"])
             return user 
@@ -231,6 +258,7 @@ class AuthUtility:
             )
 
     @staticmethod
+    @traced("auth.authenticate")
     def authenticate(request:Request):
         """
         Decodes jwt token from cookies and returns payload.
@@ -279,6 +307,7 @@ class AuthUtility:
         return db.get_api_usage(uid)
     
     @staticmethod
+    @traced("auth.check_is_admin")
     def check_is_admin(payload, db):
         """
         Check whether the authenticated user has administrative privileges.
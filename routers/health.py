@@ -0,0 +1,101 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+import os
+import time
+
+
+class HealthRouter:
+    """
+    Router class exposing liveness and readiness probes for the application lifecycle.
+    """
+    __LIVE_ENDPOINT = "/api/v1/health/live"
+    __READY_ENDPOINT = "/api/v1/health/ready"
+    __LOAD_ENDPOINT = "/api/v1/health/load"
+
+    def __init__(self, admission):
+        """
+        Initialize a HealthRouter instance in the not-ready state.
+
+        :param admission: AdmissionController whose admitted and shed counts are reported
+        """
+        self.__router = APIRouter()
+        self.__admission = admission
+        self.__ready = False
+        self.__draining = False
+        self.__warmup = {}
+        self.__startup_seconds = None
+        self.__started_at = time.monotonic()
+        self.__add_routes()
+
+    def __add_routes(self):
+        """
+        Register health probe routes to the router.
+        """
+        self.__router.add_api_route(path=self.__LIVE_ENDPOINT, endpoint=self.__handle_live, methods=["GET"])
+        self.__router.add_api_route(path=self.__READY_ENDPOINT, endpoint=self.__handle_ready, methods=["GET"])
+        self.__router.add_api_route(path=self.__LOAD_ENDPOINT, endpoint=self.__handle_load, methods=["GET"])
+
+    def get_router(self):
+        """
+        Return the configured APIRouter instance.
+
+        :return: the APIRouter object with registered health routes
+        """
+        return self.__router
+
+    def record_warmup(self, step, ok):
+        """
+        Record the outcome of a single warmup step.
+
+        :param step: string naming the warmup step
+        :param ok: True if the step succeeded, False otherwise
+        """
+        self.__warmup[step] = bool(ok)
+
+    def mark_ready(self):
+        """
+        Mark warmup as finished and record how long startup took.
+        """
+        self.__startup_seconds = round(time.monotonic() - self.__started_at, 3)
+        self.__ready = True
+
+    def mark_draining(self):
+        """
+        Mark the application as shutting down so load balancers stop routing to it.
+        """
+        self.__ready = False
+        self.__draining = True
+
+    async def __handle_live(self):
+        """
+        Handle liveness probes. The process answering is enough to be alive.
+
+        :return: a dictionary with the liveness status
+        """
+        return {"status" : "alive"}
+
+    async def __handle_ready(self):
+        """
+        Handle readiness probes by reporting whether warmup has completed.
+
+        :return: a JSON response with status 200 when ready, 503 otherwise
+        """
+        return JSONResponse(
+            status_code=status.HTTP_200_OK if self.__ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "ready" : self.__ready,
+                "draining" : self.__draining,
+                "warmup" : self.__warmup,
+                "startup_seconds" : self.__startup_seconds
+            }
+        )
+
+    async def __handle_load(self):
+        """
+        Handle load probes by reporting the admission counters of this worker.
+
+        Requests to the health routes are never shed, so this stays available under overload.
+
+        :return: a dictionary with the worker pid and the per route class admission stats
+        """
+        return {"pid" : os.getpid(), "route_classes" : self.__admission.stats()}
@@ -2,8 +2,11 @@ from fastapi import APIRouter, HTTPException, Request, status
 from pydantic import ValidationError
 from .auth import AuthUtility
 from schemas.user_schema import Password, Email
+from services.logger import get_logger
 import bcrypt
 
+logger = get_logger("routers.profile")
+
 
 
 class ProfileRouter:
@@ -67,7 +70,7 @@ class ProfileRouter:
             else:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
         except ValidationError as e:
-            print(e)
+            logger.info("password change rejected", extra={"errors" : e.error_count()})
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
     async def __change_email(self, request: Request):
@@ -92,6 +95,8 @@ class ProfileRouter:
                 email_schema = Email(**user_data)
                 if self.__check_email_equality(payload, email_schema.email):
                     raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"same_email" : True})
+                if self.__db.email_taken(email_schema.email):
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"same_email" : False})
                 is_changed = self.__db.change_email(uid, email_schema.email)
                 if is_changed:
                     return {"message" : "email change success", "new_email" : email_schema.email}
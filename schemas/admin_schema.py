@@ -0,0 +1,38 @@
+from pydantic import BaseModel
+
+"""
+Admin schema module defining Pydantic models for admin listing responses.
+
+Typed responses are validated and serialized to JSON bytes by Pydantic in one pass,
+without the generic jsonable_encoder walk over every row.
+"""
+
+
+class UserUsage(BaseModel):
+    """
+    Schema representing one user in the admin user listing.
+
+    The database returns is_admin as 0 or 1; it is turned into a bool here.
+    """
+    uid: int
+    email: str
+    is_admin: bool
+    api_usage: int
+
+
+class EndpointStats(BaseModel):
+    """
+    Schema representing the request count of one endpoint.
+    """
+    http_method: str
+    endpoint: str
+    request_count: int
+
+
+class StatsSnapshot(BaseModel):
+    """
+    Schema representing the first event of the admin statistics stream.
+    """
+    endpoints: list[EndpointStats]
+    users: list[UserUsage]
+    interval: float
@@ -0,0 +1,118 @@
+from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, field_validator
+from typing import Any, Literal, Optional
+import os
+
+"""
+AI schema module defining Pydantic models for AI service request and response bodies.
+
+This module provides the request models for the text and schema parsing endpoints,
+bounding the text length and the nesting depth of user supplied JSON schemas. Texts
+sent in chunked mode may be longer, since they are parsed in pieces. The body size
+limit of the AI routes is derived from the chunked text limit, so that a text within
+the limit is never rejected for its size in bytes. ParseResponse types the result so
+it is serialized directly to JSON bytes.
+"""
+
+MAX_TEXT_LENGTH = int(os.getenv("AI_MAX_TEXT_LENGTH", "20000"))
+MAX_CHUNKED_TEXT_LENGTH = int(os.getenv("AI_MAX_CHUNKED_TEXT_LENGTH", "200000"))
+# Room in the body for lang, the schema, and the JSON around the text
+_BODY_OVERHEAD_BYTES = 64 * 1024
+# UTF-8 takes at most 4 bytes per character, so by default the longest accepted text always fits
+MAX_BODY_BYTES = int(os.getenv("AI_MAX_BODY_BYTES", str(4 * MAX_CHUNKED_TEXT_LENGTH + _BODY_OVERHEAD_BYTES)))
+# A smaller configured body limit lowers the chunked text limit instead of rejecting texts it allows
+MAX_CHUNKED_TEXT_LENGTH = min(MAX_CHUNKED_TEXT_LENGTH, max(MAX_TEXT_LENGTH, (MAX_BODY_BYTES - _BODY_OVERHEAD_BYTES) // 4))
+MAX_SCHEMA_DEPTH = int(os.getenv("AI_MAX_SCHEMA_DEPTH", "10"))
+MAX_SCHEMA_NODES = int(os.getenv("AI_MAX_SCHEMA_NODES", "1000"))
+
+
+class TextParseRequest(BaseModel):
+    """
+    Schema representing a text-to-JSON parse request.
+
+    With `chunked` set, the text is split into chunks that are parsed separately, so it
+    may be up to MAX_CHUNKED_TEXT_LENGTH characters long instead of MAX_TEXT_LENGTH.
+    """
+    # Declared before text so that the text validator can see it
+    chunked: bool = False
+    text: str = Field(min_length=1, max_length=MAX_CHUNKED_TEXT_LENGTH)
+    lang: str = Field(min_length=2, max_length=16)
+
+    @field_validator("text")
+    @classmethod
+    def check_text_length(cls, text, info: ValidationInfo):
+        """
+        Reject texts longer than MAX_TEXT_LENGTH unless they are sent in chunked mode.
+
+        :param text: the text to parse
+        :return: the text unchanged
+        :raises ValueError: if the text is too long for an unchunked request
+        """
+        if not info.data.get("chunked") and len(text) > MAX_TEXT_LENGTH:
+            raise ValueError(f"text is longer than {MAX_TEXT_LENGTH} characters; send it with chunked set")
+        return text
+
+
+class SchemaParseRequest(TextParseRequest):
+    """
+    Schema representing a schema-guided parse request.
+
+    The JSON schema is received as `schema` but stored as `json_schema` to avoid
+    shadowing BaseModel attributes.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    # Schema-guided parsing is not chunked; its result is validated against the schema as a whole
+    chunked: Literal[False] = False
+    json_schema: dict = Field(alias="schema")
+
+    @field_validator("json_schema")
+    @classmethod
+    def check_schema_size(cls, schema):
+        """
+        Reject schemas nested deeper than MAX_SCHEMA_DEPTH or larger than MAX_SCHEMA_NODES.
+
+        :param schema: the decoded JSON schema
+        :return: the schema unchanged
+        :raises ValueError: if the schema is too deep or too large
+        """
+        nodes = 0
+        stack = [(schema, 1)]
+        while stack:
+            node, depth = stack.pop()
+            nodes += 1
+            if depth > MAX_SCHEMA_DEPTH:
+                raise ValueError(f"schema is nested deeper than {MAX_SCHEMA_DEPTH} levels")
+            if nodes > MAX_SCHEMA_NODES:
+                raise ValueError(f"schema has more than {MAX_SCHEMA_NODES} nodes")
+            if isinstance(node, dict):
+                stack.extend((child, depth + 1) for child in node.values())
+            elif isinstance(node, list):
+                stack.extend((child, depth + 1) for child in node)
+        return schema
+
+
+class MergeConflict(BaseModel):
+    """
+    Schema describing a value from one chunk that was left out of the merged data.
+
+    `path` is a JSON pointer into `data`, `chunk` the index of the chunk the value came
+    from, `kept` the value in `data`, and `dropped` the value left out.
+    """
+    path: str
+    chunk: int
+    kept: Any
+    dropped: Any
+
+
+class ParseResponse(BaseModel):
+    """
+    Schema representing the result of a parse request.
+
+    `data` is passed through as returned by the AI backend. `chunks` is only set, and
+    only sent, for chunked requests, and `conflicts` only for chunked requests whose
+    results could not be merged cleanly; routes exclude unset fields.
+    """
+    data: Any
+    api_usage: int
+    chunks: Optional[int] = None
+    conflicts: Optional[list[MergeConflict]] = None
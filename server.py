@@ -0,0 +1,69 @@
+from dotenv import load_dotenv
+from database.database import Database
+from services.shared_state import SharedCounters
+import argparse
+import os
+import tempfile
+import uvicorn
+
+"""
+Multi-worker launcher module for serving the application on every CPU core.
+
+This module creates the shared counter segment, starts N uvicorn worker processes
+that all attach to it, and flushes whatever is still pending once the workers exit.
+"""
+
+
+def parse_args():
+    """
+    Parse command line options for the launcher.
+
+    :return: the parsed argparse namespace
+    """
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes sharing counters.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--slots", type=int, default=int(os.getenv("SHARED_STATE_SLOTS", "16384")))
+    parser.add_argument("--state-path", default=os.getenv("SHARED_STATE_PATH"))
+    return parser.parse_args()
+
+
+def default_state_path(port):
+    """
+    Return a per-port segment path, preferring /dev/shm so the file never touches disk.
+
+    :param port: integer representing the port being served
+    :return: string containing the segment file path
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"4537-api-{port}.counters")
+
+
+def main():
+    """
+    Create the shared segment, run the workers, and flush remaining counters on exit.
+    """
+    load_dotenv()
+    args = parse_args()
+    state_path = args.state_path or default_state_path(args.port)
+
+    counters = SharedCounters.create(state_path, slots=args.slots)
+    os.environ["SHARED_STATE_PATH"] = state_path
+
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        # Workers may have counted requests after the last leader flush
+        db = Database.from_env()
+        db.attach_counters(counters)
+        try:
+            db.flush_counters()
+        finally:
+            db.close()
+            counters.close()
+            os.remove(state_path)
+
+
+if __name__ == "__main__":
+    main()
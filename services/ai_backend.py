@@ -0,0 +1,258 @@
+from services.resilience import CircuitBreaker, RetryBudget, LatencyTracker, backoff_delay
+from services.tracing import span, traced
+import asyncio
+import gzip
+import httpx
+import json
+import os
+import time
+
+"""
+AI backend client module for communicating with the external AI parsing service.
+
+This module provides the AIBackend class which owns a single pooled httpx client
+shared by every AI route, so that TCP/TLS connections are reused between requests.
+Calls go through a resilience policy: per-attempt deadlines, jittered retries under
+a global retry budget, a circuit breaker, and optional hedged requests.
+"""
+
+
+class AIBackendError(Exception):
+    """
+    Exception raised when the AI backend cannot produce a response.
+    """
+    def __init__(self, status_code, message, retry_after=None):
+        """
+        :param status_code: integer HTTP status code to report to the client
+        :param message: string describing the failure
+        :param retry_after: optional integer number of seconds the client should wait
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+
+class AIBackend:
+    """
+    Client class wrapping the pooled HTTP connection to the AI backend.
+
+    Both parse endpoints are pure functions of their input on the backend, so every
+    call is treated as idempotent and may be retried or hedged.
+    """
+    __DEFAULT_BASE_URL = "https://4537-ai-backend-production.up.railway.app"
+    TEXT_PARSE_PATH = "/v1/json/parse"
+    SCHEMA_PARSE_PATH = "/v1/json/schemedParse"
+    # Statuses meaning the backend did not process the request
+    __RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+    def __init__(self, base_url=None, max_connections=20):
+        """
+        Initialize an AIBackend instance without opening any connection.
+
+        :param base_url: string containing the AI backend base URL, defaults to the production backend
+        :param max_connections: integer representing the connection pool size
+        """
+        self.__base_url = (base_url or self.__DEFAULT_BASE_URL).rstrip("/")
+        self.__limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.__client = None
+        self.__attempt_timeout = float(os.getenv("AI_ATTEMPT_TIMEOUT", "30"))
+        self.__deadline = float(os.getenv("AI_DEADLINE", "60"))
+        self.__max_retries = int(os.getenv("AI_MAX_RETRIES", "2"))
+        self.__hedging = os.getenv("AI_HEDGING", "false").lower() == "true"
+        self.__gzip_requests = os.getenv("AI_BACKEND_GZIP", "false").lower() == "true"
+        self.__gzip_minimum = int(os.getenv("AI_BACKEND_GZIP_MIN_BYTES", "1024"))
+        self.__breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", "5")),
+            reset_seconds=float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+        )
+        self.__budget = RetryBudget(ratio=float(os.getenv("AI_RETRY_RATIO", "0.2")))
+        self.__latency = LatencyTracker()
+
+    @property
+    def base_url(self):
+        """
+        Return the AI backend base URL.
+
+        :return: string containing the base URL
+        """
+        return self.__base_url
+
+    async def start(self):
+        """
+        Create the pooled HTTP client used for every AI backend request.
+        """
+        if self.__client is None:
+            self.__client = httpx.AsyncClient(
+                base_url=self.__base_url,
+                limits=self.__limits,
+                timeout=httpx.Timeout(self.__attempt_timeout, connect=5.0)
+            )
+
+    async def warmup(self):
+        """
+        Open a connection to the AI backend ahead of the first user request.
+
+        Any HTTP response means the TCP/TLS handshake has completed and the
+        connection is now kept alive in the pool, so the status code is ignored.
+
+        :return: True if the backend answered, False otherwise
+        """
+        await self.start()
+        try:
+            await self.__client.head("/")
+            return True
+        except httpx.HTTPError:
+            return False
+
+    async def close(self):
+        """
+        Close the pooled HTTP client and all of its connections.
+        """
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
+
+    def ensure_available(self):
+        """
+        Fail fast if the circuit breaker would reject the call, before any usage is recorded.
+
+        Uses the same decision as post(), so a half-open breaker whose probe is already in
+        flight rejects too, but the probe itself is left for post() to take.
+
+        :raises AIBackendError: with status 503 while the backend is considered down
+        """
+        if not self.__breaker.would_allow():
+            raise AIBackendError(503, "AI backend is temporarily unavailable", self.__breaker.retry_after())
+
+    async def post(self, path, payload):
+        """
+        Send a JSON payload to the AI backend under the resilience policy.
+
+        Responses the backend produced (success or client error) are returned as-is.
+        Transport errors, timeouts, and retryable statuses are retried with jitter while
+        the retry budget and overall deadline allow it.
+
+        :param path: string containing the backend path to post to
+        :param payload: dictionary to be sent as the JSON request body
+        :return: the httpx response object
+        :raises AIBackendError: if the breaker is open or every attempt failed
+        """
+        await self.start()
+        probe = self.__breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.__breaker.allow():
+            raise AIBackendError(503, "AI backend is temporarily unavailable", self.__breaker.retry_after())
+        try:
+            return await self.__post_with_retries(path, payload)
+        except BaseException:
+            # A probe that ends without recording an outcome (cancelled, or an unexpected
+            # error) would otherwise keep the breaker half-open with no probe ever finishing
+            if probe:
+                self.__breaker.release_probe()
+            raise
+
+    async def __post_with_retries(self, path, payload):
+        """
+        Send the payload, retrying retryable failures, once the breaker has let the call through.
+
+        :return: the httpx response object
+        :raises AIBackendError: if every attempt failed
+        """
+        self.__budget.record_request()
+        with span("ai.encode"):
+            content, headers = self.__encode(payload)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            failure = None
+            try:
+                response = await self.__attempt(path, content, headers)
+            except httpx.TimeoutException:
+                failure = AIBackendError(504, "AI backend timed out")
+            except httpx.TransportError:
+                failure = AIBackendError(502, "AI backend is unreachable")
+            else:
+                if response.status_code not in self.__RETRYABLE_STATUSES and response.status_code < 500:
+                    self.__breaker.record_success()
+                    return response
+                failure = AIBackendError(502, f"AI backend failed with status {response.status_code}")
+                if response.status_code not in self.__RETRYABLE_STATUSES:
+                    # A 5xx other than the retryable ones means the backend choked on this input
+                    self.__breaker.record_failure()
+                    raise failure
+
+            self.__breaker.record_failure()
+            delay = backoff_delay(attempt)
+            out_of_time = time.monotonic() - started + delay + self.__attempt_timeout > self.__deadline
+            if attempt > self.__max_retries or out_of_time or not self.__breaker.allow() or not self.__budget.try_spend():
+                raise failure
+            await asyncio.sleep(delay)
+
+    def __encode(self, payload):
+        """
+        Serialize a payload once for every attempt, gzip-compressing it when the backend accepts that.
+
+        Responses are decompressed transparently by httpx, which advertises Accept-Encoding itself.
+
+        :param payload: dictionary to be sent as the JSON request body
+        :return: a tuple of (body bytes, request headers)
+        """
+        content = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type" : "application/json"}
+        if self.__gzip_requests and len(content) >= self.__gzip_minimum:
+            content = gzip.compress(content, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        return content, headers
+
+    async def __attempt(self, path, content, headers):
+        """
+        Run one attempt, sending a hedged duplicate if the first is slower than the recent p95.
+
+        :return: the first response to complete
+        """
+        hedge_after = self.__latency.percentile(0.95) if self.__hedging else None
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self.__send(path, content, headers))
+        if hedge_after is None:
+            response = await primary
+        else:
+            response = await self.__race(primary, hedge_after, path, content, headers)
+        if response.is_success:
+            self.__latency.record(time.monotonic() - started)
+        return response
+
+    @traced("ai.upstream")
+    async def __send(self, path, content, headers):
+        """
+        Send one HTTP request to the AI backend.
+
+        :return: the httpx response object
+        """
+        return await self.__client.post(path, content=content, headers=headers)
+
+    async def __race(self, primary, hedge_after, path, content, headers):
+        """
+        Wait for the primary request and start a second one if it exceeds the hedge delay.
+
+        The hedge spends from the retry budget, so hedging stops while retries are exhausted.
+
+        :return: the first completed response; the slower request is cancelled
+        """
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done or not self.__budget.try_spend():
+            return await primary
+
+        hedge = asyncio.ensure_future(self.__send(path, content, headers))
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    return succeeded[0].result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,171 @@
+import copy
+import json
+import math
+import re
+
+"""
+Chunking module for parsing long texts in pieces.
+
+This module provides split_text, which cuts a long text into overlapping chunks on
+sentence and paragraph boundaries, and merge_results, which combines the JSON parsed
+from each chunk into one object and reports the values it had to leave out. Both are
+deterministic, so the same text always produces the same chunks and the same merged
+result.
+"""
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def _sentences(text):
+    """
+    Split a text into sentences, marking those that end a paragraph.
+
+    :return: list of (sentence, ends_paragraph) tuples; joining the sentences gives back the text
+    """
+    units = []
+    position = 0
+    for paragraph_end in [match.end() for match in _PARAGRAPH_BREAK.finditer(text)] + [len(text)]:
+        paragraph = text[position:paragraph_end]
+        start = 0
+        for match in _SENTENCE_END.finditer(paragraph):
+            units.append((paragraph[start:match.end()], False))
+            start = match.end()
+        if start < len(paragraph):
+            units.append((paragraph[start:], False))
+        if units:
+            units[-1] = (units[-1][0], True)
+        position = paragraph_end
+    return units
+
+
+def _hard_split(sentence, chunk_size):
+    """
+    Cut a sentence longer than chunk_size at whitespace, or anywhere if it has none.
+    """
+    pieces = []
+    while len(sentence) > chunk_size:
+        cut = sentence.rfind(" ", 0, chunk_size) + 1 or chunk_size
+        pieces.append(sentence[:cut])
+        sentence = sentence[cut:]
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def split_text(text, chunk_size=4000, overlap=200, max_chunks=64):
+    """
+    Split a text into chunks of at most chunk_size characters on sentence boundaries.
+
+    A chunk is cut early at a paragraph break if one falls in its last third. Each chunk
+    after the first repeats the trailing sentences of the previous one, up to overlap
+    characters, so facts spanning a boundary are seen whole. The result never has more
+    than max_chunks chunks: if the text needs more, the chunk size grows until it fits.
+
+    :param text: string to split
+    :param chunk_size: integer target number of characters per chunk
+    :param overlap: integer number of characters repeated from the previous chunk
+    :param max_chunks: integer upper bound on the number of chunks, at least 1
+    :return: list of chunk strings
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    chunk_size = max(chunk_size, math.ceil(len(text) / max_chunks) + overlap)
+    sentences = _sentences(text)
+    while True:
+        chunks = _cut(text, sentences, chunk_size, overlap)
+        if len(chunks) <= max_chunks:
+            return chunks
+        # Early paragraph cuts and the overlap add chunks the estimate did not count
+        chunk_size = math.ceil(chunk_size * len(chunks) / max_chunks)
+
+
+def _cut(text, sentences, chunk_size, overlap):
+    """
+    Cut a text, already split by _sentences, into chunks of at most chunk_size characters.
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    units = []
+    for sentence, ends_paragraph in sentences:
+        pieces = _hard_split(sentence, chunk_size)
+        units.extend((piece, ends_paragraph and index == len(pieces) - 1) for index, piece in enumerate(pieces))
+
+    chunks = []
+    start = 0
+    while start < len(units):
+        end = start
+        size = 0
+        while end < len(units) and (end == start or size + len(units[end][0]) <= chunk_size):
+            size += len(units[end][0])
+            end += 1
+        if end < len(units) and not units[end - 1][1]:
+            # Prefer ending at a paragraph break in the last third of the chunk
+            filled = size
+            for boundary in range(end - 1, start, -1):
+                filled -= len(units[boundary][0])
+                if filled < chunk_size * 2 / 3:
+                    break
+                if units[boundary - 1][1]:
+                    end = boundary
+                    break
+        chunks.append("".join(unit for unit, _ in units[start:end]).strip())
+        if end >= len(units):
+            break
+
+        # Step back over trailing sentences to repeat them, always moving forward by one
+        next_start = end
+        repeated = 0
+        while next_start - 1 > start and repeated + len(units[next_start - 1][0]) <= overlap:
+            next_start -= 1
+            repeated += len(units[next_start][0])
+        start = next_start
+    return [chunk for chunk in chunks if chunk]
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _merge(merged, part, path, chunk, conflicts):
+    """
+    Merge one chunk's value into the accumulated value, recording values that cannot be merged.
+    """
+    if isinstance(merged, dict) and isinstance(part, dict):
+        for key, value in part.items():
+            child = f"{path}/{key.replace('~', '~0').replace('/', '~1')}"
+            merged[key] = _merge(merged[key], value, child, chunk, conflicts) if key in merged else value
+        return merged
+    if isinstance(merged, list):
+        seen = {_canonical(item) for item in merged}
+        for item in part if isinstance(part, list) else [part]:
+            if _canonical(item) not in seen:
+                seen.add(_canonical(item))
+                merged.append(item)
+        return merged
+    if merged is None or merged == "" or merged == {}:
+        return part
+    if part not in (None, "", [], {}) and _canonical(part) != _canonical(merged):
+        conflicts.append({"path" : path, "chunk" : chunk, "kept" : merged, "dropped" : part})
+    return merged
+
+
+def merge_results(parts):
+    """
+    Merge the parsed data of each chunk, in chunk order, into one value.
+
+    Objects are merged key by key. Lists are concatenated without repeating items, so
+    entries seen twice in the overlap between chunks appear once. For any other value,
+    and for values whose types cannot be merged, the first non-empty one wins; every
+    different value left out is reported as a conflict.
+
+    :param parts: list of decoded JSON values, one per chunk
+    :return: a tuple of (merged value, list of conflicts), where each conflict gives the
+        JSON pointer path, the index of the chunk whose value was left out, the kept
+        value, and the dropped value
+    """
+    merged = None
+    conflicts = []
+    for chunk, part in enumerate(copy.deepcopy(parts)):
+        merged = _merge(merged, part, "", chunk, conflicts)
+    return merged, conflicts
@@ -0,0 +1,70 @@
+from fastapi import Request, Response, status
+
+"""
+Conditional request module for answering revalidations with 304 Not Modified.
+
+This module provides helpers that turn the table and row versions kept by the
+Database class into ETags, check them against If-None-Match, and set the caching
+headers of responses that depend on the session cookie.
+"""
+
+CACHE_CONTROL = "private, no-cache"
+VARY = "Cookie"
+
+
+def make_etag(*versions):
+    """
+    Build a weak ETag from one or more versions.
+
+    The ETag is weak because the compression middleware may encode the body differently.
+
+    :param versions: version strings returned by Database.get_version
+    :return: string containing the ETag, or None if any version is unavailable
+    """
+    if not versions or any(version is None for version in versions):
+        return None
+    return f'W/"{".".join(versions)}"'
+
+
+def matches(request: Request, etag):
+    """
+    Check whether a request's If-None-Match header names the given ETag.
+
+    Comparison is weak, as required for If-None-Match, so W/ prefixes are ignored.
+
+    :param request: the incoming HTTP request
+    :param etag: string containing the current ETag, or None
+    :return: True if the client already holds the current representation
+    """
+    header = request.headers.get("if-none-match")
+    if etag is None or header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in header.split(","))
+
+
+def set_cache_headers(response: Response, etag):
+    """
+    Mark a per-session response as revalidatable and attach its ETag.
+
+    :param response: the response whose headers are set
+    :param etag: string containing the ETag, or None to send the caching headers only
+    """
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = VARY
+    if etag is not None:
+        response.headers["ETag"] = etag
+
+
+def not_modified(etag):
+    """
+    Build the 304 response for a request whose cached representation is current.
+
+    :param etag: string containing the current ETag
+    :return: an empty Response with status code 304
+    """
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_cache_headers(response, etag)
+    return response
@@ -0,0 +1,210 @@
+from array import array
+import hashlib
+import os
+import random
+import threading
+
+"""
+Email index module for answering "is this email taken?" without a database query.
+
+This module provides the EmailIndex class, a cuckoo filter over the normalized email
+addresses of all users. A negative answer is exact, so signups and email changes for
+new addresses skip the database check. A positive answer may be wrong, so it is always
+confirmed with an exact query. Unlike a Bloom filter, a cuckoo filter supports removal,
+so deleted users and changed emails stop matching.
+
+Each worker keeps its own index. An address added by another worker is not seen until
+it shows up as a duplicate here, so the unique key in MySQL stays the final authority.
+"""
+
+
+class EmailIndex:
+    """
+    Cuckoo filter of email addresses with 16-bit fingerprints and four slots per bucket.
+
+    EMAIL_INDEX_CAPACITY sets the number of addresses the filter is sized for (default
+    100000); it is doubled at load time if the table already holds more than half of it.
+    If an insert cannot find room, the filter marks itself saturated and answers every
+    lookup with "maybe", so callers fall back to the exact check until the next load.
+    """
+    __BUCKET_SIZE = 4
+    __MAX_LOAD = 0.95
+    __MAX_KICKS = 500
+
+    def __init__(self, capacity=None):
+        """
+        Initialize an empty index that answers "maybe" until it is loaded.
+
+        :param capacity: optional integer number of addresses to size the filter for
+        """
+        self.__capacity = capacity if capacity is not None else int(os.getenv("EMAIL_INDEX_CAPACITY", "100000"))
+        self.__lock = threading.Lock()
+        self.__random = random.Random(0)
+        self.__slots = array("H")
+        self.__bucket_mask = 0
+        self.__items = 0
+        self.__ready = False
+        self.__saturated = False
+        self.__lookups = 0
+        self.__skipped = 0
+        self.__false_positives = 0
+
+    @staticmethod
+    def normalize(email):
+        """
+        Return the form of an email address that is hashed.
+
+        MySQL compares emails case-insensitively, so case is folded. An address the
+        database treats as equal to a stored one but this form does not is answered as
+        free, so its signup hashes the password before the insert fails on the unique key.
+        """
+        return email.strip().casefold()
+
+    def load(self, emails):
+        """
+        Replace the contents of the index with the given addresses.
+
+        :param emails: iterable of email strings, usually every email in the user table
+        """
+        emails = list(emails)
+        capacity = max(self.__capacity, 2 * len(emails))
+        buckets = 1
+        while buckets * self.__BUCKET_SIZE * self.__MAX_LOAD < capacity:
+            buckets *= 2
+        with self.__lock:
+            self.__slots = array("H", bytes(2 * buckets * self.__BUCKET_SIZE))
+            self.__bucket_mask = buckets - 1
+            self.__items = 0
+            self.__saturated = False
+            for email in emails:
+                self.__insert(email)
+            self.__ready = True
+
+    def might_contain(self, email):
+        """
+        Check whether an address may be in the index.
+
+        :param email: string containing the email address
+        :return: False only if the address is certainly not taken, True otherwise
+        """
+        with self.__lock:
+            self.__lookups += 1
+            if not self.__ready or self.__saturated:
+                return True
+            fingerprint, first, second = self.__locate(email)
+            if self.__find(first, fingerprint) is None and self.__find(second, fingerprint) is None:
+                self.__skipped += 1
+                return False
+            return True
+
+    def record_false_positive(self):
+        """
+        Count a "maybe" answer that the exact check found to be free.
+        """
+        with self.__lock:
+            self.__false_positives += 1
+
+    def add(self, email):
+        """
+        Add an address that is now in the user table.
+
+        The fingerprint is stored even if it already matches, since the match may belong
+        to another address sharing it; each copy is removed by one discard. Callers add an
+        address only once per row holding it.
+
+        :param email: string containing the email address
+        """
+        with self.__lock:
+            if not self.__ready or self.__saturated:
+                return
+            self.__insert(email)
+
+    def discard(self, email):
+        """
+        Remove an address that was in the user table.
+
+        :param email: string containing the email address
+        """
+        with self.__lock:
+            if not self.__ready or self.__saturated:
+                return
+            fingerprint, first, second = self.__locate(email)
+            for bucket in (first, second):
+                index = self.__find(bucket, fingerprint)
+                if index is not None:
+                    self.__slots[index] = 0
+                    self.__items -= 1
+                    return
+
+    def stats(self):
+        """
+        Return the size, memory footprint, and hit counters of the index.
+
+        :return: a dictionary describing the index in this worker
+        """
+        with self.__lock:
+            slots = len(self.__slots)
+            return {
+                "ready" : self.__ready,
+                "saturated" : self.__saturated,
+                "items" : self.__items,
+                "slots" : slots,
+                "load_factor" : round(self.__items / slots, 4) if slots else 0.0,
+                "memory_bytes" : slots * self.__slots.itemsize,
+                # Two buckets of four 16-bit fingerprints are compared per lookup
+                "estimated_false_positive_rate" : round(2 * self.__BUCKET_SIZE / 65535, 6),
+                "lookups" : self.__lookups,
+                "skipped_queries" : self.__skipped,
+                "false_positives" : self.__false_positives
+            }
+
+    def __locate(self, email):
+        """
+        Return the fingerprint and the two candidate buckets of an address.
+        """
+        digest = int.from_bytes(hashlib.blake2b(self.normalize(email).encode("utf-8"), digest_size=8).digest(), "little")
+        fingerprint = (digest >> 48) % 0xFFFF + 1  # 0 marks an empty slot
+        first = digest & self.__bucket_mask
+        return fingerprint, first, self.__alternate(first, fingerprint)
+
+    def __alternate(self, bucket, fingerprint):
+        """
+        Return the other bucket of a fingerprint; applying it twice gives the original bucket.
+        """
+        return (bucket ^ (fingerprint * 0x5BD1E995)) & self.__bucket_mask
+
+    def __find(self, bucket, fingerprint):
+        start = bucket * self.__BUCKET_SIZE
+        for index in range(start, start + self.__BUCKET_SIZE):
+            if self.__slots[index] == fingerprint:
+                return index
+        return None
+
+    def __place(self, bucket, fingerprint):
+        start = bucket * self.__BUCKET_SIZE
+        for index in range(start, start + self.__BUCKET_SIZE):
+            if self.__slots[index] == 0:
+                self.__slots[index] = fingerprint
+                return True
+        return False
+
+    def __insert(self, email):
+        """
+        Store an address's fingerprint, relocating others if both buckets are full.
+
+        Must be called with the lock held.
+        """
+        fingerprint, first, second = self.__locate(email)
+        if self.__place(first, fingerprint) or self.__place(second, fingerprint):
+            self.__items += 1
+            return
+        bucket = self.__random.choice((first, second))
+        for _ in range(self.__MAX_KICKS):
+            index = bucket * self.__BUCKET_SIZE + self.__random.randrange(self.__BUCKET_SIZE)
+            fingerprint, self.__slots[index] = self.__slots[index], fingerprint
+            bucket = self.__alternate(bucket, fingerprint)
+            if self.__place(bucket, fingerprint):
+                self.__items += 1
+                return
+        # The evicted fingerprint has nowhere to go, so negative answers are no longer exact
+        self.__saturated = True
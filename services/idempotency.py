@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import time
+
+"""
+Idempotency module for deduplicating retried client requests.
+
+This module provides the IdempotencyStore class, which remembers the result of a
+request per (uid, Idempotency-Key) for a TTL. Replays get the stored result, and
+duplicates arriving while the first request is still running wait for it.
+The store lives in process memory, so a replay only deduplicates on the worker that
+served the first request.
+"""
+
+
+class IdempotencyConflict(Exception):
+    """
+    Exception raised when an Idempotency-Key is reused with a different request body.
+    """
+    def __init__(self):
+        super().__init__("idempotency key was already used with a different request")
+
+
+class IdempotencyClaim:
+    """
+    Handle returned by IdempotencyStore.claim describing how the caller should proceed.
+    """
+    def __init__(self, result=None, replayed=False):
+        """
+        :param result: the stored result when replayed
+        :param replayed: True if the caller must return result instead of running the request
+        """
+        self.result = result
+        self.replayed = replayed
+        self.saved = False
+
+    def save(self, result):
+        """
+        Store the result of the request so later replays can return it.
+
+        :param result: a JSON-serializable result
+        """
+        self.result = result
+        self.saved = True
+
+
+class IdempotencyStore:
+    """
+    In-memory store of request results keyed by user and Idempotency-Key.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_entries=5000):
+        """
+        Initialize an empty IdempotencyStore.
+
+        :param ttl_seconds: float number of seconds a stored result can be replayed
+        :param max_entries: integer number of results kept, the oldest are evicted first
+        """
+        self.__ttl_seconds = ttl_seconds
+        self.__max_entries = max_entries
+        # (uid, key) -> {"fingerprint", "expires", "result", "done" future}
+        self.__entries = OrderedDict()
+
+    @asynccontextmanager
+    async def claim(self, uid, key, fingerprint):
+        """
+        Claim an idempotency key for a request.
+
+        If a result is stored, the claim is marked replayed and carries it. If the
+        same key is in flight, this waits for it first. Otherwise the caller owns the key
+        and should call claim.save(result) on success. If it fails without saving, the
+        key is released so that a retry runs the request again.
+
+        :param uid: integer representing the user's unique identifier
+        :param key: string containing the Idempotency-Key header
+        :param fingerprint: string identifying the request body the key was first used with
+        :raises IdempotencyConflict: if the key was used with a different fingerprint
+        """
+        entry_key = (uid, key)
+        while True:
+            self.__evict()
+            entry = self.__entries.get(entry_key)
+            if entry is None:
+                break
+            if entry["fingerprint"] != fingerprint:
+                raise IdempotencyConflict()
+            if entry["done"].done():
+                yield IdempotencyClaim(entry["result"], replayed=True)
+                return
+            await asyncio.shield(entry["done"])
+
+        entry = {
+            "fingerprint" : fingerprint,
+            "expires" : None,
+            "result" : None,
+            "done" : asyncio.get_running_loop().create_future()
+        }
+        self.__entries[entry_key] = entry
+        claim = IdempotencyClaim()
+        try:
+            yield claim
+        finally:
+            if claim.saved:
+                entry["result"] = claim.result
+                entry["expires"] = time.monotonic() + self.__ttl_seconds
+                self.__entries.move_to_end(entry_key)
+            else:
+                self.__entries.pop(entry_key, None)
+            entry["done"].set_result(None)
+
+    def __evict(self):
+        """
+        Drop expired results and, past max_entries, the oldest completed ones.
+
+        Completed entries are moved to the end when saved, and the TTL is fixed, so they
+        are ordered by expiry and the scan stops at the first one still worth keeping.
+        """
+        now = time.monotonic()
+        stale = []
+        for entry_key, entry in self.__entries.items():
+            if entry["expires"] is None:
+                # Still in flight
+                continue
+            if entry["expires"] > now and len(self.__entries) - len(stale) <= self.__max_entries:
+                break
+            stale.append(entry_key)
+        for entry_key in stale:
+            del self.__entries[entry_key]
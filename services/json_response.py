@@ -0,0 +1,28 @@
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+JSON response module providing the application's default response class.
+
+This module provides the FastJSONResponse class, which encodes bodies with orjson
+when it is installed and falls back to the standard JSONResponse encoding otherwise.
+For routes with a response model, Pydantic turns the result into JSON-ready values in
+one pass and this class only encodes them; untyped routes still go through FastAPI's
+generic jsonable_encoder first.
+"""
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendering its content with orjson.
+    """
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        # Keys that are not strings (for example uid integers) are written as strings, like json.dumps
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
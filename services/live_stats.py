@@ -0,0 +1,165 @@
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+from services.logger import get_logger
+
+"""
+Live stats module for pushing counter deltas to admin dashboards.
+
+This module provides the LiveStats class. While at least one dashboard is connected,
+it reads the shared endpoint and usage counters once per tick and computes what
+changed since the previous tick. The same delta event is then handed to every
+subscriber, so the cost per tick does not depend on how many dashboards are open.
+"""
+
+logger = get_logger("services.live_stats")
+
+
+class LiveStats:
+    """
+    Broadcaster of endpoint and user-usage counter deltas.
+
+    ADMIN_STREAM_INTERVAL_SECONDS sets the tick interval (default 1).
+    """
+    __QUEUE_SIZE = 64
+
+    def __init__(self, counters, interval=None):
+        """
+        Initialize an idle LiveStats broadcaster.
+
+        :param counters: SharedCounters instance holding the endpoint and usage counters
+        :param interval: optional float number of seconds between ticks
+        """
+        self.__counters = counters
+        self.__interval = interval if interval is not None else float(os.getenv("ADMIN_STREAM_INTERVAL_SECONDS", "1"))
+        self.__subscribers = set()
+        self.__task = None
+        self.__baseline = None
+        self.__last = None
+
+    @property
+    def interval(self):
+        """
+        Return the number of seconds between ticks.
+        """
+        return self.__interval
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """
+        Receive delta events for the duration of the block.
+
+        Yields an asyncio.Queue of event dictionaries. A None item means the stream has
+        ended, either because the broadcaster closed or because the subscriber fell too
+        far behind; the client should reconnect and take a fresh snapshot.
+        """
+        subscriber = asyncio.Queue(self.__QUEUE_SIZE)
+        self.__subscribers.add(subscriber)
+        if self.__task is None:
+            self.__baseline = asyncio.get_running_loop().create_future()
+            self.__task = asyncio.create_task(self.__run(self.__baseline))
+        try:
+            # Deltas are counted from the first read, which must come before the caller's snapshot
+            await asyncio.shield(self.__baseline)
+            yield subscriber
+        finally:
+            self.__subscribers.discard(subscriber)
+            if not self.__subscribers and self.__task is not None:
+                self.__task.cancel()
+                self.__task = None
+
+    async def close(self):
+        """
+        Stop ticking and end every subscriber's stream.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__baseline is not None and not self.__baseline.done():
+            self.__baseline.cancel()
+        for subscriber in list(self.__subscribers):
+            self.__end(subscriber)
+
+    async def __run(self, baseline):
+        try:
+            self.__last = await asyncio.to_thread(self.__read_totals)
+        except Exception as error:
+            baseline.set_exception(error)
+            raise
+        baseline.set_result(None)
+        while True:
+            await asyncio.sleep(self.__interval)
+            try:
+                totals = await asyncio.to_thread(self.__read_totals)
+            except Exception:
+                logger.exception("reading live stats failed")
+                continue
+            event = self.__diff(self.__last, totals)
+            self.__last = totals
+            if event is None:
+                continue
+            for subscriber in list(self.__subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.__subscribers.discard(subscriber)
+                    self.__end(subscriber)
+
+    def __read_totals(self):
+        """
+        Read the endpoint and usage counters in one pass over the shared segment.
+
+        :return: a tuple of ({(http_method, endpoint): total}, {uid: total})
+        """
+        endpoints = {}
+        usage = {}
+        for key, total in self.__counters.totals().items():
+            if key.startswith("e|"):
+                method, _, endpoint = key[2:].partition("|")
+                endpoints[(method, endpoint)] = total
+            elif key.startswith("u|"):
+                usage[int(key[2:])] = total
+        return endpoints, usage
+
+    @staticmethod
+    def __diff(previous, current):
+        """
+        Build the event for what changed between two reads.
+
+        A counter that is new or went down (it was discarded and started again) counts
+        its whole current total as the delta.
+
+        :return: the event dictionary, or None if nothing changed
+        """
+        def changes(before, after):
+            changed = {}
+            for key, total in after.items():
+                delta = total - before.get(key, 0)
+                if delta < 0:
+                    delta = total
+                if delta:
+                    changed[key] = delta
+            return changed
+
+        endpoints = changes(previous[0], current[0])
+        usage = changes(previous[1], current[1])
+        if not endpoints and not usage:
+            return None
+        return {
+            "ts" : round(time.time(), 3),
+            "endpoints" : [
+                {"http_method" : method, "endpoint" : endpoint, "delta" : delta}
+                for (method, endpoint), delta in endpoints.items()
+            ],
+            "usage" : [{"uid" : uid, "delta" : delta} for uid, delta in usage.items()]
+        }
+
+    @staticmethod
+    def __end(subscriber):
+        """
+        Replace whatever a subscriber has not read yet with the end-of-stream marker.
+        """
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        subscriber.put_nowait(None)
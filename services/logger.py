@@ -0,0 +1,124 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+"""
+Logging module providing non-blocking structured JSON logging.
+
+Records are put on an in-memory queue by the request path and written to stdout by
+a background thread, so a slow terminal or log collector never blocks the event loop.
+Each record carries the id of the request that produced it, and high-volume levels
+can be sampled.
+"""
+
+request_id_var = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter rendering each record as one JSON object per line.
+    """
+
+    def format(self, record):
+        """
+        Render a record with its timestamp, level, logger, message, request id, and extra fields.
+
+        :param record: the LogRecord to render
+        :return: string containing the JSON line
+        """
+        entry = {
+            "ts" : round(record.created, 3),
+            "level" : record.levelname.lower(),
+            "logger" : record.name,
+            "msg" : record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class ContextFilter(logging.Filter):
+    """
+    Filter stamping records with the current request id and sampling noisy levels.
+
+    Runs on the calling thread, where the request context is still available.
+    """
+
+    def __init__(self, sample_rates):
+        """
+        :param sample_rates: dictionary mapping level numbers to the fraction of records kept
+        """
+        super().__init__()
+        self.__sample_rates = sample_rates
+
+    def filter(self, record):
+        rate = self.__sample_rates.get(record.levelno, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+def configure_logging():
+    """
+    Route all application loggers through a queue drained by a background writer thread.
+
+    Level comes from LOG_LEVEL (default INFO). LOG_SAMPLE_DEBUG and LOG_SAMPLE_INFO give the
+    fraction of records kept at those levels (default 1.0). Calling this again is a no-op.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    handler.addFilter(ContextFilter({
+        logging.DEBUG : float(os.getenv("LOG_SAMPLE_DEBUG", "1.0")),
+        logging.INFO : float(os.getenv("LOG_SAMPLE_INFO", "1.0")),
+    }))
+
+    root = logging.getLogger("app")
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.handlers = [handler]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Stop the writer thread after it has written every queued record.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    """
+    Return an application logger.
+
+    :param name: string naming the component, e.g. "routers.auth"
+    :return: a logging.Logger under the "app" hierarchy
+    """
+    return logging.getLogger(f"app.{name}")
+
@@ -0,0 +1,39 @@
+from fastapi import HTTPException, Request, status
+
+"""
+Request body module for reading client bodies under a size limit.
+
+This module provides read_limited_body, which stops buffering as soon as a body
+exceeds its limit instead of reading the whole body before validation.
+"""
+
+
+async def read_limited_body(request: Request, max_bytes):
+    """
+    Read a request body, rejecting it once it grows past max_bytes.
+
+    A declared Content-Length over the limit is rejected without reading anything.
+
+    :param request: the incoming HTTP request
+    :param max_bytes: integer representing the largest accepted body size
+    :return: the raw body bytes
+    :raises HTTPException: with status 413 if the body is too large
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"message" : f"request body exceeds {max_bytes} bytes"}
+        )
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail={"message" : f"request body exceeds {max_bytes} bytes"}
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,187 @@
+import random
+import time
+from collections import deque
+
+"""
+Resilience module providing the failure-handling primitives used for upstream calls.
+
+This module provides the CircuitBreaker class for failing fast while a dependency is
+down, the RetryBudget class for capping retries to a fraction of traffic, and the
+LatencyTracker class for estimating the tail latency used to time hedged requests.
+"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that opens after consecutive failures and probes again after a cooldown.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        """
+        Initialize a closed CircuitBreaker.
+
+        :param failure_threshold: integer number of consecutive failures that opens the breaker
+        :param reset_seconds: float number of seconds to stay open before allowing a probe
+        """
+        self.__failure_threshold = failure_threshold
+        self.__reset_seconds = reset_seconds
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probing = False
+
+    @property
+    def state(self):
+        """
+        Return the current breaker state.
+
+        :return: one of CLOSED, OPEN, or HALF_OPEN
+        """
+        if self.__opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.__opened_at >= self.__reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after(self):
+        """
+        Return the number of seconds until the breaker allows a probe.
+
+        :return: integer number of seconds, 0 if calls are allowed now
+        """
+        if self.__opened_at is None:
+            return 0
+        remaining = self.__reset_seconds - (time.monotonic() - self.__opened_at)
+        return max(0, int(remaining + 0.999))
+
+    def would_allow(self):
+        """
+        Check whether allow() would let a call through, without taking the half-open probe.
+
+        :return: True if a call may proceed now, False if it should fail fast
+        """
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.__probing)
+
+    def allow(self):
+        """
+        Check whether a call may proceed. In the half-open state only one probe is let through.
+
+        :return: True if the call may proceed, False if it should fail fast
+        """
+        if not self.would_allow():
+            return False
+        if self.state == self.HALF_OPEN:
+            self.__probing = True
+        return True
+
+    def release_probe(self):
+        """
+        Give back the half-open probe of a call that ended without an outcome, for example
+        because it was cancelled, so that the next call can probe instead.
+        """
+        self.__probing = False
+
+    def record_success(self):
+        """
+        Record a successful call, closing the breaker.
+        """
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probing = False
+
+    def record_failure(self):
+        """
+        Record a failed call, opening the breaker when the threshold is reached or a probe fails.
+        """
+        self.__failures += 1
+        if self.__probing or self.__failures >= self.__failure_threshold:
+            self.__opened_at = time.monotonic()
+        self.__probing = False
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries and hedges to a fraction of first attempts.
+
+    Every request deposits `ratio` tokens and every retry spends one, so during an
+    outage retries cannot multiply the load on the upstream beyond (1 + ratio).
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        """
+        Initialize a full RetryBudget.
+
+        :param ratio: float fraction of requests that may be retried
+        :param max_tokens: float maximum number of retries that can be banked
+        """
+        self.__ratio = ratio
+        self.__max_tokens = max_tokens
+        self.__tokens = max_tokens
+
+    def record_request(self):
+        """
+        Deposit tokens for a first attempt.
+        """
+        self.__tokens = min(self.__max_tokens, self.__tokens + self.__ratio)
+
+    def try_spend(self):
+        """
+        Spend one token for a retry or hedge if the budget allows it.
+
+        :return: True if the retry may proceed, False otherwise
+        """
+        if self.__tokens >= 1.0:
+            self.__tokens -= 1.0
+            return True
+        return False
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful call latencies.
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        """
+        Initialize an empty LatencyTracker.
+
+        :param window: integer number of latencies kept
+        :param min_samples: integer number of samples required before percentiles are reported
+        """
+        self.__samples = deque(maxlen=window)
+        self.__min_samples = min_samples
+
+    def record(self, seconds):
+        """
+        Record the latency of a successful call.
+
+        :param seconds: float duration of the call in seconds
+        """
+        self.__samples.append(seconds)
+
+    def percentile(self, fraction):
+        """
+        Return a latency percentile over the window.
+
+        :param fraction: float between 0 and 1, for example 0.95
+        :return: float latency in seconds, or None if there are not enough samples
+        """
+        if len(self.__samples) < self.__min_samples:
+            return None
+        ordered = sorted(self.__samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def backoff_delay(attempt, base=0.2, cap=2.0):
+    """
+    Return an exponential backoff delay with full jitter.
+
+    :param attempt: integer number of the retry, starting at 1
+    :param base: float delay in seconds of the first retry before jitter
+    :param cap: float maximum delay in seconds
+    :return: float delay in seconds
+    """
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
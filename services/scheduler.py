@@ -0,0 +1,230 @@
+from collections import deque
+import asyncio
+import math
+import os
+import time
+
+"""
+Scheduler module for sharing the AI backend fairly between users.
+
+This module provides the FairScheduler class, which admits at most a fixed number of
+AI calls at once, caps how many each user may have in flight, and orders the waiting
+calls with start-time fair queueing so every user gets a share of the slots in
+proportion to the weight of their tier. A call that waits longer than the queue
+timeout, or finds its user's queue full, is shed with SchedulerRejected.
+"""
+
+
+class SchedulerRejected(Exception):
+    """
+    Exception raised when a call is shed instead of being admitted.
+    """
+    def __init__(self, message, retry_after):
+        """
+        :param message: string describing why the call was shed
+        :param retry_after: integer number of seconds the client should wait before retrying
+        """
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class FairScheduler:
+    """
+    Weighted fair queue with a global concurrency cap and per-user in-flight caps.
+
+    AI_MAX_CONCURRENCY caps concurrent calls (default 32), AI_MAX_IN_FLIGHT_PER_USER caps
+    one user's concurrent calls (default 4), AI_MAX_QUEUED_PER_USER caps one user's
+    waiting calls (default 16), AI_QUEUE_TIMEOUT is the longest a call may wait in
+    seconds (default 5), and AI_TIER_WEIGHTS gives the share of each tier
+    (default "admin=2,user=1").
+    """
+    __MAX_IDLE_USERS = 10000
+
+    def __init__(self, max_concurrency=None, max_per_user=None, max_queued_per_user=None,
+                 queue_timeout=None, weights=None):
+        """
+        Initialize an idle FairScheduler, reading any omitted setting from the environment.
+
+        :param max_concurrency: integer number of calls admitted at once
+        :param max_per_user: integer number of calls one user may have admitted at once
+        :param max_queued_per_user: integer number of calls one user may have waiting
+        :param queue_timeout: float number of seconds a call may wait before it is shed
+        :param weights: dictionary mapping tier names to float weights
+        """
+        self.__max_concurrency = max_concurrency if max_concurrency is not None else int(os.getenv("AI_MAX_CONCURRENCY", "32"))
+        self.__max_per_user = max_per_user if max_per_user is not None else int(os.getenv("AI_MAX_IN_FLIGHT_PER_USER", "4"))
+        self.__max_queued_per_user = max_queued_per_user if max_queued_per_user is not None else int(os.getenv("AI_MAX_QUEUED_PER_USER", "16"))
+        self.__queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("AI_QUEUE_TIMEOUT", "5"))
+        self.__weights = weights if weights is not None else self.parse_weights(os.getenv("AI_TIER_WEIGHTS", "admin=2,user=1"))
+        self.__in_flight = 0
+        self.__virtual_time = 0.0
+        # user -> {"tier", "waiting" deque of [start tag, future, enqueued at], "finish_tag", "in_flight", counters}
+        self.__users = {}
+        self.__backlogged = set()
+
+    @staticmethod
+    def parse_weights(value):
+        """
+        Parse a tier weight setting such as "admin=2,user=1".
+
+        :param value: string of comma separated tier=weight pairs
+        :return: dictionary mapping tier names to float weights
+        :raises ValueError: if a weight is not a positive number
+        """
+        weights = {}
+        for pair in value.split(","):
+            if not pair.strip():
+                continue
+            tier, _, weight = pair.partition("=")
+            weights[tier.strip()] = float(weight)
+            if weights[tier.strip()] <= 0:
+                raise ValueError(f"weight of tier {tier.strip()!r} must be positive")
+        return weights
+
+    async def acquire(self, user, tier="user"):
+        """
+        Wait for a slot. Callers must call release(user) once the call is done.
+
+        :param user: hashable key identifying the user, usually the uid
+        :param tier: string naming the user's tier in the weight table
+        :raises SchedulerRejected: if the user's queue is full or the queue timeout passes
+        """
+        state = self.__users.get(user)
+        if state is None:
+            self.__prune()
+            state = self.__users[user] = {
+                "tier" : tier, "waiting" : deque(), "finish_tag" : 0.0, "in_flight" : 0,
+                "admitted" : 0, "shed" : 0, "wait_total" : 0.0, "wait_max" : 0.0
+            }
+        state["tier"] = tier
+        start_tag = max(self.__virtual_time, state["finish_tag"])
+
+        if not state["waiting"] and state["in_flight"] < self.__max_per_user and self.__in_flight < self.__max_concurrency:
+            state["finish_tag"] = start_tag + 1.0 / self.__weights.get(tier, 1.0)
+            self.__admit(state, start_tag, 0.0)
+            return
+        if len(state["waiting"]) >= self.__max_queued_per_user:
+            # A shed call never joins the queue, so it must not advance the user's finish tag
+            state["shed"] += 1
+            raise SchedulerRejected("too many AI requests queued for this user", self.__retry_after())
+        state["finish_tag"] = start_tag + 1.0 / self.__weights.get(tier, 1.0)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [start_tag, future, time.monotonic()]
+        state["waiting"].append(entry)
+        self.__backlogged.add(user)
+        try:
+            await asyncio.wait_for(future, self.__queue_timeout)
+        except BaseException as error:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ended; hand the slot to the next call
+                self.release(user)
+            else:
+                self.__remove(user, state, entry)
+            if isinstance(error, asyncio.TimeoutError):
+                state["shed"] += 1
+                raise SchedulerRejected("AI request waited too long in the queue", self.__retry_after())
+            raise
+
+    def release(self, user):
+        """
+        Return a slot taken by acquire and admit the next waiting calls.
+
+        :param user: the key passed to acquire
+        """
+        self.__users[user]["in_flight"] -= 1
+        self.__in_flight -= 1
+        self.__dispatch()
+
+    def stats(self):
+        """
+        Return scheduler and per-user queue statistics.
+
+        :return: a dictionary with the limits, totals, and one entry per known user
+        """
+        users = []
+        for user, state in self.__users.items():
+            users.append({
+                "uid" : user,
+                "tier" : state["tier"],
+                "in_flight" : state["in_flight"],
+                "queued" : len(state["waiting"]),
+                "admitted" : state["admitted"],
+                "shed" : state["shed"],
+                "avg_wait_ms" : round(state["wait_total"] / state["admitted"] * 1000, 1) if state["admitted"] else 0.0,
+                "max_wait_ms" : round(state["wait_max"] * 1000, 1)
+            })
+        return {
+            "max_concurrency" : self.__max_concurrency,
+            "max_in_flight_per_user" : self.__max_per_user,
+            "queue_timeout_seconds" : self.__queue_timeout,
+            "in_flight" : self.__in_flight,
+            "queued" : sum(user["queued"] for user in users),
+            "users" : users
+        }
+
+    def __admit(self, state, start_tag, waited):
+        state["in_flight"] += 1
+        state["admitted"] += 1
+        state["wait_total"] += waited
+        state["wait_max"] = max(state["wait_max"], waited)
+        self.__in_flight += 1
+        self.__virtual_time = max(self.__virtual_time, start_tag)
+
+    def __dispatch(self):
+        """
+        Admit waiting calls in start tag order while slots are free, skipping users at their cap.
+        """
+        while self.__in_flight < self.__max_concurrency and self.__backlogged:
+            best_user, best_entry = None, None
+            for user in list(self.__backlogged):
+                state = self.__users[user]
+                waiting = state["waiting"]
+                while waiting and waiting[0][1].done():
+                    waiting.popleft()
+                if not waiting:
+                    self.__backlogged.discard(user)
+                    continue
+                if state["in_flight"] >= self.__max_per_user:
+                    continue
+                if best_entry is None or waiting[0][0] < best_entry[0]:
+                    best_user, best_entry = user, waiting[0]
+            if best_entry is None:
+                return
+
+            state = self.__users[best_user]
+            state["waiting"].popleft()
+            if not state["waiting"]:
+                self.__backlogged.discard(best_user)
+            self.__admit(state, best_entry[0], time.monotonic() - best_entry[2])
+            best_entry[1].set_result(None)
+
+    def __remove(self, user, state, entry):
+        """
+        Drop a call that stopped waiting and move the user's later calls up by its share.
+        """
+        waiting = state["waiting"]
+        try:
+            index = waiting.index(entry)
+        except ValueError:
+            return
+        del waiting[index]
+        cost = 1.0 / self.__weights.get(state["tier"], 1.0)
+        for later in list(waiting)[index:]:
+            later[0] -= cost
+        state["finish_tag"] -= cost
+        if not waiting:
+            self.__backlogged.discard(user)
+
+    def __retry_after(self):
+        return max(1, math.ceil(self.__queue_timeout))
+
+    def __prune(self):
+        """
+        Forget idle users once too many are tracked, so the table stays bounded.
+        """
+        if len(self.__users) < self.__MAX_IDLE_USERS:
+            return
+        for user in [user for user, state in self.__users.items() if not state["waiting"] and not state["in_flight"]]:
+            del self.__users[user]
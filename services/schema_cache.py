@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from jsonschema import validators
+from jsonschema.exceptions import SchemaError
+from referencing import Registry
+from referencing.exceptions import Unresolvable
+import referencing.jsonschema
+import hashlib
+import json
+
+"""
+Schema cache module for reusing compiled JSON schema validators.
+
+This module provides the SchemaValidatorCache class, which checks each distinct
+user schema against its metaschema once and keeps the resulting validator keyed by a
+hash of the canonical schema. Later requests with the same schema skip both steps.
+Every $ref must resolve within the schema itself; remote references are never fetched.
+"""
+
+
+class InvalidSchemaError(Exception):
+    """
+    Exception raised when a user supplied schema is not a valid JSON schema.
+    """
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class SchemaValidatorCache:
+    """
+    LRU cache of JSON schema validators keyed by canonical schema hash.
+
+    Invalid schemas are cached too, so a client repeating a bad schema is rejected
+    without checking it against the metaschema again.
+    """
+
+    def __init__(self, max_entries=256):
+        """
+        Initialize an empty SchemaValidatorCache.
+
+        :param max_entries: integer number of schemas to keep
+        """
+        self.__max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    @staticmethod
+    def schema_key(schema):
+        """
+        Return the canonical hash of a schema, independent of key order and whitespace.
+
+        :param schema: the decoded JSON schema
+        :return: string containing the hex digest
+        """
+        canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get_validator(self, schema):
+        """
+        Return the validator for a schema, building and caching it on first use.
+
+        :param schema: the decoded JSON schema
+        :return: a jsonschema validator instance
+        :raises InvalidSchemaError: if the schema does not conform to its metaschema or has a dangling $ref
+        """
+        key = self.schema_key(schema)
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+        else:
+            self.__misses += 1
+            entry = self.__compile(schema)
+            self.__entries[key] = entry
+            if len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+        if isinstance(entry, str):
+            raise InvalidSchemaError(entry)
+        return entry
+
+    @staticmethod
+    def __compile(schema):
+        """
+        Check a schema against the metaschema of its declared draft and build its validator.
+
+        A $ref that does not resolve would otherwise only fail while validating the AI
+        result, after the upstream call, so every reference is resolved here.
+
+        :return: the validator, or the error message string to be cached
+        """
+        validator_class = validators.validator_for(schema)
+        try:
+            validator_class.check_schema(schema)
+        except SchemaError as error:
+            return error.message
+        specification = referencing.jsonschema.specification_with(validator_class.META_SCHEMA["$schema"])
+        root = specification.create_resource(schema)
+        # The registry holds only this schema and the subschemas it identifies with $id
+        registry = Registry().with_resource("", root).crawl()
+        stack = [(root, registry.resolver())]
+        while stack:
+            resource, resolver = stack.pop()
+            resolver = resolver.in_subresource(resource)
+            ref = resource.contents.get("$ref") if isinstance(resource.contents, dict) else None
+            if isinstance(ref, str):
+                try:
+                    resolver.lookup(ref)
+                except Unresolvable:
+                    return f"$ref {ref!r} does not resolve within the schema"
+            stack.extend((subresource, resolver) for subresource in resource.subresources())
+        return validator_class(schema, registry=registry)
+
+    def stats(self):
+        """
+        Return cache statistics.
+
+        :return: a dictionary with entries, hits, and misses
+        """
+        return {"entries" : len(self.__entries), "hits" : self.__hits, "misses" : self.__misses}
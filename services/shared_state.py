@@ -0,0 +1,489 @@
+import fcntl
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+
+"""
+Shared state module for counters that must stay consistent across worker processes.
+
+This module provides the SharedCounters class, a fixed-size hash table of named
+counters stored in a memory-mapped file. Every uvicorn worker maps the same file,
+so request and usage counters are updated in shared memory instead of with a
+MySQL round trip per request. The table is split into stripes. Each stripe owns a
+contiguous range of slots and is guarded by its own lock. The lock is a thread
+lock inside a process and an fcntl lock on byte (stripe + 1) of the file across
+processes. Byte 0 is the header lock.
+"""
+
+
+class SharedCounters:
+    """
+    Class managing named 64-bit counters in a shared memory segment.
+
+    Each slot stores a key, a running total, the part of the total already flushed
+    to the database, and an optional cached offset. The offset lets readers compute
+    an absolute value (offset + total) without querying the database.
+    """
+    __MAGIC = b"CNTRS001"
+    # magic, slots, stripes, leader pid, segment epoch, leader lease expiry
+    __HEADER = struct.Struct("<8sqqqqd")
+    # flush generation, kept after the header; odd while a flush is running
+    __GENERATION = struct.Struct("<q")
+    __HEADER_SIZE = 64
+    # total, flushed, offset, has_offset, used, key length
+    __SLOT = struct.Struct("<qqqBBH")
+    __SLOT_SIZE = 128
+    __KEY_SIZE = __SLOT_SIZE - __SLOT.size
+
+    def __init__(self, path=None, slots=16384, stripes=64):
+        """
+        Initialize a SharedCounters instance over a new or existing segment.
+
+        :param path: optional file path of the shared segment, an anonymous private map is used if omitted
+        :param slots: integer representing the number of counter slots in a new segment
+        :param stripes: integer representing the number of lock stripes in a new segment
+        """
+        self.__path = path
+        self.__fd = None
+        if path is None:
+            self.__slots, self.__stripes = self.__normalize(slots, stripes)
+            self.__map = mmap.mmap(-1, self.__segment_size(self.__slots))
+            self.__write_header(0, self.__new_epoch(), 0.0)
+        else:
+            self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            self.__attach(slots, stripes)
+        self.__thread_locks = [threading.Lock() for _ in range(self.__stripes)]
+        self.__stripe_slots = self.__slots // self.__stripes
+
+    @classmethod
+    def create(cls, path, slots=16384, stripes=64):
+        """
+        Create a fresh shared segment at the given path, discarding any previous content.
+
+        Used by the launcher before workers start so every worker attaches to the same segment.
+
+        :param path: file path of the shared segment
+        :param slots: integer representing the number of counter slots
+        :param stripes: integer representing the number of lock stripes
+        :return: a SharedCounters instance attached to the new segment
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        return cls(path, slots, stripes)
+
+    @staticmethod
+    def __normalize(slots, stripes):
+        """
+        Round the slot count up so that every stripe owns the same number of slots.
+
+        :return: a tuple of (slots, stripes)
+        """
+        stripes = max(1, int(stripes))
+        slots = max(stripes, int(slots))
+        slots += (-slots) % stripes
+        return slots, stripes
+
+    def __segment_size(self, slots):
+        return self.__HEADER_SIZE + slots * self.__SLOT_SIZE
+
+    def __attach(self, slots, stripes):
+        """
+        Map the segment file, initializing its header if this process created it.
+        """
+        fcntl.lockf(self.__fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            header = os.pread(self.__fd, self.__HEADER.size, 0)
+            if len(header) == self.__HEADER.size and header[:8] == self.__MAGIC:
+                _, self.__slots, self.__stripes, _, _, _ = self.__HEADER.unpack(header)
+                self.__map = mmap.mmap(self.__fd, self.__segment_size(self.__slots))
+            else:
+                self.__slots, self.__stripes = self.__normalize(slots, stripes)
+                os.ftruncate(self.__fd, self.__segment_size(self.__slots))
+                self.__map = mmap.mmap(self.__fd, self.__segment_size(self.__slots))
+                self.__write_header(0, self.__new_epoch(), 0.0)
+        finally:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, 1, 0)
+
+    @staticmethod
+    def __new_epoch():
+        """
+        Return a random epoch for a new segment.
+
+        The epoch is random rather than the creation time, so segments created in the same
+        second, such as the private segments of workers started together, never share it.
+        """
+        return secrets.randbits(63)
+
+    def __write_header(self, leader_pid, epoch, lease_until):
+        self.__HEADER.pack_into(self.__map, 0, self.__MAGIC, self.__slots, self.__stripes, leader_pid, epoch, lease_until)
+
+    def __read_header(self):
+        return self.__HEADER.unpack_from(self.__map, 0)
+
+    @property
+    def path(self):
+        """
+        Return the file path of the shared segment, or None for a private segment.
+        """
+        return self.__path
+
+    @property
+    def epoch(self):
+        """
+        Return the random epoch of the segment, which identifies this generation of counters.
+        """
+        return self.__read_header()[4]
+
+    def close(self):
+        """
+        Unmap the segment and close the backing file.
+        """
+        self.__map.close()
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    # Locking
+
+    def __lock(self, stripe):
+        """
+        Acquire the lock for a stripe in this process and, for file-backed segments, across processes.
+        """
+        self.__thread_locks[stripe].acquire()
+        if self.__fd is not None:
+            fcntl.lockf(self.__fd, fcntl.LOCK_EX, 1, stripe + 1)
+
+    def __unlock(self, stripe):
+        if self.__fd is not None:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, 1, stripe + 1)
+        self.__thread_locks[stripe].release()
+
+    # Slot access
+
+    @staticmethod
+    def __encode(key):
+        return key.encode("utf-8") if isinstance(key, str) else key
+
+    def __home(self, key_bytes):
+        """
+        Return the stripe a key belongs to. crc32 is used because it is stable across processes.
+        """
+        return zlib.crc32(key_bytes) % self.__stripes
+
+    def __offset(self, index):
+        return self.__HEADER_SIZE + index * self.__SLOT_SIZE
+
+    def __read_slot(self, index):
+        offset = self.__offset(index)
+        total, flushed, cached, has_offset, used, key_len = self.__SLOT.unpack_from(self.__map, offset)
+        key_start = offset + self.__SLOT.size
+        return total, flushed, cached, has_offset, used, bytes(self.__map[key_start:key_start + key_len])
+
+    def __write_slot(self, index, total, flushed, cached, has_offset, key_bytes):
+        offset = self.__offset(index)
+        self.__SLOT.pack_into(self.__map, offset, total, flushed, cached, has_offset, 1, len(key_bytes))
+        key_start = offset + self.__SLOT.size
+        self.__map[key_start:key_start + len(key_bytes)] = key_bytes
+
+    def __clear_slot(self, index):
+        offset = self.__offset(index)
+        self.__map[offset:offset + self.__SLOT_SIZE] = bytes(self.__SLOT_SIZE)
+
+    def __find(self, stripe, key_bytes, create):
+        """
+        Find the slot of a key inside its stripe, optionally claiming an empty slot for it.
+
+        Must be called with the stripe lock held.
+
+        :return: the slot index, or None if the key is absent (or the stripe is full when creating)
+        """
+        start = stripe * self.__stripe_slots
+        probe = zlib.adler32(key_bytes) % self.__stripe_slots
+        for step in range(self.__stripe_slots):
+            index = start + (probe + step) % self.__stripe_slots
+            _, _, _, _, used, stored = self.__read_slot(index)
+            if not used:
+                if create:
+                    self.__write_slot(index, 0, 0, 0, 0, key_bytes)
+                    return index
+                return None
+            if stored == key_bytes:
+                return index
+        return None
+
+    def increment(self, key, amount=1):
+        """
+        Add an amount to a counter, creating it if needed.
+
+        :param key: string naming the counter
+        :param amount: integer to add to the counter
+        :return: the new total, or None if the key is too long or its stripe is full
+        """
+        key_bytes = self.__encode(key)
+        if len(key_bytes) > self.__KEY_SIZE:
+            return None
+        stripe = self.__home(key_bytes)
+        self.__lock(stripe)
+        try:
+            index = self.__find(stripe, key_bytes, create=True)
+            if index is None:
+                return None
+            total, flushed, cached, has_offset, _, _ = self.__read_slot(index)
+            total += amount
+            self.__write_slot(index, total, flushed, cached, has_offset, key_bytes)
+            return total
+        finally:
+            self.__unlock(stripe)
+
+    def get(self, key):
+        """
+        Read a counter.
+
+        :param key: string naming the counter
+        :return: a dictionary with total, pending, and value (None if no offset is cached), or None if absent
+        """
+        key_bytes = self.__encode(key)
+        stripe = self.__home(key_bytes)
+        self.__lock(stripe)
+        try:
+            index = self.__find(stripe, key_bytes, create=False)
+            if index is None:
+                return None
+            total, flushed, cached, has_offset, _, _ = self.__read_slot(index)
+        finally:
+            self.__unlock(stripe)
+        return {
+            "total" : total,
+            "pending" : total - flushed,
+            "value" : cached + total if has_offset else None
+        }
+
+    def set_value(self, key, value, source_includes_pending=False, generation=None):
+        """
+        Cache the absolute value of a counter so that later reads need no database query.
+
+        A value read from the database while a flush was committing may or may not include
+        the amount being flushed. Passing the flush generation taken before the read makes
+        the call refuse the value if a flush started since.
+
+        :param key: string naming the counter
+        :param value: integer value read from the database
+        :param source_includes_pending: True if value already includes the unflushed part of the total
+        :param generation: optional integer returned by flush_generation before the value was read
+        :return: True if the value was cached, False if the key could not be stored or a flush intervened
+        """
+        key_bytes = self.__encode(key)
+        if len(key_bytes) > self.__KEY_SIZE:
+            return False
+        stripe = self.__home(key_bytes)
+        self.__lock(stripe)
+        try:
+            index = self.__find(stripe, key_bytes, create=True)
+            if index is None:
+                return False
+            if generation is not None and self.__read_generation() != generation:
+                return False
+            total, flushed, _, _, _, _ = self.__read_slot(index)
+            # value already counts everything flushed; the remaining total is added on read
+            cached = value - (total if source_includes_pending else flushed)
+            self.__write_slot(index, total, flushed, cached, 1, key_bytes)
+            return True
+        finally:
+            self.__unlock(stripe)
+
+    def pending(self, prefix=""):
+        """
+        Collect every counter with unflushed increments.
+
+        :param prefix: optional string prefix that keys must start with
+        :return: a dictionary mapping keys to their unflushed amount
+        """
+        prefix_bytes = self.__encode(prefix)
+        deltas = {}
+        for stripe in range(self.__stripes):
+            self.__lock(stripe)
+            try:
+                start = stripe * self.__stripe_slots
+                for index in range(start, start + self.__stripe_slots):
+                    total, flushed, _, _, used, key_bytes = self.__read_slot(index)
+                    if used and total != flushed and key_bytes.startswith(prefix_bytes):
+                        deltas[key_bytes.decode("utf-8")] = total - flushed
+            finally:
+                self.__unlock(stripe)
+        return deltas
+
+    def totals(self, prefix=""):
+        """
+        Collect the running total of every counter.
+
+        :param prefix: optional string prefix that keys must start with
+        :return: a dictionary mapping keys to their total since the segment was created
+        """
+        prefix_bytes = self.__encode(prefix)
+        totals = {}
+        for stripe in range(self.__stripes):
+            self.__lock(stripe)
+            try:
+                start = stripe * self.__stripe_slots
+                for index in range(start, start + self.__stripe_slots):
+                    total, _, _, _, used, key_bytes = self.__read_slot(index)
+                    if used and key_bytes.startswith(prefix_bytes):
+                        totals[key_bytes.decode("utf-8")] = total
+            finally:
+                self.__unlock(stripe)
+        return totals
+
+    def mark_flushed(self, deltas):
+        """
+        Record that the given amounts have been written to the database.
+
+        :param deltas: a dictionary mapping keys to the amount that was flushed
+        """
+        for key, delta in deltas.items():
+            key_bytes = self.__encode(key)
+            stripe = self.__home(key_bytes)
+            self.__lock(stripe)
+            try:
+                index = self.__find(stripe, key_bytes, create=False)
+                if index is not None:
+                    total, flushed, cached, has_offset, _, _ = self.__read_slot(index)
+                    self.__write_slot(index, total, flushed + delta, cached, has_offset, key_bytes)
+            finally:
+                self.__unlock(stripe)
+
+    def discard(self, key):
+        """
+        Remove a counter, for example when the row it mirrors is deleted.
+
+        The stripe is rebuilt without the key so that probe chains stay intact.
+
+        :param key: string naming the counter
+        """
+        key_bytes = self.__encode(key)
+        stripe = self.__home(key_bytes)
+        self.__lock(stripe)
+        try:
+            self.__rebuild(stripe, lambda stored, total, flushed: stored != key_bytes)
+        finally:
+            self.__unlock(stripe)
+
+    def prune(self, keep):
+        """
+        Drop fully flushed counters that a predicate no longer wants to keep.
+
+        :param keep: callable receiving a key and returning True if the counter should stay
+        """
+        for stripe in range(self.__stripes):
+            self.__lock(stripe)
+            try:
+                self.__rebuild(
+                    stripe,
+                    lambda stored, total, flushed: total != flushed or keep(stored.decode("utf-8"))
+                )
+            finally:
+                self.__unlock(stripe)
+
+    def __rebuild(self, stripe, keep):
+        """
+        Reinsert the slots of a stripe that pass a filter. Must be called with the stripe lock held.
+        """
+        start = stripe * self.__stripe_slots
+        entries = []
+        removed = False
+        for index in range(start, start + self.__stripe_slots):
+            total, flushed, cached, has_offset, used, key_bytes = self.__read_slot(index)
+            if not used:
+                continue
+            if keep(key_bytes, total, flushed):
+                entries.append((total, flushed, cached, has_offset, key_bytes))
+            else:
+                removed = True
+        if not removed:
+            return
+        for index in range(start, start + self.__stripe_slots):
+            self.__clear_slot(index)
+        for total, flushed, cached, has_offset, key_bytes in entries:
+            index = self.__find(stripe, key_bytes, create=True)
+            self.__write_slot(index, total, flushed, cached, has_offset, key_bytes)
+
+    # Flushing
+
+    def flush_generation(self):
+        """
+        Return the current flush generation, to be passed to set_value.
+
+        :return: integer generation, or None if a flush is running
+        """
+        generation = self.__read_generation()
+        return None if generation % 2 else generation
+
+    def begin_flush(self):
+        """
+        Mark the start of a flush, so values read from the database meanwhile are not cached.
+        """
+        self.__advance_generation(odd=True)
+
+    def end_flush(self):
+        """
+        Mark the end of a flush started with begin_flush.
+        """
+        self.__advance_generation(odd=False)
+
+    def __read_generation(self):
+        return self.__GENERATION.unpack_from(self.__map, self.__HEADER.size)[0]
+
+    def __advance_generation(self, odd):
+        """
+        Move the flush generation to the next odd (running) or even (idle) number.
+
+        A flush that died while running leaves the generation odd; the next one moves past it.
+        """
+        if self.__fd is not None:
+            fcntl.lockf(self.__fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            generation = self.__read_generation() + 1
+            if generation % 2 != odd:
+                generation += 1
+            self.__GENERATION.pack_into(self.__map, self.__HEADER.size, generation)
+        finally:
+            if self.__fd is not None:
+                fcntl.lockf(self.__fd, fcntl.LOCK_UN, 1, 0)
+
+    # Leadership
+
+    def claim_leader(self, lease_seconds=30.0):
+        """
+        Make this process the flushing leader, or renew its lease, if no other process holds the role.
+
+        The role is held through a lease instead of a liveness check on the leader's pid,
+        because pids are reused: a new process with a dead leader's pid would otherwise
+        keep the role unclaimed forever. The leader renews the lease on every call, so
+        the lease must be longer than the interval between calls.
+
+        :param lease_seconds: float number of seconds the role is held without renewal
+        :return: True if this process is the leader
+        """
+        pid = os.getpid()
+        now = time.time()
+        if self.__fd is not None:
+            fcntl.lockf(self.__fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            magic, slots, stripes, leader, epoch, lease_until = self.__read_header()
+            if leader and leader != pid and lease_until > now:
+                return False
+            self.__write_header(pid, epoch, now + lease_seconds)
+            return True
+        finally:
+            if self.__fd is not None:
+                fcntl.lockf(self.__fd, fcntl.LOCK_UN, 1, 0)
+
+    def release_leader(self):
+        """
+        Give up the leader role if this process holds it.
+        """
+        if self.__read_header()[3] == os.getpid():
+            self.__write_header(0, self.epoch, 0.0)
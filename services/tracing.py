@@ -0,0 +1,278 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+"""
+Tracing module providing lightweight per-request spans.
+
+Code wraps interesting work in `span(name)` or decorates it with `traced(name)`. The
+timing middleware starts a Trace for every request, renders the spans as a
+Server-Timing header, and passes a sampled fraction of traces to the TraceExporter.
+The exporter writes them to a JSON-lines file or POSTs them to an OTLP/HTTP collector
+from a background thread. Outside a request, spans cost a single context lookup.
+"""
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """
+    Class collecting the spans recorded while serving one request.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: string naming the root span, e.g. "POST /api/v1/service/ai/text"
+        """
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.start_ns = time.time_ns()
+        self.__started = time.perf_counter()
+        self.duration = None
+        # (name, offset seconds from trace start, duration seconds)
+        self.spans = []
+
+    def record(self, name, started, finished):
+        """
+        Add a finished span.
+
+        :param name: string naming the span
+        :param started: float time.perf_counter() value when the span started
+        :param finished: float time.perf_counter() value when the span ended
+        """
+        self.spans.append((name, started - self.__started, finished - started))
+
+    def finish(self):
+        """
+        Mark the request as finished and record its total duration.
+        """
+        self.duration = time.perf_counter() - self.__started
+
+    def server_timing(self):
+        """
+        Render the spans as a Server-Timing header value, summing repeated span names.
+
+        :return: string such as 'db.find_user;dur=1.2, ai.upstream;dur=850.0, app;dur=853.4'
+        """
+        totals = {}
+        counts = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+            counts[name] = counts.get(name, 0) + 1
+        entries = []
+        for name, duration in totals.items():
+            entry = f"{name};dur={duration * 1000:.1f}"
+            if counts[name] > 1:
+                entry += f';desc="x{counts[name]}"'
+            entries.append(entry)
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.__started
+        entries.append(f"app;dur={elapsed * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def start_trace(name):
+    """
+    Start a trace for the current request context.
+
+    :param name: string naming the root span
+    :return: a tuple of (trace, token) where token restores the previous context
+    """
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    """
+    Detach the current trace from the request context.
+
+    :param token: the token returned by start_trace
+    """
+    _current_trace.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block of code as a span of the current request's trace.
+
+    :param name: string naming the span, used as the Server-Timing metric name
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, started, time.perf_counter())
+
+
+def traced(name):
+    """
+    Decorate a function or coroutine function so every call is recorded as a span.
+
+    :param name: string naming the span
+    :return: the decorator
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceExporter:
+    """
+    Background exporter writing sampled traces to a file or an OTLP/HTTP collector.
+
+    TRACE_EXPORT selects the destination: "file:<path>" appends one JSON trace per line,
+    "otlp:<url>" POSTs OTLP JSON to <url>/v1/traces. TRACE_SAMPLE_RATE is the fraction
+    of requests exported (default 0.01).
+    """
+    __BATCH_SIZE = 64
+
+    def __init__(self, destination=None, sample_rate=None):
+        """
+        :param destination: optional export destination, read from TRACE_EXPORT if omitted
+        :param sample_rate: optional float fraction of traces exported, read from TRACE_SAMPLE_RATE if omitted
+        """
+        self.__destination = destination if destination is not None else os.getenv("TRACE_EXPORT", "")
+        self.__sample_rate = sample_rate if sample_rate is not None else float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+        self.__queue = queue.SimpleQueue()
+        self.__thread = None
+
+    @property
+    def enabled(self):
+        """
+        Return True if a destination is configured.
+        """
+        return bool(self.__destination) and self.__sample_rate > 0
+
+    def start(self):
+        """
+        Start the background writer thread if exporting is enabled.
+        """
+        if self.enabled and self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="trace-exporter", daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """
+        Export whatever is queued and stop the writer thread.
+        """
+        if self.__thread is not None:
+            self.__queue.put(None)
+            self.__thread.join(timeout=5)
+            self.__thread = None
+
+    def offer(self, trace, attributes):
+        """
+        Queue a finished trace for export if it is sampled.
+
+        :param trace: the finished Trace
+        :param attributes: dictionary of request attributes such as status code and request id
+        """
+        if self.__thread is not None and random.random() < self.__sample_rate:
+            self.__queue.put((trace, attributes))
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            batch = [] if item is None else [item]
+            while item is not None and len(batch) < self.__BATCH_SIZE:
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                try:
+                    self.__export(batch)
+                except Exception:
+                    # Tracing must never affect serving; a failed batch is dropped
+                    pass
+            if item is None:
+                return
+
+    def __export(self, batch):
+        kind, _, target = self.__destination.partition(":")
+        if kind == "file":
+            with open(target, "a", encoding="utf-8") as trace_file:
+                for trace, attributes in batch:
+                    trace_file.write(json.dumps(self.__to_record(trace, attributes)) + "\n")
+        elif kind == "otlp":
+            body = json.dumps(self.__to_otlp(batch)).encode("utf-8")
+            request = urllib.request.Request(
+                target.rstrip("/") + "/v1/traces",
+                data=body,
+                headers={"Content-Type" : "application/json"},
+                method="POST"
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+
+    @staticmethod
+    def __to_record(trace, attributes):
+        return {
+            "trace_id" : trace.trace_id,
+            "name" : trace.name,
+            "start_ns" : trace.start_ns,
+            "duration_ms" : round(trace.duration * 1000, 3),
+            "attributes" : attributes,
+            "spans" : [
+                {"name" : name, "offset_ms" : round(offset * 1000, 3), "duration_ms" : round(duration * 1000, 3)}
+                for name, offset, duration in trace.spans
+            ]
+        }
+
+    @staticmethod
+    def __to_otlp(batch):
+        spans = []
+        for trace, attributes in batch:
+            root_id = os.urandom(8).hex()
+            spans.append({
+                "traceId" : trace.trace_id,
+                "spanId" : root_id,
+                "name" : trace.name,
+                "kind" : 2,
+                "startTimeUnixNano" : str(trace.start_ns),
+                "endTimeUnixNano" : str(trace.start_ns + int(trace.duration * 1e9)),
+                "attributes" : [
+                    {"key" : key, "value" : {"stringValue" : str(value)}} for key, value in attributes.items()
+                ]
+            })
+            for name, offset, duration in trace.spans:
+                start_ns = trace.start_ns + int(offset * 1e9)
+                spans.append({
+                    "traceId" : trace.trace_id,
+                    "spanId" : os.urandom(8).hex(),
+                    "parentSpanId" : root_id,
+                    "name" : name,
+                    "kind" : 1,
+                    "startTimeUnixNano" : str(start_ns),
+                    "endTimeUnixNano" : str(start_ns + int(duration * 1e9))
+                })
+        return {
+            "resourceSpans" : [{
+                "resource" : {"attributes" : [{"key" : "service.name", "value" : {"stringValue" : "4537-backend-api"}}]},
+                "scopeSpans" : [{"scope" : {"name" : "services.tracing"}, "spans" : spans}]
+            }]
+        }
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-test-secret-key-test")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import asyncio
+import httpx
+import pytest
+from benchmarks.stand_ins import StandInDatabase
+from main import App
+from routers.auth import AuthUtility
+from services.ai_backend import AIBackend
+
+"""
+Shared fixtures for the test suite.
+
+Tests run the real Database queries against the in-memory SQLite stand-in from the
+benchmarks, and the AI backend client against an httpx MockTransport. pytest-asyncio is
+not a dependency, so asynchronous tests drive their own event loop with asyncio.run.
+"""
+
+
+def make_ai_backend(handler):
+    """
+    Build an AIBackend whose requests are answered by handler instead of the network.
+
+    :param handler: callable taking an httpx.Request and returning an httpx.Response
+    :return: the AIBackend instance
+    """
+    backend = AIBackend("http://ai.test")
+    backend._AIBackend__client = httpx.AsyncClient(base_url="http://ai.test", transport=httpx.MockTransport(handler))
+    return backend
+
+
+def ok_handler(request):
+    """
+    Answer every AI backend request with an empty data object.
+    """
+    if request.method == "HEAD":
+        return httpx.Response(200)
+    return httpx.Response(200, json={"data" : {}})
+
+
+def make_app(db, handler=ok_handler):
+    """
+    Build the FastAPI application over the given database and a mocked AI backend.
+    """
+    return App(db=db, ai_backend=make_ai_backend(handler)).get_app()
+
+
+def session(uid, is_admin=False):
+    """
+    Return the cookies of a signed-in user.
+    """
+    return {"jwt" : AuthUtility.create_access_token({"uid" : uid, "is_admin" : is_admin})}
+
+
+def run_with_client(app, scenario):
+    """
+    Start the application, run a scenario against it, and shut it down.
+
+    :param app: the FastAPI application
+    :param scenario: coroutine function receiving an httpx.AsyncClient
+    :return: whatever the scenario returns
+    """
+    async def main():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://test") as client:
+                return await scenario(client)
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def db():
+    """
+    Return a StandInDatabase seeded with two users (uid 1 and 2) and an admin (uid 3).
+    """
+    database = StandInDatabase()
+    database.seed_users(["a@example.com", "b@example.com"], "hash", ["admin@example.com"])
+    return database
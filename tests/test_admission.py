@@ -0,0 +1,66 @@
+import asyncio
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from middleware.admission import AdmissionController, AdmissionMiddleware, ConcurrencyLimiter
+
+
+def test_limiter_admits_in_order_and_sheds_past_the_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, queue_timeout=1.0)
+        assert await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not await limiter.acquire()
+        limiter.release()
+        assert await waiting
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert {"admitted" : 2, "shed" : 1, "in_flight" : 0, "peak_in_flight" : 1}.items() <= stats.items()
+
+
+def test_limiter_sheds_after_the_queue_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=4, queue_timeout=0.02)
+        await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.stats()["queued"] == 0
+        assert limiter.retry_after == 1
+    asyncio.run(scenario())
+
+
+def test_paths_map_to_route_classes():
+    controller = AdmissionController()
+    assert controller.limiter_for("/api/v1/service/ai/text") is controller.limiter_for("/api/v1/service/ai/schema")
+    assert controller.limiter_for("/api/v1/user/email") is controller.limiter_for("/api/v1/auth/login")
+    assert controller.limiter_for("/api/v1/admin/stream") is None
+    assert controller.limiter_for("/api/v1/health/ready") is None
+
+
+def test_middleware_rejects_overflow_with_retry_after(monkeypatch):
+    monkeypatch.setenv("ADMISSION_ADMIN_LIMIT", "1")
+    monkeypatch.setenv("ADMISSION_ADMIN_QUEUE", "0")
+    release = asyncio.Event()
+
+    async def slow(request):
+        await release.wait()
+        return PlainTextResponse("done")
+
+    app = AdmissionMiddleware(Starlette(routes=[Route("/api/v1/admin/users", slow)]), AdmissionController())
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first = asyncio.create_task(client.get("/api/v1/admin/users"))
+            await asyncio.sleep(0.01)
+            shed = await client.get("/api/v1/admin/users")
+            release.set()
+            return await first, shed
+
+    first, shed = asyncio.run(scenario())
+    assert first.text == "done"
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+    assert shed.json() == {"detail" : {"message" : "server is overloaded, retry later"}}
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from schemas.ai_schema import MAX_BODY_BYTES
+from services.request_body import read_limited_body
+from conftest import make_app, run_with_client, session
+
+TEXT_ENDPOINT = "/api/v1/service/ai/text"
+SCHEMA_ENDPOINT = "/api/v1/service/ai/schema"
+
+
+def request_with_body(chunks, headers=()):
+    messages = [{"type" : "http.request", "body" : chunk, "more_body" : True} for chunk in chunks]
+    messages.append({"type" : "http.request", "body" : b"", "more_body" : False})
+
+    async def receive():
+        return messages.pop(0)
+    scope = {"type" : "http", "method" : "POST", "path" : "/", "headers" : list(headers)}
+    return Request(scope, receive)
+
+
+def test_read_limited_body_stops_at_the_limit():
+    async def scenario():
+        assert await read_limited_body(request_with_body([b"ab", b"cd"]), 4) == b"abcd"
+        with pytest.raises(HTTPException) as error:
+            await read_limited_body(request_with_body([b"ab", b"cd", b"e"]), 4)
+        assert error.value.status_code == 413
+        declared = request_with_body([], headers=[(b"content-length", b"5")])
+        with pytest.raises(HTTPException):
+            await read_limited_body(declared, 4)
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def calls(db):
+    """
+    Record endpoint updates, so tests can check that rejected bodies do no database work.
+    """
+    updates = []
+    original = db.update_endpoint
+    db.update_endpoint = lambda info: updates.append(info) or original(info)
+    return updates
+
+
+def post(app, path, body, uid=1):
+    async def scenario(client):
+        return await client.post(path, content=json.dumps(body), cookies=session(uid))
+    return run_with_client(app, scenario)
+
+
+def test_invalid_fields_are_flagged_before_any_database_work(db, calls):
+    response = post(make_app(db), TEXT_ENDPOINT, {"text" : "hello", "lang" : "x"})
+    assert response.status_code == 422
+    assert response.json()["detail"] == {"text" : True, "lang" : False}
+    assert calls == []
+
+
+def test_long_text_needs_chunked_mode(db, calls):
+    response = post(make_app(db), TEXT_ENDPOINT, {"text" : "a" * 20001, "lang" : "en"})
+    assert response.status_code == 422
+    assert response.json()["detail"]["text"] is False
+    assert calls == []
+
+
+def test_deep_schema_is_rejected(db, calls):
+    schema = {}
+    for _ in range(12):
+        schema = {"type" : "object", "properties" : {"x" : schema}}
+    response = post(make_app(db), SCHEMA_ENDPOINT, {"text" : "hello", "lang" : "en", "schema" : schema})
+    assert response.status_code == 422
+    assert response.json()["detail"] == {"text" : True, "lang" : True, "schema" : False}
+    assert calls == []
+
+
+def test_oversized_body_is_rejected(db, calls):
+    response = post(make_app(db), TEXT_ENDPOINT, {"text" : "a" * MAX_BODY_BYTES, "lang" : "en"})
+    assert response.status_code == 413
+    assert calls == []
+
+
+def test_valid_request_is_parsed_and_metered(db, calls):
+    response = post(make_app(db), TEXT_ENDPOINT, {"text" : "hello", "lang" : "en"})
+    assert response.status_code == 200
+    assert response.json() == {"data" : {}, "api_usage" : 1}
+    assert calls == [{"method" : "POST", "endpoint" : TEXT_ENDPOINT}]
+
+
+def test_unauthenticated_request_is_rejected(db):
+    async def scenario(client):
+        return await client.post(TEXT_ENDPOINT, content=b"{}")
+    assert run_with_client(make_app(db), scenario).status_code == 401
@@ -0,0 +1,99 @@
+import json
+import random
+import httpx
+import pytest
+from schemas.ai_schema import MAX_BODY_BYTES, MAX_CHUNKED_TEXT_LENGTH
+from services.chunking import split_text, merge_results
+from conftest import make_app, run_with_client, session
+
+
+def paragraphs(seed, total, words_per_paragraph):
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < total:
+        paragraph = " ".join("w" * rng.randint(3, 9) + "." for _ in range(words_per_paragraph))
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("One. Two.", chunk_size=100) == ["One. Two."]
+
+
+def test_chunks_end_at_sentences_and_overlap():
+    text = " ".join(f"Sentence number {index}." for index in range(200))
+    chunks = split_text(text, chunk_size=500, overlap=60, max_chunks=64)
+    assert all(len(chunk) <= 500 and chunk.endswith(".") for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split(". ")[0] + "." in previous
+    assert all(f"Sentence number {index}." in "".join(chunks) for index in range(200))
+
+
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("max_chunks", [1, 2, 3, 5, 64])
+def test_chunk_count_never_exceeds_the_bound(seed, max_chunks):
+    # Paragraph breaks in the last third and a large overlap both add chunks
+    text = paragraphs(seed, 198000 if seed % 3 == 0 else 20000, random.Random(seed).randint(10, 350))
+    chunks = split_text(text, chunk_size=500 + 500 * (seed % 3), overlap=400, max_chunks=max_chunks)
+    assert 1 <= len(chunks) <= max_chunks
+    words = text.split()
+    assert words[0] in chunks[0] and words[-1] in chunks[-1]
+
+
+def test_very_long_sentence_is_cut_at_whitespace():
+    text = " ".join(["word"] * 1000)
+    chunks = split_text(text, chunk_size=300, overlap=0, max_chunks=64)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert sum(len(chunk.split()) for chunk in chunks) == 1000
+
+
+def test_merge_combines_objects_and_dedupes_lists():
+    merged, conflicts = merge_results([
+        {"people" : [{"name" : "A"}], "title" : "", "meta" : {"pages" : 1}},
+        {"people" : [{"name" : "A"}, {"name" : "B"}], "title" : "Report", "meta" : {"lang" : "en"}},
+    ])
+    assert merged == {"people" : [{"name" : "A"}, {"name" : "B"}], "title" : "Report", "meta" : {"pages" : 1, "lang" : "en"}}
+    assert conflicts == []
+
+
+def test_merge_reports_values_it_leaves_out():
+    parts = [{"date" : "2026-01-01", "a/b" : {"x" : 1}}, {"date" : "2026-02-01", "a/b" : "flat"}, {"date" : "2026-01-01"}]
+    merged, conflicts = merge_results(parts)
+    assert merged == {"date" : "2026-01-01", "a/b" : {"x" : 1}}
+    assert conflicts == [
+        {"path" : "/date", "chunk" : 1, "kept" : "2026-01-01", "dropped" : "2026-02-01"},
+        {"path" : "/a~1b", "chunk" : 1, "kept" : {"x" : 1}, "dropped" : "flat"},
+    ]
+    assert parts[0] == {"date" : "2026-01-01", "a/b" : {"x" : 1}}
+
+
+def test_body_limit_fits_the_longest_text_in_any_script():
+    text = "字" * MAX_CHUNKED_TEXT_LENGTH
+    body = json.dumps({"chunked" : True, "text" : text, "lang" : "zh"}, ensure_ascii=False).encode("utf-8")
+    assert len(body) <= MAX_BODY_BYTES
+
+
+def test_chunked_request_is_metered_per_chunk_and_reports_conflicts(db):
+    def handler(request):
+        if request.method == "HEAD":
+            return httpx.Response(200)
+        text = json.loads(request.content)["text"]
+        return httpx.Response(200, json={"data" : {"start" : text.split()[1], "items" : [len(text)]}})
+
+    text = " ".join(f"Sentence {index}." for index in range(3000))
+
+    async def scenario(client):
+        body = json.dumps({"chunked" : True, "text" : text, "lang" : "en"})
+        return await client.post("/api/v1/service/ai/text", content=body, cookies=session(1))
+
+    response = run_with_client(make_app(db, handler), scenario)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["chunks"] > 1
+    assert result["api_usage"] == result["chunks"]
+    assert result["data"]["start"] == "0."
+    assert len(result["data"]["items"]) == len(set(result["data"]["items"]))
+    assert [conflict["chunk"] for conflict in result["conflicts"]] == list(range(1, result["chunks"]))
+    assert all(conflict["path"] == "/start" for conflict in result["conflicts"])
@@ -0,0 +1,73 @@
+import asyncio
+import gzip
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from middleware.compression import CompressionMiddleware, compress
+
+
+def build_app():
+    async def large(request):
+        return JSONResponse({"items" : ["value"] * 500}, headers={"Vary" : "Cookie"})
+
+    async def small(request):
+        return JSONResponse({"ok" : True})
+
+    async def image(request):
+        return Response(b"x" * 4096, media_type="image/png")
+
+    async def stream(request):
+        async def chunks():
+            yield b"a" * 2048
+            yield b"b" * 2048
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app = Starlette(routes=[Route("/large", large), Route("/small", small), Route("/image", image), Route("/stream", stream)])
+    return CompressionMiddleware(app, minimum_size=1024)
+
+
+def get(path, accept_encoding):
+    async def scenario():
+        transport = httpx.ASGITransport(app=build_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"Accept-Encoding" : accept_encoding})
+    return asyncio.run(scenario())
+
+
+def test_large_json_is_compressed_and_keeps_other_vary_values():
+    response = get("/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Cookie, Accept-Encoding"
+    assert response.json()["items"][0] == "value"
+
+
+def test_uncompressed_responses_still_vary_on_accept_encoding():
+    small = get("/small", "gzip")
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    identity = get("/large", "identity")
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Cookie, Accept-Encoding"
+
+
+def test_q_values_pick_the_encoding():
+    response = get("/large", "br;q=0, gzip;q=0.5, deflate")
+    assert response.headers["content-encoding"] == "gzip"
+    assert get("/large", "gzip;q=0").headers.get("content-encoding") is None
+
+
+def test_other_content_types_and_streams_pass_through():
+    image = get("/image", "gzip")
+    assert "content-encoding" not in image.headers
+    assert "vary" not in image.headers
+
+    stream = get("/stream", "gzip")
+    assert "content-encoding" not in stream.headers
+    assert stream.text == "a" * 2048 + "b" * 2048
+
+
+def test_gzip_body_round_trips():
+    body = b'{"k":"' + b"v" * 5000 + b'"}'
+    assert gzip.decompress(compress(body, "gzip")) == body
@@ -0,0 +1,98 @@
+from conftest import make_app, run_with_client, session
+from routers.auth import AuthUtility
+from services.shared_state import SharedCounters
+
+
+def endpoint_count(db, endpoint):
+    rows = db.get_all_endpoints()
+    return sum(row["request_count"] for row in rows if row["endpoint"] == endpoint)
+
+
+def test_session_etag_names_the_user(db):
+    async def scenario(client):
+        first = await client.get("/api/v1/auth/authenticate", cookies=session(1))
+        second = await client.get("/api/v1/auth/authenticate", cookies=session(2))
+        cached = await client.get("/api/v1/auth/authenticate", cookies=session(1),
+                                  headers={"If-None-Match" : first.headers["etag"]})
+        other = await client.get("/api/v1/auth/authenticate", cookies=session(2),
+                                 headers={"If-None-Match" : first.headers["etag"]})
+        return first, second, cached, other
+
+    first, second, cached, other = run_with_client(make_app(db), scenario)
+    assert first.headers["etag"] != second.headers["etag"]
+    assert cached.status_code == 304 and cached.content == b""
+    assert other.status_code == 200 and other.json()["email"] == "b@example.com"
+
+
+def test_session_etag_changes_with_usage(db):
+    async def scenario(client):
+        first = await client.get("/api/v1/auth/authenticate", cookies=session(1))
+        db.increment_api_usage(1)
+        return await client.get("/api/v1/auth/authenticate", cookies=session(1),
+                                headers={"If-None-Match" : first.headers["etag"]})
+
+    assert run_with_client(make_app(db), scenario).status_code == 200
+
+
+def test_admin_listing_authenticates_once(db, monkeypatch):
+    calls = []
+    authenticate = AuthUtility.authenticate
+
+    def counted(request):
+        calls.append(request)
+        return authenticate(request)
+
+    monkeypatch.setattr(AuthUtility, "authenticate", counted)
+
+    async def scenario(client):
+        response = await client.get("/api/v1/admin/users", cookies=session(3, True),
+                                    headers={"If-None-Match" : 'W/"stale"'})
+        return response
+
+    response = run_with_client(make_app(db), scenario)
+    assert response.status_code == 200 and "etag" in response.headers
+    assert len(calls) == 1
+
+
+def test_not_modified_listings_are_counted(db):
+    async def scenario(client):
+        cookies = session(3, True)
+        cached = []
+        # Counting a request changes the endpoint listing, so each listing is revalidated in a row
+        for path in ("/api/v1/admin/users", "/api/v1/admin/endpoints"):
+            listing = await client.get(path, cookies=cookies)
+            for _ in range(2):
+                cached.append(await client.get(path, cookies=cookies,
+                                               headers={"If-None-Match" : listing.headers["etag"]}))
+        db.flush_counters()
+        return cached
+
+    cached = run_with_client(make_app(db), scenario)
+    assert [response.status_code for response in cached] == [304] * 4
+    assert endpoint_count(db, "/api/v1/admin/users") == 3
+    assert endpoint_count(db, "/api/v1/admin/endpoints") == 3
+
+
+def test_other_requests_change_the_endpoint_listing(db):
+    async def scenario(client):
+        cookies = session(3, True)
+        endpoints = await client.get("/api/v1/admin/endpoints", cookies=cookies)
+        await client.get("/api/v1/auth/authenticate", cookies=session(1))
+        return await client.get("/api/v1/admin/endpoints", cookies=cookies,
+                                headers={"If-None-Match" : endpoints.headers["etag"]})
+
+    assert run_with_client(make_app(db), scenario).status_code == 200
+
+
+def test_non_admin_gets_no_not_modified(db):
+    async def scenario(client):
+        users = await client.get("/api/v1/admin/users", cookies=session(3, True))
+        return await client.get("/api/v1/admin/users", cookies=session(1),
+                                headers={"If-None-Match" : users.headers["etag"]})
+
+    assert run_with_client(make_app(db), scenario).status_code == 403
+
+
+def test_private_segments_have_distinct_epochs():
+    epochs = {SharedCounters(slots=64, stripes=4).epoch for _ in range(20)}
+    assert len(epochs) == 20
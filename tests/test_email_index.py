@@ -0,0 +1,90 @@
+import pytest
+from routers import auth
+from services.email_index import EmailIndex
+from conftest import make_app, run_with_client
+
+
+@pytest.fixture
+def indexed_db(db):
+    index = EmailIndex(capacity=64)
+    db.attach_email_index(index)
+    db.load_email_index()
+    return db
+
+
+def test_emails_sharing_a_fingerprint_are_both_stored():
+    index = EmailIndex(capacity=4)
+    index.load([])
+    index.add("user296@x.com")
+    index.add("user355@x.com")
+    assert index.stats()["items"] == 2
+    index.discard("user296@x.com")
+    assert index.might_contain("user355@x.com")
+    index.discard("user355@x.com")
+    assert not index.might_contain("user355@x.com")
+
+
+def test_negative_answers_are_exact():
+    emails = [f"user{number}@example.com" for number in range(2000)]
+    index = EmailIndex(capacity=1000)
+    index.load(emails[:1000])
+    assert all(index.might_contain(email.upper()) for email in emails[:1000])
+    for email in emails[1000:]:
+        index.add(email)
+    for email in emails[::2]:
+        index.discard(email)
+    assert all(index.might_contain(email) for email in emails[1::2])
+    assert not index.stats()["saturated"]
+
+
+def test_unloaded_index_answers_maybe():
+    index = EmailIndex(capacity=4)
+    index.add("a@example.com")
+    assert index.might_contain("new@example.com")
+    assert index.stats()["items"] == 0
+
+
+def test_changed_and_deleted_emails_stop_matching(indexed_db):
+    assert indexed_db.change_email(1, "c@example.com")
+    assert not indexed_db.email_taken("a@example.com")
+    assert indexed_db.email_taken("c@example.com")
+    indexed_db.delete_user(2)
+    assert not indexed_db.email_taken("b@example.com")
+
+
+def test_duplicate_from_another_worker_is_indexed(indexed_db):
+    # A row written behind this worker's index, as another worker's signup would be
+    for email in ("d@example.com", "e@example.com"):
+        indexed_db._execute("INSERT INTO user (email, password, is_admin) VALUES (%s, %s, %s)", (email, "hash", 0))
+    index = indexed_db._Database__email_index
+    assert not index.might_contain("d@example.com")
+    assert not indexed_db.insert_user({"email" : "d@example.com", "password" : "hash", "is_admin" : 0})
+    assert not indexed_db.change_email(1, "e@example.com")
+    assert index.might_contain("d@example.com") and index.might_contain("e@example.com")
+    assert index.stats()["items"] == 5
+
+
+def test_other_integrity_errors_leave_the_index_alone(indexed_db):
+    assert not indexed_db.insert_user({"email" : "e@example.com", "password" : "hash", "is_admin" : None})
+    assert not indexed_db._Database__email_index.might_contain("e@example.com")
+
+
+def test_known_email_signup_skips_bcrypt(db, monkeypatch):
+    hashed = []
+    hashpw = auth.bcrypt.hashpw
+
+    def counted(password, salt):
+        hashed.append(password)
+        return hashpw(password, salt)
+
+    monkeypatch.setattr(auth.bcrypt, "hashpw", counted)
+
+    async def scenario(client):
+        taken = await client.post("/api/v1/auth/signup", json={"email" : "a@example.com", "password" : "secret", "is_admin" : False})
+        new = await client.post("/api/v1/auth/signup", json={"email" : "new@example.com", "password" : "secret", "is_admin" : False})
+        return taken, new
+
+    taken, new = run_with_client(make_app(db), scenario)
+    assert taken.status_code == 409
+    assert new.status_code == 201
+    assert len(hashed) == 1
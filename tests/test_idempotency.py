@@ -0,0 +1,93 @@
+import asyncio
+import json
+import httpx
+import pytest
+from services.idempotency import IdempotencyStore, IdempotencyConflict
+from conftest import make_app, run_with_client, session
+
+
+def test_saved_result_is_replayed_and_other_bodies_conflict():
+    async def scenario():
+        store = IdempotencyStore()
+        async with store.claim(1, "key", "body") as claim:
+            assert not claim.replayed
+            claim.save({"n" : 1})
+        async with store.claim(1, "key", "body") as claim:
+            assert claim.replayed and claim.result == {"n" : 1}
+        async with store.claim(2, "key", "body") as claim:
+            assert not claim.replayed
+        with pytest.raises(IdempotencyConflict):
+            async with store.claim(1, "key", "other body"):
+                pass
+    asyncio.run(scenario())
+
+
+def test_failed_request_releases_its_key():
+    async def scenario():
+        store = IdempotencyStore()
+        with pytest.raises(RuntimeError):
+            async with store.claim(1, "key", "body"):
+                raise RuntimeError("upstream failed")
+        async with store.claim(1, "key", "body") as claim:
+            assert not claim.replayed
+    asyncio.run(scenario())
+
+
+def test_duplicate_waits_for_the_request_in_flight():
+    async def scenario():
+        store = IdempotencyStore()
+        order = []
+
+        async def first():
+            async with store.claim(1, "key", "body") as claim:
+                await asyncio.sleep(0.05)
+                order.append("first saved")
+                claim.save("result")
+
+        async def duplicate():
+            await asyncio.sleep(0.01)
+            async with store.claim(1, "key", "body") as claim:
+                order.append(("duplicate", claim.replayed, claim.result))
+
+        await asyncio.gather(first(), duplicate())
+        assert order == ["first saved", ("duplicate", True, "result")]
+    asyncio.run(scenario())
+
+
+def test_results_expire_and_oldest_are_evicted():
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=0.02, max_entries=1)
+        async with store.claim(1, "a", "body") as claim:
+            claim.save(1)
+        async with store.claim(1, "b", "body") as claim:
+            claim.save(2)
+        async with store.claim(1, "a", "body") as claim:
+            assert not claim.replayed
+            claim.save(1)
+        await asyncio.sleep(0.03)
+        async with store.claim(1, "a", "body") as claim:
+            assert not claim.replayed
+    asyncio.run(scenario())
+
+
+def test_replayed_request_is_not_metered_again(db):
+    posts = []
+
+    def handler(request):
+        if request.method == "POST":
+            posts.append(request)
+        return httpx.Response(200, json={"data" : {"n" : len(posts)}})
+
+    async def scenario(client):
+        body = json.dumps({"text" : "hello", "lang" : "en"})
+        headers = {"Idempotency-Key" : "abc"}
+        first = await client.post("/api/v1/service/ai/text", content=body, headers=headers, cookies=session(1))
+        second = await client.post("/api/v1/service/ai/text", content=body, headers=headers, cookies=session(1))
+        changed = await client.post("/api/v1/service/ai/text", content=body.replace("hello", "bye"), headers=headers, cookies=session(1))
+        return first, second, changed
+
+    first, second, changed = run_with_client(make_app(db, handler), scenario)
+    assert first.json() == second.json() == {"data" : {"n" : 1}, "api_usage" : 1}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert changed.status_code == 422
+    assert len(posts) == 1
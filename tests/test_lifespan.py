@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import httpx
+from fastapi import APIRouter
+from main import App
+from middleware.in_flight import InFlightRequests
+from services.shared_state import SharedCounters
+from conftest import make_ai_backend, ok_handler
+
+
+def test_wait_idle_returns_once_requests_finish():
+    async def scenario():
+        tracker = InFlightRequests()
+        assert await tracker.wait_idle(0.01)
+        tracker.started()
+        assert not await tracker.wait_idle(0.01)
+        asyncio.get_running_loop().call_later(0.02, tracker.finished)
+        assert await tracker.wait_idle(1)
+        assert tracker.active == 0
+    asyncio.run(scenario())
+
+
+def test_shutdown_waits_for_running_requests(db):
+    events = []
+    original_close = db.close
+
+    def close():
+        events.append("db closed")
+        original_close()
+    db.close = close
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        events.append("request finished")
+        return {"ok" : True}
+
+    router = APIRouter()
+    router.add_api_route("/slow", slow, methods=["GET"])
+    application = App(db=db, ai_backend=make_ai_backend(ok_handler))
+    application.add_routers([router])
+    app = application.get_app()
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            request = asyncio.create_task(client.get("/slow"))
+            await asyncio.sleep(0.05)
+            await lifespan.__aexit__(None, None, None)
+            response = await request
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert events == ["request finished", "db closed"]
+
+
+def test_prime_usage_cache_answers_usage_without_a_query(db):
+    db._execute("UPDATE api_usage SET usage_count = 7 WHERE uid = 2")
+    db.attach_counters(SharedCounters())
+    assert db.prime_usage_cache(limit=10) == 3
+
+    queries = []
+    original = db._fetchone
+    db._fetchone = lambda query, params=None: queries.append(query) or original(query, params)
+    assert db.get_api_usage(2) == 7
+    assert queries == []
+
+
+def test_counter_flush_runs_off_the_event_loop(db, monkeypatch):
+    monkeypatch.setenv("COUNTER_FLUSH_SECONDS", "0.01")
+    flush_threads = []
+
+    def flush_counters():
+        flush_threads.append(threading.get_ident())
+        time.sleep(0.1)
+    db.flush_counters = flush_counters
+    app = App(db=db, ai_backend=make_ai_backend(ok_handler)).get_app()
+
+    async def scenario():
+        ticks = 0
+        async with app.router.lifespan_context(app):
+            started = time.perf_counter()
+            while time.perf_counter() - started < 0.2:
+                await asyncio.sleep(0.005)
+                ticks += 1
+        return ticks
+
+    ticks = asyncio.run(scenario())
+    assert flush_threads
+    assert threading.get_ident() not in flush_threads
+    assert ticks > 10
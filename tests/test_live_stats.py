@@ -0,0 +1,48 @@
+import asyncio
+from services.live_stats import LiveStats
+from services.shared_state import SharedCounters
+
+
+def test_every_subscriber_gets_the_same_deltas():
+    async def scenario():
+        counters = SharedCounters(slots=64, stripes=4)
+        counters.increment("e|GET|/a", 5)
+        stats = LiveStats(counters, interval=0.01)
+        async with stats.subscribe() as first, stats.subscribe() as second:
+            counters.increment("e|GET|/a", 2)
+            counters.increment("u|3")
+            counters.increment("v|user")
+            event = await asyncio.wait_for(first.get(), 1)
+            assert await asyncio.wait_for(second.get(), 1) is event
+        return event
+
+    event = asyncio.run(scenario())
+    assert event["endpoints"] == [{"http_method" : "GET", "endpoint" : "/a", "delta" : 2}]
+    assert event["usage"] == [{"uid" : 3, "delta" : 1}]
+
+
+def test_restarted_counter_counts_its_whole_total():
+    async def scenario():
+        counters = SharedCounters(slots=64, stripes=4)
+        counters.increment("u|1", 10)
+        stats = LiveStats(counters, interval=0.01)
+        async with stats.subscribe() as events:
+            counters.discard("u|1")
+            counters.increment("u|1", 3)
+            return await asyncio.wait_for(events.get(), 1)
+
+    assert asyncio.run(scenario())["usage"] == [{"uid" : 1, "delta" : 3}]
+
+
+def test_close_ends_every_stream_and_idle_broadcaster_stops():
+    async def scenario():
+        counters = SharedCounters(slots=64, stripes=4)
+        stats = LiveStats(counters, interval=0.01)
+        async with stats.subscribe() as events:
+            counters.increment("e|GET|/a")
+            await asyncio.sleep(0.05)
+            await stats.close()
+            assert await asyncio.wait_for(events.get(), 1) is None
+        assert stats._LiveStats__task is None
+
+    asyncio.run(scenario())
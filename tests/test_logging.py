@@ -0,0 +1,64 @@
+import asyncio
+import json
+import logging
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from middleware.request_id import RequestIdMiddleware
+from services.logger import JsonFormatter, ContextFilter, configure_logging, shutdown_logging, get_logger, request_id_var
+
+
+def make_record(level=logging.INFO, **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, "hello %s", ("world",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_formatter_renders_one_json_object_with_extra_fields():
+    line = JsonFormatter().format(make_record(request_id="abc", uid=7))
+    entry = json.loads(line)
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "info"
+    assert entry["logger"] == "app.test"
+    assert entry["request_id"] == "abc"
+    assert entry["uid"] == 7
+    assert "\n" not in line
+
+
+def test_filter_stamps_the_request_id_and_samples_noisy_levels():
+    token = request_id_var.set("req-1")
+    try:
+        record = make_record()
+        assert ContextFilter({}).filter(record)
+        assert record.request_id == "req-1"
+    finally:
+        request_id_var.reset(token)
+    sampled = ContextFilter({logging.INFO : 0.0})
+    assert not sampled.filter(make_record())
+    assert sampled.filter(make_record(logging.WARNING))
+
+
+def test_queued_records_are_written_by_shutdown(capsys):
+    configure_logging()
+    get_logger("test").warning("queued", extra={"n" : 1})
+    shutdown_logging()
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {"msg" : "queued", "n" : 1}.items() <= lines[-1].items()
+
+
+def test_request_id_is_echoed_or_generated():
+    async def endpoint(request):
+        return PlainTextResponse(request_id_var.get())
+    app = RequestIdMiddleware(Starlette(routes=[Route("/", endpoint)]))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            given = await client.get("/", headers={"X-Request-ID" : "client-id"})
+            generated = await client.get("/")
+        return given, generated
+
+    given, generated = asyncio.run(scenario())
+    assert given.headers["x-request-id"] == given.text == "client-id"
+    assert len(generated.headers["x-request-id"]) == 32
+    assert generated.text == generated.headers["x-request-id"]
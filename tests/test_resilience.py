@@ -0,0 +1,102 @@
+import asyncio
+import httpx
+import pytest
+from services.ai_backend import AIBackendError
+from services.resilience import CircuitBreaker, RetryBudget, LatencyTracker
+from conftest import make_ai_backend
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.would_allow() and not breaker.allow()
+    assert breaker.retry_after() == 1
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.would_allow()
+    assert breaker.would_allow()
+    assert breaker.allow()
+    assert not breaker.would_allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_and_released_probe_is_available_again():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_retry_budget_refills_by_ratio():
+    budget = RetryBudget(ratio=0.5, max_tokens=1.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+
+
+def test_latency_tracker_needs_enough_samples():
+    tracker = LatencyTracker(window=10, min_samples=5)
+    for value in range(4):
+        tracker.record(value)
+    assert tracker.percentile(0.95) is None
+    for value in range(4, 20):
+        tracker.record(value)
+    assert tracker.percentile(0.5) == 15
+
+
+@pytest.fixture
+def breaker_env(monkeypatch):
+    monkeypatch.setenv("AI_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("AI_BREAKER_RESET_SECONDS", "0.05")
+    monkeypatch.setenv("AI_MAX_RETRIES", "0")
+
+
+def test_cancelled_probe_does_not_keep_the_breaker_half_open(breaker_env):
+    async def scenario():
+        behaviour = {"mode" : "fail"}
+        hanging = asyncio.Event()
+
+        async def handler(request):
+            if behaviour["mode"] == "fail":
+                return httpx.Response(503)
+            if behaviour["mode"] == "hang":
+                hanging.set()
+                await asyncio.sleep(10)
+            return httpx.Response(200, json={"data" : {}})
+
+        backend = make_ai_backend(handler)
+        with pytest.raises(AIBackendError):
+            await backend.post("/parse", {})
+        with pytest.raises(AIBackendError):
+            backend.ensure_available()
+        await asyncio.sleep(0.06)
+
+        behaviour["mode"] = "hang"
+        probe = asyncio.create_task(backend.post("/parse", {}))
+        await hanging.wait()
+        # The probe is in flight, so other calls fail fast before recording usage
+        with pytest.raises(AIBackendError):
+            backend.ensure_available()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        behaviour["mode"] = "ok"
+        backend.ensure_available()
+        response = await backend.post("/parse", {})
+        assert response.status_code == 200
+        await backend.close()
+
+    asyncio.run(scenario())
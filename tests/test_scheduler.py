@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from services.scheduler import FairScheduler, SchedulerRejected
+
+
+def make_scheduler(**settings):
+    defaults = {"max_concurrency" : 1, "max_per_user" : 4, "max_queued_per_user" : 16,
+                "queue_timeout" : 1.0, "weights" : {"admin" : 2.0, "user" : 1.0}}
+    return FairScheduler(**{**defaults, **settings})
+
+
+def finish_tag(scheduler, user):
+    return scheduler._FairScheduler__users[user]["finish_tag"]
+
+
+def test_weights_are_parsed_and_validated():
+    assert FairScheduler.parse_weights("admin=2, user=1,") == {"admin" : 2.0, "user" : 1.0}
+    with pytest.raises(ValueError):
+        FairScheduler.parse_weights("user=0")
+
+
+def test_waiting_calls_are_admitted_in_proportion_to_weight():
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.acquire("holder")
+        admitted = []
+
+        async def call(user, tier):
+            await scheduler.acquire(user, tier)
+            admitted.append(user)
+            await asyncio.sleep(0)
+            scheduler.release(user)
+
+        calls = [asyncio.create_task(call("admin", "admin")) for _ in range(4)]
+        calls += [asyncio.create_task(call("user", "user")) for _ in range(4)]
+        await asyncio.sleep(0)
+        scheduler.release("holder")
+        await asyncio.gather(*calls)
+        return admitted
+
+    admitted = asyncio.run(scenario())
+    assert admitted[:6].count("admin") == 4
+
+
+def test_per_user_cap_lets_other_users_through():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=4, max_per_user=1)
+        await scheduler.acquire(1)
+        blocked = asyncio.create_task(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(scheduler.acquire(2), 0.1)
+        assert not blocked.done()
+        scheduler.release(1)
+        await asyncio.wait_for(blocked, 0.1)
+        assert scheduler.stats()["in_flight"] == 2
+    asyncio.run(scenario())
+
+
+def test_shed_calls_do_not_advance_the_finish_tag():
+    async def scenario():
+        scheduler = make_scheduler(max_queued_per_user=1)
+        await scheduler.acquire(1)
+        waiting = asyncio.create_task(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        before = finish_tag(scheduler, 1)
+        for _ in range(5):
+            with pytest.raises(SchedulerRejected):
+                await scheduler.acquire(1)
+        assert finish_tag(scheduler, 1) == before
+        assert scheduler.stats()["users"][0]["shed"] == 5
+        scheduler.release(1)
+        await waiting
+        scheduler.release(1)
+    asyncio.run(scenario())
+
+
+def test_timed_out_call_is_shed_and_refunded():
+    async def scenario():
+        scheduler = make_scheduler(queue_timeout=0.02)
+        await scheduler.acquire(1)
+        before = 0.0
+        with pytest.raises(SchedulerRejected) as error:
+            await scheduler.acquire(2)
+        assert error.value.retry_after == 1
+        assert finish_tag(scheduler, 2) == before
+        stats = scheduler.stats()
+        assert stats["queued"] == 0 and stats["in_flight"] == 1
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.acquire(1)
+        waiter = asyncio.create_task(scheduler.acquire(2))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(1)
+        assert scheduler.stats()["in_flight"] == 0
+        await asyncio.wait_for(scheduler.acquire(3), 0.1)
+    asyncio.run(scenario())
@@ -0,0 +1,118 @@
+import json
+import httpx
+import pytest
+from jsonschema import Draft202012Validator
+from services.schema_cache import SchemaValidatorCache, InvalidSchemaError
+from conftest import make_app, run_with_client, session
+
+SCHEMA_ENDPOINT = "/api/v1/service/ai/schema"
+
+
+def test_equivalent_schemas_share_a_validator():
+    cache = SchemaValidatorCache()
+    first = cache.get_validator({"type" : "object", "required" : ["a"]})
+    second = cache.get_validator({"required" : ["a"], "type" : "object"})
+    assert first is second
+    assert cache.stats() == {"entries" : 1, "hits" : 1, "misses" : 1}
+    assert not first.is_valid({})
+
+
+def test_invalid_schemas_are_cached_as_errors():
+    cache = SchemaValidatorCache()
+    for _ in range(2):
+        with pytest.raises(InvalidSchemaError):
+            cache.get_validator({"type" : 12})
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("schema", [
+    {"$ref" : "#/definitions/nope"},
+    {"$ref" : "https://example.com/schema.json"},
+    {"type" : "object", "properties" : {"a" : {"items" : {"$ref" : "other.json"}}}}
+])
+def test_dangling_refs_are_invalid(schema):
+    cache = SchemaValidatorCache()
+    with pytest.raises(InvalidSchemaError) as error:
+        cache.get_validator(schema)
+    assert "$ref" in error.value.message
+
+
+def test_refs_within_the_schema_resolve():
+    cache = SchemaValidatorCache()
+    validator = cache.get_validator({
+        "type" : "object",
+        "properties" : {"a" : {"$ref" : "#/$defs/positive"}, "b" : {"$ref" : "item"}},
+        "$defs" : {"positive" : {"minimum" : 1}, "item" : {"$id" : "item", "type" : "string"}},
+        "const" : {"$ref" : "not a reference"}
+    })
+    assert validator.is_valid({"$ref" : "not a reference"})
+    assert not validator.is_valid({"a" : 0})
+
+
+def test_least_recently_used_schema_is_evicted():
+    cache = SchemaValidatorCache(max_entries=2)
+    for name in ("a", "b", "a", "c"):
+        cache.get_validator({"required" : [name]})
+    assert cache.stats()["entries"] == 2
+    cache.get_validator({"required" : ["a"]})
+    cache.get_validator({"required" : ["b"]})
+    assert cache.stats() == {"entries" : 2, "hits" : 2, "misses" : 4}
+
+
+def schema_request(db, handler, schema):
+    async def scenario(client):
+        body = {"text" : "hello", "lang" : "en", "schema" : schema}
+        return await client.post(SCHEMA_ENDPOINT, content=json.dumps(body), cookies=session(1))
+    return run_with_client(make_app(db, handler), scenario)
+
+
+def test_invalid_schema_is_rejected_without_an_upstream_call(db):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"data" : {}})
+    response = schema_request(db, handler, {"type" : 12})
+    assert response.status_code == 422
+    assert response.json()["detail"]["schema"] is False
+    assert [request.method for request in calls] == ["HEAD"]
+
+
+def test_output_not_matching_the_schema_is_asked_for_again_once(db):
+    answers = [{"data" : {}}, {"data" : {"name" : "x"}}]
+    posts = []
+
+    def handler(request):
+        if request.method == "HEAD":
+            return httpx.Response(200)
+        posts.append(request)
+        return httpx.Response(200, json=answers.pop(0))
+    schema = {"type" : "object", "required" : ["name"]}
+    response = schema_request(db, handler, schema)
+    assert response.status_code == 200
+    assert response.json()["data"] == {"name" : "x"}
+    assert len(posts) == 2
+
+    def always_wrong(request):
+        return httpx.Response(200, json={"data" : {}})
+    assert schema_request(db, always_wrong, schema).status_code == 502
+
+
+def test_dangling_ref_is_rejected_before_usage_is_recorded(db):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"data" : {}})
+    response = schema_request(db, handler, {"$ref" : "#/definitions/nope"})
+    assert response.status_code == 422
+    assert response.json()["detail"]["schema"] is False
+    assert [request.method for request in calls] == ["HEAD"]
+    assert db.get_api_usage(1) == 0
+
+
+def test_reference_failing_during_output_validation_is_a_schema_error(db, monkeypatch):
+    monkeypatch.setattr(SchemaValidatorCache, "get_validator", lambda self, schema: Draft202012Validator(schema))
+    response = schema_request(db, lambda request: httpx.Response(200, json={"data" : {}}), {"$ref" : "#/nope"})
+    assert response.status_code == 422
+    assert "could not be resolved" in response.json()["detail"]["message"]
@@ -0,0 +1,67 @@
+import json
+import pytest
+from schemas.admin_schema import EndpointStats, StatsSnapshot, UserUsage
+from schemas.ai_schema import ParseResponse
+from services import json_response
+from services.json_response import FastJSONResponse
+from conftest import make_app, run_with_client, session
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_fast_json_response_matches_json_dumps(monkeypatch, with_orjson):
+    if not with_orjson:
+        monkeypatch.setattr(json_response, "orjson", None)
+    content = {"users" : [{"uid" : 1, "email" : "a@example.com"}], "ratio" : 0.5, "empty" : None}
+    assert json.loads(FastJSONResponse(content=content).body) == content
+
+
+def test_fast_json_response_writes_integer_keys_as_strings():
+    body = FastJSONResponse(content={1 : "a", 2 : {3 : True}}).body
+    assert json.loads(body) == {"1" : "a", "2" : {"3" : True}}
+
+
+def test_user_usage_turns_is_admin_into_a_bool():
+    row = {"uid" : 3, "email" : "admin@example.com", "is_admin" : 1, "api_usage" : 4}
+    assert UserUsage(**row).model_dump() == {**row, "is_admin" : True}
+
+
+def test_stats_snapshot_serializes_nested_models():
+    snapshot = StatsSnapshot(
+        endpoints=[EndpointStats(http_method="GET", endpoint="/a", request_count=2)],
+        users=[UserUsage(uid=1, email="a@example.com", is_admin=0, api_usage=0)],
+        interval=1.0
+    )
+    assert json.loads(snapshot.model_dump_json()) == {
+        "endpoints" : [{"http_method" : "GET", "endpoint" : "/a", "request_count" : 2}],
+        "users" : [{"uid" : 1, "email" : "a@example.com", "is_admin" : False, "api_usage" : 0}],
+        "interval" : 1.0
+    }
+
+
+def test_parse_response_leaves_out_unset_fields():
+    assert ParseResponse(data={"a" : 1}, api_usage=2).model_dump(exclude_unset=True) == {"data" : {"a" : 1}, "api_usage" : 2}
+
+
+def test_admin_listings_send_only_model_fields(db):
+    async def scenario(client):
+        users = await client.get("/api/v1/admin/users", cookies=session(3, True))
+        endpoints = await client.get("/api/v1/admin/endpoints", cookies=session(3, True))
+        return users, endpoints
+
+    users, endpoints = run_with_client(make_app(db), scenario)
+    assert users.headers["content-type"] == "application/json"
+    assert {user["email"] : user["is_admin"] for user in users.json()} == {
+        "a@example.com" : False, "b@example.com" : False, "admin@example.com" : True
+    }
+    assert all(set(user) == set(UserUsage.model_fields) for user in users.json())
+    assert all(set(row) == set(EndpointStats.model_fields) for row in endpoints.json())
+
+
+def test_unchunked_parse_response_has_no_chunk_fields(db):
+    async def scenario(client):
+        return await client.post("/api/v1/service/ai/text", cookies=session(1),
+                                 json={"text" : "Some text.", "lang" : "en"})
+
+    response = run_with_client(make_app(db), scenario)
+    assert response.status_code == 200
+    assert set(response.json()) == {"data", "api_usage"}
@@ -0,0 +1,108 @@
+import multiprocessing
+import time
+import pytest
+from services.shared_state import SharedCounters
+
+
+@pytest.fixture
+def counters():
+    shared = SharedCounters(slots=64, stripes=4)
+    yield shared
+    shared.close()
+
+
+def test_increment_pending_and_mark_flushed(counters):
+    counters.increment("e|GET|/a")
+    counters.increment("e|GET|/a", 4)
+    counters.increment("u|1", 2)
+    assert counters.pending("e|") == {"e|GET|/a" : 5}
+    counters.mark_flushed({"e|GET|/a" : 5})
+    assert counters.pending() == {"u|1" : 2}
+    assert counters.totals("e|") == {"e|GET|/a" : 5}
+
+
+def test_cached_value_adds_unflushed_increments(counters):
+    counters.increment("u|1", 3)
+    counters.set_value("u|1", 10)
+    assert counters.get("u|1")["value"] == 13
+    counters.set_value("u|1", 10, source_includes_pending=True)
+    assert counters.get("u|1") == {"total" : 3, "pending" : 3, "value" : 10}
+
+
+def test_discard_and_prune_keep_probe_chains(counters):
+    keys = [f"h|{uid}|2026101900" for uid in range(40)]
+    for key in keys:
+        counters.increment(key)
+    counters.mark_flushed({key : 1 for key in keys[:20]})
+    counters.prune(lambda key: False)
+    assert sorted(counters.totals()) == sorted(keys[20:])
+    counters.discard(keys[30])
+    assert counters.get(keys[30]) is None
+    assert all(counters.get(key)["total"] == 1 for key in keys[20:] if key != keys[30])
+
+
+def test_full_stripe_and_long_keys_are_rejected():
+    shared = SharedCounters(slots=4, stripes=1)
+    assert shared.increment("x" * 200) is None
+    for index in range(4):
+        assert shared.increment(f"k{index}") == 1
+    assert shared.increment("k4") is None
+    shared.close()
+
+
+def test_file_segment_is_shared(tmp_path):
+    path = str(tmp_path / "counters")
+    first = SharedCounters.create(path, slots=64, stripes=4)
+    second = SharedCounters(path)
+    first.increment("e|GET|/a", 2)
+    second.increment("e|GET|/a", 3)
+    assert first.get("e|GET|/a")["total"] == 5
+    assert first.epoch == second.epoch
+    first.close()
+    second.close()
+
+
+def hold_leader(path, lease_seconds):
+    SharedCounters(path).claim_leader(lease_seconds)
+
+
+def test_leader_lease_outlives_a_dead_leader_only_until_it_expires(tmp_path):
+    path = str(tmp_path / "counters")
+    counters = SharedCounters.create(path, slots=64, stripes=4)
+    child = multiprocessing.get_context("fork").Process(target=hold_leader, args=(path, 0.3))
+    child.start()
+    child.join()
+    # The dead leader's lease still holds, whatever process now has its pid
+    assert not counters.claim_leader()
+    time.sleep(0.35)
+    assert counters.claim_leader()
+    assert counters.claim_leader()
+    counters.release_leader()
+    counters.close()
+
+
+def test_leader_renews_its_own_lease(tmp_path):
+    path = str(tmp_path / "counters")
+    counters = SharedCounters.create(path, slots=64, stripes=4)
+    assert counters.claim_leader(0.05)
+    time.sleep(0.1)
+    assert counters.claim_leader(0.05)
+    counters.close()
+
+
+def test_value_read_across_a_flush_is_not_cached(counters):
+    generation = counters.flush_generation()
+    counters.begin_flush()
+    assert counters.flush_generation() is None
+    counters.end_flush()
+    assert not counters.set_value("u|1", 10, generation=generation)
+    assert counters.set_value("u|1", 10, generation=counters.flush_generation())
+    assert counters.get("u|1")["value"] == 10
+
+
+def test_interrupted_flush_does_not_block_caching(counters):
+    counters.begin_flush()
+    # The flushing process died; the next flush moves past its generation
+    counters.begin_flush()
+    counters.end_flush()
+    assert counters.set_value("u|1", 3, generation=counters.flush_generation())
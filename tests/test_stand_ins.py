@@ -0,0 +1,40 @@
+import asyncio
+import httpx
+from benchmarks.stand_ins import StandInDatabase, create_ai_backend, translate
+
+
+def test_mysql_constructs_are_translated():
+    query = translate("""
+        CREATE TABLE t (uid INT, bucket DATE, PRIMARY KEY (bucket, uid), KEY idx_t_uid (uid, bucket))
+        INSERT INTO t VALUES (%s, %s) ON DUPLICATE KEY UPDATE n = n + VALUES(n)
+    """)
+    assert "KEY idx_t_uid" not in query
+    assert "ON CONFLICT DO UPDATE SET n = n + excluded.n" in query
+    assert "VALUES (?, ?)" in query
+
+
+def test_stand_in_runs_the_real_database_queries():
+    db = StandInDatabase()
+    db.seed_users(["a@example.com"], "hash", ["admin@example.com"])
+    db.increment_api_usage(1)
+    db.update_endpoint({"method" : "GET", "endpoint" : "/a"})
+    db.update_endpoint({"method" : "GET", "endpoint" : "/a"})
+    users = {user["email"] : user for user in db.get_users_with_usage()}
+    assert users["a@example.com"]["api_usage"] == 1
+    assert users["admin@example.com"]["is_admin"] == 1
+    assert db.get_all_endpoints() == [{"http_method" : "GET", "endpoint" : "/a", "request_count" : 2}]
+    assert not db.insert_user({"email" : "a@example.com", "password" : "hash", "is_admin" : 0})
+
+
+def test_stand_in_ai_backend_answers_parse_requests():
+    app = create_ai_backend(latency=0.0, jitter=0.0, fields=2, seed=1)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            head = await client.head("/")
+            parsed = await client.post("/v1/json/parse", json={"text" : "x", "lang" : "en"})
+        return head, parsed
+
+    head, parsed = asyncio.run(scenario())
+    assert head.status_code == 200
+    assert parsed.json() == {"data" : {"field_0" : "value 0", "field_1" : "value 1"}}
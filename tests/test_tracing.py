@@ -0,0 +1,83 @@
+import asyncio
+import json
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from middleware.timing import TimingMiddleware
+from services.tracing import TraceExporter, start_trace, end_trace, span, traced
+
+
+@traced("work")
+def work():
+    return 1
+
+
+@traced("async.work")
+async def async_work():
+    return 2
+
+
+def test_spans_are_recorded_only_inside_a_trace():
+    assert work() == 1
+    trace, token = start_trace("GET /")
+    try:
+        work()
+        work()
+        assert asyncio.run(async_work()) == 2
+        with span("block"):
+            pass
+    finally:
+        end_trace(token)
+    trace.finish()
+    assert [name for name, _, _ in trace.spans] == ["work", "work", "async.work", "block"]
+    header = trace.server_timing()
+    assert 'work;dur=' in header and 'desc="x2"' in header
+    assert header.endswith(f"app;dur={trace.duration * 1000:.1f}")
+
+
+def test_file_exporter_writes_sampled_traces(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = TraceExporter(destination=f"file:{path}", sample_rate=1.0)
+    exporter.start()
+    trace, token = start_trace("POST /a")
+    with span("db"):
+        pass
+    end_trace(token)
+    trace.finish()
+    exporter.offer(trace, {"http.status_code" : 200})
+    exporter.stop()
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["name"] == "POST /a"
+    assert record["attributes"] == {"http.status_code" : 200}
+    assert [entry["name"] for entry in record["spans"]] == ["db"]
+
+
+def test_disabled_exporter_drops_traces():
+    exporter = TraceExporter(destination="", sample_rate=1.0)
+    exporter.start()
+    assert not exporter.enabled
+    exporter.offer(start_trace("GET /")[0], {})
+    exporter.stop()
+
+
+def test_timing_middleware_adds_server_timing():
+    async def endpoint(request):
+        with span("handler"):
+            return PlainTextResponse("ok")
+    offered = []
+
+    class Recorder:
+        def offer(self, trace, attributes):
+            offered.append(attributes)
+
+    app = TimingMiddleware(Starlette(routes=[Route("/", endpoint)]), Recorder())
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/")
+
+    response = asyncio.run(scenario())
+    assert response.headers["server-timing"].startswith("handler;dur=")
+    assert offered[0]["http.status_code"] == 200
+    assert offered[0]["http.route"] == "/"
@@ -0,0 +1,32 @@
+from services.shared_state import SharedCounters
+
+
+def test_usage_is_read_from_the_row_when_the_segment_is_full(db):
+    counters = SharedCounters(slots=2, stripes=1)
+    db.attach_counters(counters)
+    db._execute("UPDATE api_usage SET usage_count = 5 WHERE uid = 3")
+    assert counters.increment("e|GET|/a") == counters.increment("e|GET|/b") == 1
+    assert db.get_api_usage(3) == 5
+    db.increment_api_usage(3)
+    assert db.get_api_usage(3) == 6
+
+
+def test_usage_read_during_a_flush_is_not_counted_twice(db, monkeypatch):
+    counters = SharedCounters(slots=64, stripes=4)
+    db.attach_counters(counters)
+    db.increment_api_usage(1)
+    db.increment_api_usage(1)
+    mark_flushed = counters.mark_flushed
+    seen = []
+
+    def read_then_mark(deltas):
+        # Another request reads the usage after the flush committed but before it is marked
+        seen.append(db.get_api_usage(1))
+        mark_flushed(deltas)
+
+    monkeypatch.setattr(counters, "mark_flushed", read_then_mark)
+    db.flush_counters()
+    assert seen[0] == 2
+    assert db.get_api_usage(1) == 2
+    db.increment_api_usage(1)
+    assert db.get_api_usage(1) == 3
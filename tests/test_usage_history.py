@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import pymysql
+import pytest
+from database.database import split_usage_range, truncate_bucket
+from services.shared_state import SharedCounters
+
+
+@pytest.fixture
+def counted_db(db):
+    db.attach_counters(SharedCounters(slots=256, stripes=4))
+    return db
+
+
+def this_hour():
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+
+def test_history_tables_are_created_on_first_flush(counted_db):
+    counted_db.increment_api_usage(1)
+    counted_db.increment_api_usage(1)
+    assert counted_db.flush_counters() == 2
+    hour = this_hour()
+    rows = counted_db.get_usage_history(hour, hour + timedelta(hours=1), "hour")
+    assert [row["usage_count"] for row in rows] == [2]
+    assert counted_db.get_top_users(hour, hour + timedelta(hours=1), 5)[0]["uid"] == 1
+
+
+def test_failing_history_write_does_not_hold_back_totals(counted_db, monkeypatch):
+    def unavailable():
+        raise pymysql.OperationalError(1142, "CREATE command denied")
+    counted_db.update_endpoint({"method" : "GET", "endpoint" : "/a"})
+    counted_db.increment_api_usage(2)
+    monkeypatch.setattr(counted_db, "ensure_usage_history_tables", unavailable)
+    with pytest.raises(pymysql.OperationalError):
+        counted_db.flush_counters()
+    assert counted_db._fetchone("SELECT usage_count FROM api_usage WHERE uid = 2")["usage_count"] == 1
+    assert counted_db._fetchall("SELECT * FROM api_request_stats")[0]["request_count"] == 1
+    counters = counted_db._Database__counters
+    assert counters.pending("e|") == counters.pending("u|") == {}
+    assert list(counters.pending("h|")) == [f"h|2|{this_hour():%Y%m%d%H}"]
+
+    monkeypatch.undo()
+    assert counted_db.flush_counters() == 1
+    assert counters.pending("h|") == {}
+    assert counted_db._fetchone("SELECT usage_count FROM api_usage WHERE uid = 2")["usage_count"] == 1
+
+
+def test_deleting_a_user_drops_pending_history(counted_db):
+    counted_db.increment_api_usage(1)
+    counted_db.increment_api_usage(2)
+    counted_db.delete_user(1)
+    assert all(not key.startswith(("h|1|", "u|1")) for key in counted_db._Database__counters.totals())
+    counted_db.flush_counters()
+    hour = this_hour()
+    assert counted_db.get_usage_history(hour, hour + timedelta(hours=1), "hour", uid=1) == []
+    assert counted_db.get_usage_history(hour, hour + timedelta(hours=1), "hour", uid=2)[0]["usage_count"] == 1
+
+
+def test_range_is_split_into_months_days_and_hours():
+    parts = split_usage_range(datetime(2026, 1, 30, 22, 15), datetime(2026, 3, 2, 3))
+    assert parts["month"] == [(datetime(2026, 2, 1), datetime(2026, 3, 1))]
+    assert parts["day"] == [(datetime(2026, 1, 31), datetime(2026, 2, 1)), (datetime(2026, 3, 1), datetime(2026, 3, 2))]
+    assert parts["hour"] == [(datetime(2026, 1, 30, 22), datetime(2026, 1, 31)), (datetime(2026, 3, 2), datetime(2026, 3, 2, 3))]
+    assert truncate_bucket(datetime(2026, 5, 17, 8, 30), "month") == datetime(2026, 5, 1)